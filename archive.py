@@ -0,0 +1,149 @@
+# archive.py
+
+"""
+Archivo de respuestas crudas de la API.
+
+Cada respuesta 200 se guarda tal cual llegó, comprimida con zstd y direccionada por
+contenido (sha256 del cuerpo): blobs/ab/abcdef....zst. Un índice JSONL registra cada
+request (endpoint, parámetros, instante, hash, tamaño y validadores HTTP). Payloads
+idénticos (ej: la coin list de horas consecutivas) comparten el mismo blob.
+
+En modo replay, extract.py responde los requests desde el archivo en lugar de la red:
+reprocesar y correr benchmarks no consume presupuesto de la API y es reproducible.
+
+La compresión usa el codec zstd de pyarrow (ya es dependencia), así que no hace falta
+instalar zstandard; los blobs son frames zstd estándar (se leen con `zstd -d`).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import pyarrow as pa
+import requests
+from requests.structures import CaseInsensitiveDict
+
+ZSTD_LEVEL = 9
+INDEX_FILE = "index.jsonl"
+ARCHIVED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class ReplayMiss(requests.exceptions.RequestException):
+    """El request pedido en modo replay no está en el archivo."""
+
+
+def request_key(endpoint, params=None):
+    """Clave canónica de un request: endpoint + parámetros ordenados."""
+    query = urlencode(sorted((params or {}).items()))
+    return f"{endpoint}?{query}" if query else endpoint
+
+
+class ResponseArchive:
+    """
+    Archivo de respuestas en `root` (blobs/ + index.jsonl). Seguro para varios threads.
+    """
+
+    def __init__(self, root, level=ZSTD_LEVEL):
+        self.root = root
+        self.codec = pa.Codec("zstd", compression_level=level)
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index = None
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, "blobs", sha256[:2], f"{sha256}.zst")
+
+    def store(self, endpoint, params, response):
+        """
+        Guarda el cuerpo de la respuesta (si no existe ya) y agrega la entrada al índice.
+        Retorna el sha256 del cuerpo.
+        """
+        body = response.content
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = self.codec.compress(body, asbytes=True) if body else b""
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "endpoint": endpoint,
+            "params": params or {},
+            "key": request_key(endpoint, params),
+            "status": response.status_code,
+            "sha256": sha256,
+            "size": len(body),
+            "headers": {h: response.headers[h] for h in ARCHIVED_HEADERS if h in response.headers},
+        }
+        with self._lock:
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            if self._index is not None:
+                self._index.setdefault(entry["key"], []).append(entry)
+        return sha256
+
+    def index(self):
+        """Índice en memoria: clave → entradas en orden de llegada."""
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                if os.path.exists(self.index_path):
+                    with open(self.index_path) as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                self._index.setdefault(entry["key"], []).append(entry)
+            return self._index
+
+    def lookup(self, endpoint, params=None, as_of=None):
+        """
+        Última respuesta archivada para el request (la última anterior o igual a `as_of`,
+        un datetime con zona horaria, si se indica). None si no hay ninguna.
+        """
+        entries = self.index().get(request_key(endpoint, params), [])
+        if as_of is not None:
+            entries = [e for e in entries if datetime.fromisoformat(e["ts"]) <= as_of]
+        return entries[-1] if entries else None
+
+    def read_blob(self, entry):
+        with open(self.blob_path(entry["sha256"]), "rb") as f:
+            compressed = f.read()
+        if not entry["size"]:
+            return b""
+        return self.codec.decompress(compressed, decompressed_size=entry["size"], asbytes=True)
+
+    def replay(self, endpoint, params=None, as_of=None):
+        """
+        Reconstruye un requests.Response desde el archivo.
+        Lanza ReplayMiss si el request no fue archivado.
+        """
+        entry = self.lookup(endpoint, params, as_of)
+        if entry is None:
+            raise ReplayMiss(f"Request no archivado: {request_key(endpoint, params)}")
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response._content = self.read_blob(entry)
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = "utf-8"
+        response.url = entry["key"]
+        return response
+
+    def stats(self):
+        """Entradas del índice, blobs distintos y bytes en disco vs. sin comprimir."""
+        index = self.index()
+        entries = [e for key_entries in index.values() for e in key_entries]
+        blobs = {e["sha256"]: e["size"] for e in entries}
+        on_disk = sum(os.path.getsize(self.blob_path(sha)) for sha in blobs if os.path.exists(self.blob_path(sha)))
+        return {
+            "entries": len(entries),
+            "blobs": len(blobs),
+            "raw_bytes": sum(e["size"] for e in entries),
+            "disk_bytes": on_disk,
+        }
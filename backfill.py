@@ -0,0 +1,237 @@
+# backfill.py
+
+"""
+Reconstrucción de horas faltantes en Bronze desde /coins/{id}/market_chart/range.
+
+La ventana [start, end) se divide, por moneda, en chunks de hasta CHUNK_DAYS días (la API
+devuelve puntos horarios para rangos de hasta 90 días). Los chunks se piden en paralelo a
+través del planificador compartido de extract.py, así el backfill respeta el mismo
+presupuesto de requests que la extracción horaria. Las escrituras se hacen desde un solo
+thread, con MERGE de solo inserción acotado a las particiones del lote.
+
+El progreso se guarda en un checkpoint JSON después de cada escritura: si el proceso se
+corta, la siguiente ejecución con los mismos parámetros retoma desde los chunks pendientes.
+Reprocesar un chunk ya escrito no duplica filas (el MERGE matchea por id + last_updated).
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+from deltalake import DeltaTable
+
+from delta_utils import CDF_CONFIG, read_delta_partitions, save_new_data_as_delta
+from extract import MAX_WORKERS, extract_market_chart_range
+from layout import DEFAULT_LAYOUT, coin_bucket, partition_cols
+from schema_registry import conform_to_table, table_schema
+
+logger = logging.getLogger(__name__)
+
+CHUNK_DAYS = 30          # Máximo 90 para conservar granularidad horaria
+FLUSH_ROWS = 50_000      # Filas acumuladas antes de escribir en Bronze
+CHECKPOINT_FILE = "state/backfill_checkpoint.json"
+
+BACKFILL_PREDICATE = "target.id = source.id AND target.last_updated = source.last_updated"
+
+
+def plan_chunks(coins, start, end, chunk_days=CHUNK_DAYS):
+    """
+    Divide la ventana en chunks (coin, inicio, fin) de hasta `chunk_days` días.
+    """
+    chunks = []
+    for coin in coins:
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+            chunks.append((coin, chunk_start, chunk_end))
+            chunk_start = chunk_end
+    return chunks
+
+
+def chunk_key(chunk):
+    coin, start, end = chunk
+    return f"{coin}|{int(start.timestamp())}|{int(end.timestamp())}"
+
+
+def load_checkpoint(path, job):
+    """
+    Retorna las claves de chunks ya escritos para el mismo trabajo (mismos parámetros).
+    """
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("job") != job:
+        logger.warning("⚠️ El checkpoint de backfill corresponde a otro trabajo. Se empieza de cero.")
+        return set()
+    return set(checkpoint["done"])
+
+
+def save_checkpoint(path, job, done):
+    """Guarda el checkpoint con reemplazo atómico del archivo."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"job": job, "done": sorted(done)}, f)
+    os.replace(tmp_path, path)
+
+
+def chart_to_rows(coin_id, chart, start, end):
+    """
+    Convierte la respuesta de market_chart/range en filas horarias de Bronze
+    (un punto por hora: el último de cada hora dentro de [start, end)). Las columnas de
+    partición usan la hora UTC, igual que la extracción horaria.
+    """
+    caps = {ts: value for ts, value in chart.get("market_caps", [])}
+    volumes = {ts: value for ts, value in chart.get("total_volumes", [])}
+    by_hour = {}
+    for ts, price in chart.get("prices", []):
+        moment = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
+        if not start <= moment < end:
+            continue
+        by_hour[moment.replace(minute=0, second=0, microsecond=0)] = (moment, ts, price)
+
+    rows = []
+    for hour_start, (moment, ts, price) in sorted(by_hour.items()):
+        rows.append({
+            "id": coin_id,
+            "current_price": price,
+            "market_cap": caps.get(ts),
+            "total_volume": volumes.get(ts),
+            "last_updated": moment,
+            "coin": coin_id,
+            "date": hour_start.strftime("%Y-%m-%d"),
+            "day": hour_start.strftime("%d"),
+            "hour": hour_start.strftime("%H"),
+        })
+    return rows
+
+
+def existing_hours(bronze_path, coins, start, end):
+    """
+    Conjunto (coin, date, hour) que ya tiene datos en Bronze dentro de la ventana.
+    Esas horas no se rellenan: el snapshot real tiene más columnas que la serie histórica.
+    """
+    if not DeltaTable.is_deltatable(bronze_path):
+        return set()
+    first = start.astimezone(timezone.utc) - timedelta(days=1)
+    dates = sorted({(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 3)})
+    df = read_delta_partitions(
+        bronze_path,
+        partitions=[("date", "in", dates), ("coin", "in", list(coins))],
+        columns=["coin", "date", "hour"],
+    )
+    return set(zip(df["coin"].astype(str), df["date"].astype(str), df["hour"].astype(str)))
+
+
+def align_to_schema(table, schema):
+    """
+    Completa con nulos las columnas de la tabla destino que el lote no trae (el MERGE de solo
+    inserción espera todas) y las ordena como en el destino.
+    """
+    names = schema.names + [name for name in table.column_names if name not in schema.names]
+    columns = [
+        table.column(name) if name in table.column_names else pa.nulls(table.num_rows, schema.field(name).type)
+        for name in names
+    ]
+    return pa.Table.from_arrays(columns, names=names)
+
+
+def write_rows(rows, bronze_path, layout, quarantine_path=None):
+    """
+    Inserta las filas en Bronze (MERGE de solo inserción acotado a las particiones del lote).
+
+    El lote pasa por schema_registry.conform_to_table igual que la ingesta horaria: se
+    convierte a los tipos de la tabla (o del registro) y las filas inválidas van a
+    cuarentena. Si Bronze todavía no existe se crea con change data feed.
+
+    Retorna:
+        int: filas escritas.
+    """
+    if "coin_bucket" in partition_cols(layout):
+        for row in rows:
+            row["coin_bucket"] = coin_bucket(row["id"])
+    target = table_schema(bronze_path)
+    ts_type = target.field("last_updated").type if target is not None and "last_updated" in target.names else None
+    if ts_type is not None and (pa.types.is_string(ts_type) or pa.types.is_large_string(ts_type)):
+        # Bronze guarda last_updated como string ISO de la API: mismo formato para que el MERGE matchee
+        for row in rows:
+            row["last_updated"] = row["last_updated"].strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    table, _ = conform_to_table(pa.Table.from_pylist(rows), bronze_path, quarantine_path, "Backfill")
+    if table.num_rows == 0:
+        return 0
+    if target is not None:
+        table = align_to_schema(table, target)
+    save_new_data_as_delta(table, bronze_path, BACKFILL_PREDICATE, partition_cols=partition_cols(layout), configuration=CDF_CONFIG)
+    return table.num_rows
+
+
+def run_backfill(coins, start, end, bronze_path, vs_currency="usd", layout=DEFAULT_LAYOUT,
+                 checkpoint_file=CHECKPOINT_FILE, chunk_days=CHUNK_DAYS, max_workers=MAX_WORKERS,
+                 flush_rows=FLUSH_ROWS, quarantine_path=None):
+    """
+    Rellena en Bronze las horas sin datos de `coins` entre `start` y `end`.
+
+    Args:
+        coins (list): ids de monedas.
+        start, end (datetime): ventana a reconstruir (UTC; `end` excluido).
+        bronze_path (str): Ruta de la tabla Bronze de mercados.
+        vs_currency (str): Moneda de referencia.
+        layout (str): Layout de particionamiento de Bronze (ver layout.LAYOUTS).
+        checkpoint_file (str): Archivo de progreso para retomar el trabajo.
+        chunk_days (int): Días por request (máximo 90 para puntos horarios).
+        max_workers (int): Requests simultáneos.
+        flush_rows (int): Filas acumuladas antes de cada escritura.
+        quarantine_path (str, optional): Tabla de cuarentena para las filas que no se ajustan
+            al esquema de Bronze (si es None solo se descartan con un aviso).
+
+    Retorna:
+        dict: chunks totales, saltados (ya hechos), escritos y fallidos; filas escritas.
+    """
+    start = start.astimezone(timezone.utc)
+    end = end.astimezone(timezone.utc)
+    job = {"coins": sorted(coins), "start": start.isoformat(), "end": end.isoformat(),
+           "vs_currency": vs_currency, "chunk_days": chunk_days}
+    done = load_checkpoint(checkpoint_file, job)
+    chunks = [chunk for chunk in plan_chunks(coins, start, end, chunk_days) if chunk_key(chunk) not in done]
+    summary = {"chunks": len(chunks) + len(done), "skipped": len(done), "written": 0, "failed": 0, "rows": 0}
+    logger.info(f"⏪ Backfill {start:%Y-%m-%d %H}h → {end:%Y-%m-%d %H}h: {len(chunks)} chunks pendientes "
+                f"({len(done)} ya hechos).")
+    if not chunks:
+        return summary
+
+    skip = existing_hours(bronze_path, coins, start, end)
+    pending_rows, pending_keys = [], []
+
+    def flush():
+        if pending_rows:
+            summary["rows"] += write_rows(pending_rows, bronze_path, layout, quarantine_path)
+        done.update(pending_keys)
+        summary["written"] += len(pending_keys)
+        save_checkpoint(checkpoint_file, job, done)
+        logger.info(f"💾 Backfill: {summary['written']}/{len(chunks)} chunks, {summary['rows']} filas escritas.")
+        pending_rows.clear()
+        pending_keys.clear()
+
+    def fetch(chunk):
+        coin, chunk_start, chunk_end = chunk
+        return extract_market_chart_range(coin, chunk_start, chunk_end, vs_currency=vs_currency)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        futures = {pool.submit(fetch, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            chart = future.result()
+            if chart is None:
+                summary["failed"] += 1
+                logger.warning(f"⚠️ Falló el chunk {chunk_key(chunk)}; quedará pendiente para la próxima ejecución.")
+                continue
+            rows = chart_to_rows(chunk[0], chart, chunk[1], chunk[2])
+            pending_rows.extend(row for row in rows if (row["coin"], row["date"], row["hour"]) not in skip)
+            pending_keys.append(chunk_key(chunk))
+            if len(pending_rows) >= flush_rows:
+                flush()
+    flush()
+    return summary
@@ -0,0 +1,104 @@
+# bench/bench_backfill.py
+"""
+Verifica que un backfill cortado a mitad de camino se retome sin perder ni duplicar filas,
+contra el servidor simulado de fake_api.py (market_chart/range):
+
+1. Primera ejecución de run_backfill sobre un Bronze inexistente, cortada justo después de
+   una escritura y antes de guardar su checkpoint (el peor momento: ese chunk se repite).
+2. Bronze quedó creado con change data feed (lo lee Silver por versión).
+3. La segunda ejecución, con los mismos parámetros, saltea los chunks del checkpoint y
+   completa el resto: cada (moneda, hora) de la ventana queda escrita exactamente una vez.
+4. Una tercera ejecución no tiene chunks pendientes y no escribe una versión nueva de Bronze.
+
+Informa además el tiempo de cada ejecución.
+
+Uso: python bench/bench_backfill.py [monedas] [días]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backfill  # noqa: E402
+import extract  # noqa: E402
+from fake_api import FakeCoinGecko, coin_list  # noqa: E402
+from delta_utils import get_table, is_change_data_feed_enabled, read_delta_partitions  # noqa: E402
+
+END = datetime(2025, 6, 18, tzinfo=timezone.utc)
+CUT_AFTER = 3  # Checkpoints guardados antes del corte
+
+
+class Interrupted(Exception):
+    """Corte simulado del proceso."""
+
+
+def interrupting_checkpoint(after):
+    """save_checkpoint que guarda `after` veces y en la siguiente corta el proceso."""
+    save = backfill.save_checkpoint
+    calls = {"n": 0}
+
+    def wrapper(path, job, done):
+        calls["n"] += 1
+        if calls["n"] > after:
+            raise Interrupted(f"corte simulado en el checkpoint {calls['n']}")
+        save(path, job, done)
+
+    return wrapper
+
+
+def main(n_coins=5, days=3):
+    coins = [c["id"] for c in coin_list(n_coins)]
+    start = END - timedelta(days=days)
+    with tempfile.TemporaryDirectory() as tmp, FakeCoinGecko(n_coins=n_coins) as api:
+        extract.BASE_URL = api.url
+        extract.configure_scheduler(calls_per_minute=10**6, burst=10**6)
+        bronze = os.path.join(tmp, "bronze")
+        params = dict(checkpoint_file=os.path.join(tmp, "checkpoint.json"), chunk_days=1, max_workers=2, flush_rows=1)
+        n_chunks = n_coins * days
+
+        save_checkpoint = backfill.save_checkpoint
+        backfill.save_checkpoint = interrupting_checkpoint(CUT_AFTER)
+        t0 = time.perf_counter()
+        try:
+            backfill.run_backfill(coins, start, END, bronze, **params)
+            raise AssertionError("el backfill no se cortó")
+        except Interrupted:
+            pass
+        finally:
+            backfill.save_checkpoint = save_checkpoint
+        first_s = time.perf_counter() - t0
+        assert is_change_data_feed_enabled(get_table(bronze)), "Bronze se creó sin change data feed"
+        partial = len(read_delta_partitions(bronze, columns=["id"]))
+        print(f"✂️ Backfill cortado: {partial} filas escritas, {CUT_AFTER}/{n_chunks} chunks en el checkpoint")
+        print("✅ Bronze creado por el backfill con change data feed")
+
+        t0 = time.perf_counter()
+        summary = backfill.run_backfill(coins, start, END, bronze, **params)
+        resume_s = time.perf_counter() - t0
+        assert summary["skipped"] == CUT_AFTER, f"se saltearon {summary['skipped']} chunks, se esperaban {CUT_AFTER}"
+        assert summary["written"] == n_chunks - CUT_AFTER and summary["failed"] == 0, f"resumen inesperado: {summary}"
+        df = read_delta_partitions(bronze, columns=["id", "last_updated"])
+        expected = n_coins * days * 24
+        assert len(df) == expected, f"Bronze tiene {len(df)} filas, se esperaban {expected}"
+        assert not df.duplicated(["id", "last_updated"]).any(), "filas duplicadas en Bronze"
+        print(f"✅ Reanudación: {summary['skipped']} chunks salteados, {len(df)} filas exactas en Bronze")
+
+        version = get_table(bronze).version()
+        summary = backfill.run_backfill(coins, start, END, bronze, **params)
+        assert summary["skipped"] == n_chunks and summary["rows"] == 0, f"la tercera ejecución escribió: {summary}"
+        assert get_table(bronze).version() == version, "la tercera ejecución escribió una versión nueva de Bronze"
+        print("✅ Una ejecución con el trabajo completo no escribe nada")
+
+    print(f"\n{'ejecución':<14} {'segundos':>10}")
+    print(f"{'cortada':<14} {first_s:>10.3f}")
+    print(f"{'reanudada':<14} {resume_s:>10.3f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,54 @@
+# bench/bench_bronze_read.py
+"""
+Compara la lectura de la partición de una hora en Bronze:
+- full: DeltaTable.to_pandas() completo + filtro en pandas (implementación anterior)
+- pruned: filtros de partición empujados al scan (read_delta_partitions)
+
+Uso: python bench/bench_bronze_read.py [días ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from deltalake import DeltaTable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import build_bronze_table  # noqa: E402
+from delta_utils import read_delta_partitions  # noqa: E402
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(days_list):
+    print(f"{'days':>6} {'full (s)':>10} {'pruned (s)':>11}")
+    for days in days_list:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bronze")
+            last = build_bronze_table(path, days)
+            date_str, day, hour = last.strftime("%Y-%m-%d"), last.strftime("%d"), last.strftime("%H")
+
+            def full():
+                df = DeltaTable(path).to_pandas()
+                return df[(df["date"] == date_str) & (df["hour"] == hour)]
+
+            def pruned():
+                return read_delta_partitions(
+                    path, partitions=[("date", "=", date_str), ("day", "=", day), ("hour", "=", hour)]
+                )
+
+            assert len(full()) == len(pruned())
+            print(f"{days:>6} {timed(full):>10.3f} {timed(pruned):>11.3f}")
+
+
+if __name__ == "__main__":
+    main([int(d) for d in sys.argv[1:]] or [1, 7, 30])
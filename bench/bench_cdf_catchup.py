@@ -0,0 +1,85 @@
+# bench/bench_cdf_catchup.py
+"""
+Verifica el procesamiento incremental de Silver por versión de Bronze (change data feed)
+cuando se saltean corridas:
+
+1. Primera corrida: Bronze con una hora, Silver la procesa (arranque del watermark).
+2. Se escriben SKIPPED_HOURS horas más en Bronze sin correr Silver (corridas perdidas) y una
+   corrección tardía de la primera hora (misma llave, otro precio).
+3. Una sola corrida de Silver se pone al día: ninguna fila perdida ni duplicada y la
+   corrección aplicada.
+4. Una segunda corrida no tiene nada para procesar y no escribe una versión nueva de Silver.
+
+Informa además el tiempo de la corrida de recuperación.
+
+Uso: python bench/bench_cdf_catchup.py [monedas] [horas_salteadas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids, make_market_rows  # noqa: E402
+from delta_utils import CDF_CONFIG, get_table, read_delta_partitions, upsert_data_as_delta  # noqa: E402
+from process_markets import PARTITION_COLS, process_and_save_markets  # noqa: E402
+
+PREDICATE = "target.id = source.id AND target.last_updated = source.last_updated"
+START = datetime(2025, 6, 18, 20)
+
+
+def write_bronze(path, rows):
+    upsert_data_as_delta(rows, path, PREDICATE, partition_cols=PARTITION_COLS, configuration=CDF_CONFIG)
+
+
+def run_silver(bronze, silver, watermark, ts):
+    return process_and_save_markets(bronze, silver, day=ts.day, hour=ts.hour, date_str=ts.strftime("%Y-%m-%d"),
+                                    watermark_file=watermark, verify=False)
+
+
+def main(n_coins=20, skipped_hours=5):
+    coins = coin_ids(n_coins)
+    with tempfile.TemporaryDirectory() as tmp:
+        bronze = os.path.join(tmp, "bronze")
+        silver = os.path.join(tmp, "silver")
+        watermark = os.path.join(tmp, "bronze_version.json")
+
+        first = make_market_rows(coins, START, seed=0)
+        write_bronze(bronze, first)
+        assert run_silver(bronze, silver, watermark, START) == n_coins, "la primera corrida no procesó la hora"
+
+        # Corridas perdidas: Bronze sigue recibiendo horas y una corrección de la primera
+        hours = [START + timedelta(hours=h) for h in range(1, skipped_hours + 1)]
+        for i, ts in enumerate(hours, start=1):
+            write_bronze(bronze, make_market_rows(coins, ts, seed=i))
+        corrected = first.assign(current_price=first["current_price"] + 1.0)
+        write_bronze(bronze, corrected)
+
+        start = time.perf_counter()
+        processed = run_silver(bronze, silver, watermark, hours[-1])
+        catchup_s = time.perf_counter() - start
+        df = read_delta_partitions(silver, columns=["id", "last_updated", "current_price"])
+        expected = n_coins * (skipped_hours + 1)
+        assert len(df) == expected, f"Silver tiene {len(df)} filas, se esperaban {expected}"
+        assert not df.duplicated(["id", "last_updated"]).any(), "filas duplicadas en Silver"
+        assert processed == n_coins * (skipped_hours + 1), f"se procesaron {processed} filas"
+        first_hour = df[df["last_updated"] == df["last_updated"].min()].sort_values("id")
+        assert (first_hour["current_price"].to_numpy() == corrected.sort_values("id")["current_price"].to_numpy()).all(), \
+            "la corrección tardía no llegó a Silver"
+        print(f"✅ Recuperación: {skipped_hours} horas salteadas + 1 corrección, {len(df)} filas exactas en Silver")
+
+        version = get_table(silver).version()
+        assert run_silver(bronze, silver, watermark, hours[-1]) == 0, "la segunda corrida volvió a procesar filas"
+        assert get_table(silver).version() == version, "la segunda corrida escribió una versión nueva de Silver"
+        print("✅ Una segunda corrida sin cambios en Bronze no escribe nada")
+
+    print(f"\nCorrida de recuperación: {catchup_s:.3f}s")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,93 @@
+# bench/bench_change_index.py
+"""
+Verifica la supresión de filas sin cambios antes del MERGE en Bronze (change_index.py):
+
+1. Una re-extracción con el mismo contenido (mismo last_updated y valores, otra hora de
+   extracción en las columnas de partición) se suprime completa, como DataFrame y como
+   pyarrow.Table.
+2. Una fila con otro precio y una con last_updated más nuevo se escriben; el resto no.
+3. Si la escritura no se confirma (sin commit) las filas no se suprimen en el reintento.
+4. El índice persistido en disco suprime lo mismo al recargarlo (nuevo proceso).
+
+Informa además el tiempo de filter_changed sobre el lote completo.
+
+Uso: python bench/bench_change_index.py [monedas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_api import coin_list, market_row  # noqa: E402
+from change_index import RowChangeIndex, get_change_index, suppress_unchanged  # noqa: E402
+
+SNAPSHOT = datetime(2025, 6, 18, 20, 5, tzinfo=timezone.utc)
+
+
+def extraction(coins, snapshot, extracted_at):
+    """Lote de /coins/markets con las columnas de partición de la hora de extracción."""
+    df = pd.DataFrame([market_row(coin, rank, snapshot) for rank, coin in enumerate(coins, start=1)])
+    df["coin"] = df["id"]
+    df["date"] = extracted_at.strftime("%Y-%m-%d")
+    df["day"] = extracted_at.strftime("%d")
+    df["hour"] = extracted_at.strftime("%H")
+    return df
+
+
+def main(n_coins=5000):
+    coins = [c["id"] for c in coin_list(n_coins)]
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "bronze_rows.parquet")
+        extracted_at = SNAPSHOT.replace(minute=0) + timedelta(hours=1)
+        first = extraction(coins, SNAPSHOT, extracted_at)
+        changed, pending, suppressed = suppress_unchanged(first, index_path, "Bronze")
+        assert len(changed) == n_coins and suppressed == 0, "la primera extracción se suprimió"
+        # El commit va después de que la escritura quedó confirmada
+        get_change_index(index_path).commit(pending)
+
+        # Misma respuesta de la API una hora después: nada para escribir
+        again = extraction(coins, SNAPSHOT, extracted_at + timedelta(hours=1))
+        start = time.perf_counter()
+        changed, pending, suppressed = suppress_unchanged(again, index_path, "Bronze")
+        filter_s = time.perf_counter() - start
+        assert len(changed) == 0 and suppressed == n_coins, f"se escribirían {len(changed)} filas sin cambios"
+        changed, _, _ = suppress_unchanged(pa.Table.from_pandas(again, preserve_index=False), index_path, "Bronze")
+        assert changed.num_rows == 0, f"en Arrow se escribirían {changed.num_rows} filas sin cambios"
+        print(f"✅ Re-extracción idéntica: {suppressed} filas suprimidas (DataFrame y Arrow)")
+
+        # Un precio corregido y un snapshot nuevo se escriben
+        modified = again.copy()
+        modified.loc[0, "current_price"] += 1.0
+        modified.loc[1, "last_updated"] = (SNAPSHOT + timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        changed, pending, suppressed = suppress_unchanged(modified, index_path, "Bronze")
+        assert sorted(changed["id"]) == sorted(coins[:2]), f"filas a escribir: {list(changed['id'])}"
+        assert suppressed == n_coins - 2
+        print("✅ Solo se escriben la fila con otro precio y la del snapshot nuevo")
+
+        # Sin commit (la escritura falló) el reintento no se suprime
+        changed, pending, _ = suppress_unchanged(modified, index_path, "Bronze")
+        assert len(changed) == 2, "filas no confirmadas se suprimieron en el reintento"
+        get_change_index(index_path).commit(pending)
+        changed, _, _ = suppress_unchanged(modified, index_path, "Bronze")
+        assert len(changed) == 0, "filas confirmadas no se suprimieron"
+        print("✅ Las filas se suprimen recién después del commit")
+
+        reloaded = RowChangeIndex(index_path)
+        changed, _ = reloaded.filter_changed(modified)
+        assert len(reloaded) == n_coins and len(changed) == 0, "el índice recargado no suprime lo mismo"
+        print("✅ El índice persistido suprime lo mismo al recargarlo")
+
+    print(f"\nfilter_changed sobre {n_coins} filas: {filter_s * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,38 @@
+# bench/bench_extract.py
+"""
+Mide el tiempo de extract_market_data contra el servidor local simulado,
+con latencia por request, variando la concurrencia.
+
+Uso: python bench/bench_extract.py [n_monedas] [latencia_s]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract  # noqa: E402
+from fake_api import FakeCoinGecko, coin_list  # noqa: E402
+
+
+def main(n_coins=5000, latency=0.2):
+    coins = [c["id"] for c in coin_list(n_coins)]
+    with FakeCoinGecko(n_coins=n_coins, latency=latency) as api:
+        extract.BASE_URL = api.url
+        # Sin límite de tasa: medimos solo la concurrencia
+        extract.configure_scheduler(calls_per_minute=10**6, burst=10**6)
+        print(f"{n_coins} monedas, {latency}s de latencia por request")
+        print(f"{'workers':>8} {'requests':>9} {'rows':>7} {'wall (s)':>9}")
+        for workers in (1, 2, 4, 8, 16):
+            api.requests = 0
+            start = time.perf_counter()
+            df = extract.extract_market_data(coins, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>8} {api.requests:>9} {len(df):>7} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 5000, float(args[1]) if len(args) > 1 else 0.2)
@@ -0,0 +1,133 @@
+# bench/bench_gold.py
+"""
+Valida y mide la actualización incremental de Gold (gold.update_gold):
+
+1. Escribe una tabla tipo Silver en lotes de BATCH_HOURS horas (con change data feed) y
+   actualiza Gold después de cada lote; al final agrega un lote atrasado (horas ya cerradas)
+   para ejercitar el recálculo de ventanas desde la tabla Gold.
+2. Reenvía filas ya procesadas (MERGE por id, last_updated en Silver): unas corregidas (otro
+   precio) y otras idénticas, en la última hora y en una hora ya cerrada. Las barras que las
+   contienen no deben contar dos veces la observación.
+3. Compara las barras horarias/diarias y las métricas con un recálculo completo
+   (gold.compute_gold_full) sobre todas las observaciones.
+4. Informa el tiempo medio por lote incremental vs. el recálculo completo.
+
+Uso: python bench/bench_gold.py [días] [monedas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from deltalake import write_deltalake
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids  # noqa: E402
+from delta_utils import CDF_CONFIG, read_delta_partitions, upsert_data_as_delta  # noqa: E402
+from gold import BAR_COLUMNS, BAR_KEY, METRIC_COLUMNS, compute_gold_full, to_observations, update_gold  # noqa: E402
+
+BATCH_HOURS = 6
+KEY_PREDICATE = "target.id = source.id AND target.last_updated = source.last_updated"
+MINUTES = (5, 35)  # Dos observaciones por hora
+
+
+def observations(coins, hours, minutes=MINUTES):
+    """Filas tipo Silver deterministas para las horas y minutos dados."""
+    rows = []
+    for coin in coins:
+        seed = zlib.crc32(coin.encode())
+        for hour in hours:
+            for minute in minutes:
+                ts = hour + timedelta(minutes=minute)
+                price = 10 + seed % 1000 + 5 * np.sin(ts.timestamp() / 7200 + seed % 11)
+                rows.append({
+                    "id": coin,
+                    "last_updated": ts,
+                    "current_price": float(price),
+                    "total_volume": float(1e6 + (seed + int(ts.timestamp())) % 50000),
+                })
+    return pd.DataFrame(rows)
+
+
+def compare(name, incremental, full, columns):
+    incremental = incremental.sort_values(BAR_KEY).reset_index(drop=True)
+    full = full.sort_values(BAR_KEY).reset_index(drop=True)
+    assert len(incremental) == len(full), f"{name}: {len(incremental)} filas vs {len(full)}"
+    assert (incremental["coin"].to_numpy() == full["coin"].to_numpy()).all(), f"{name}: monedas distintas"
+    assert (pd.to_datetime(incremental["bar_start"], utc=True) == full["bar_start"]).all(), f"{name}: barras distintas"
+    for col in columns:
+        a = incremental[col].to_numpy(dtype="float64")
+        b = full[col].to_numpy(dtype="float64")
+        assert np.allclose(a, b, rtol=1e-7, atol=1e-9, equal_nan=True), f"{name}: difiere la columna {col}"
+    print(f"✅ {name}: {len(full)} barras idénticas al recálculo completo")
+
+
+def corrections(batches, coins, hours):
+    """
+    Filas ya escritas que se vuelven a enviar: las de la última hora y las de una hora
+    intermedia, corregidas (+1 en el precio) para la primera mitad de las monedas e idénticas
+    para el resto.
+    """
+    written = pd.concat(batches, ignore_index=True)
+    targets = {hours[-1], hours[len(hours) // 3]}
+    rows = written[pd.to_datetime(written["last_updated"]).dt.floor("h").isin(targets)]
+    rows = rows.drop_duplicates(["id", "last_updated"], keep="last").copy()
+    corrected = rows["id"].isin(coins[: len(coins) // 2])
+    rows.loc[corrected, "current_price"] += 1.0
+    return rows.reset_index(drop=True)
+
+
+def main(days=10, n_coins=10):
+    coins = coin_ids(n_coins)
+    end = datetime(2025, 6, 30, tzinfo=timezone.utc)
+    hours = [end - timedelta(hours=h) for h in range(days * 24, 0, -1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        silver = os.path.join(tmp, "silver")
+        hourly = os.path.join(tmp, "gold_hourly")
+        daily = os.path.join(tmp, "gold_daily")
+        watermark = os.path.join(tmp, "silver_version.json")
+        state = os.path.join(tmp, "tail.parquet")
+
+        batches = [observations(coins, hours[i:i + BATCH_HOURS]) for i in range(0, len(hours), BATCH_HOURS)]
+        # Lote atrasado: nuevas observaciones dentro de horas ya procesadas de la mitad de las monedas
+        batches.append(observations(coins[: n_coins // 2], hours[len(hours) // 2: len(hours) // 2 + 12], minutes=(50,)))
+
+        timings = []
+        for batch in batches:
+            write_deltalake(silver, batch, mode="append", configuration=CDF_CONFIG)
+            start = time.perf_counter()
+            update_gold(silver, hourly, daily, watermark, state)
+            timings.append(time.perf_counter() - start)
+
+        # Reenvíos y correcciones: MERGE en Silver (no duplica la llave) y actualización de Gold
+        resent = corrections(batches, coins, hours)
+        upsert_data_as_delta(resent, silver, KEY_PREDICATE)
+        start = time.perf_counter()
+        update_gold(silver, hourly, daily, watermark, state)
+        timings.append(time.perf_counter() - start)
+        print(f"🔁 {len(resent)} filas reenviadas ({int(resent['id'].isin(coins[: n_coins // 2]).sum())} corregidas)")
+
+        all_obs = to_observations(read_delta_partitions(silver))
+        assert len(all_obs) == sum(len(batch) for batch in batches), "Silver duplicó filas reenviadas"
+        start = time.perf_counter()
+        full_hourly, full_daily = compute_gold_full(all_obs)
+        full_seconds = time.perf_counter() - start
+
+        compare("horarias", read_delta_partitions(hourly), full_hourly, BAR_COLUMNS[:5] + ["n_obs"] + METRIC_COLUMNS)
+        compare("diarias", read_delta_partitions(daily), full_daily, BAR_COLUMNS[:5] + ["n_obs"])
+
+    print(f"\n{'lotes':>6} {'incremental medio (s)':>22} {'recálculo en memoria (s)':>25}")
+    print(f"{len(timings):>6} {np.mean(timings):>22.3f} {full_seconds:>25.3f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,80 @@
+# bench/bench_ingest.py
+"""
+Compara la ingesta de una respuesta de /coins/markets hasta el pyarrow.Table que recibe Delta:
+- pandas: JSON → dicts → DataFrame → columnas de partición → pa.Table.from_pandas
+- arrow: JSON → pyarrow.Table tipado (lector JSON de Arrow) → columnas de partición
+
+Cada caso corre en un subproceso para medir el pico de memoria (RSS) de forma aislada.
+
+Uso: python bench/bench_ingest.py [filas ...]
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def child(mode, path):
+    import pandas as pd
+    import pyarrow as pa
+    from delta_utils import to_arrow
+    from utils.arrow_utils import add_partition_columns, json_to_arrow
+
+    now = datetime(2025, 6, 18, 22)
+    base = rss_mb()
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        body = f.read()
+    if mode == "pandas":
+        df = pd.DataFrame(json.loads(body))
+        df["coin"] = df["id"]
+        df["date"] = now.strftime("%Y-%m-%d")
+        df["day"] = now.strftime("%d")
+        df["hour"] = now.strftime("%H")
+        table = to_arrow(df)
+    else:
+        table = to_arrow(add_partition_columns(json_to_arrow(body), now))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    assert isinstance(table, pa.Table)
+    print(json.dumps({"seconds": elapsed, "peak_mb": peak - base, "rows": table.num_rows}))
+
+
+def main(sizes):
+    from fake_api import market_row
+
+    print(f"{'rows':>8} {'mode':>7} {'time (s)':>9} {'peak Δ (MB)':>12}")
+    for n in sizes:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            f.write(json.dumps([market_row(f"coin-{i:06d}", i % 30000 + 1) for i in range(n)]).encode())
+            path = f.name
+        try:
+            for mode in ("pandas", "arrow"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"{n:>8} {mode:>7} {result['seconds']:>9.3f} {result['peak_mb']:>12.1f}")
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main([int(n) for n in sys.argv[1:]] or [10_000, 100_000])
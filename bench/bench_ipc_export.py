@@ -0,0 +1,123 @@
+# bench/bench_ipc_export.py
+"""
+Compara la carga de la historia completa de precios de muchas monedas (caso backtesting):
+
+- delta → pandas: DeltaTable(path).to_pandas() de las columnas de precio y separar por moneda.
+- IPC (memory map): ipc_export.load_history sobre la exportación Arrow IPC por moneda.
+
+También mide la exportación inicial, una actualización incremental de una hora (segmento
+nuevo por moneda) y verifica que la historia exportada coincida con Silver.
+Para cada carga informa el tiempo y la memoria retenida por el resultado (con memory map los
+buffers quedan en el archivo mapeado, en el page cache, y no se copian al heap del proceso).
+
+Uso: python bench/bench_ipc_export.py [días] [monedas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from deltalake import DeltaTable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids  # noqa: E402
+from delta_utils import CDF_CONFIG, save_data_as_delta  # noqa: E402
+from ipc_export import SILVER_COLUMNS, TS_COLUMN, VALUE_COLUMNS, export_ipc, load_history  # noqa: E402
+
+END = datetime(2025, 6, 30, tzinfo=timezone.utc)
+
+
+def silver_table(coins, hours):
+    """Tabla tipo Silver (columnas de precio + partición por fecha) de len(coins) × len(hours) filas."""
+    rng = np.random.default_rng(0)
+    n_coins, n_hours = len(coins), len(hours)
+    ts = np.repeat(np.array([h.replace(tzinfo=None) for h in hours], dtype="datetime64[us]"), n_coins)
+    base = np.tile(rng.lognormal(mean=2.0, sigma=2.0, size=n_coins), n_hours)
+    price = base * np.exp(rng.normal(scale=0.01, size=n_coins * n_hours))
+    last_updated = pa.array(ts, pa.timestamp("us", tz="UTC"))
+    return pa.table({
+        "id": pa.array(np.tile(np.array(coins, dtype=object), n_hours), pa.string()),
+        "last_updated": last_updated,
+        "current_price": price,
+        "market_cap": price * 1e6,
+        "total_volume": price * 1e4,
+        "date": pc.strftime(last_updated, format="%Y-%m-%d"),
+    })
+
+
+def load_from_delta(path):
+    df = DeltaTable(path).to_pandas(columns=SILVER_COLUMNS)
+    df["id"] = df["id"].astype("category")
+    return {coin: group for coin, group in df.groupby("id", observed=True, sort=False)}
+
+
+def measured(fn):
+    """Tiempo y memoria retenida por el resultado (buffers de Arrow + arrays de numpy)."""
+    before = pa.total_allocated_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] + pa.total_allocated_bytes() - before
+    tracemalloc.stop()
+    return result, seconds, retained
+
+
+def check(history, table, coins):
+    """La historia exportada de algunas monedas coincide con las filas de Silver."""
+    for coin in coins:
+        rows = table.filter(pc.equal(table.column("id"), coin)).sort_by("last_updated")
+        exported = history[coin]
+        expected_ts = rows.column("last_updated").cast(pa.int64()).to_numpy()
+        assert np.array_equal(exported.column(TS_COLUMN).to_numpy(), expected_ts), f"{coin}: instantes distintos"
+        for col in VALUE_COLUMNS:
+            assert np.array_equal(exported.column(col).to_numpy(), rows.column(col).to_numpy()), f"{coin}: difiere {col}"
+
+
+def main(days=365, n_coins=1000):
+    coins = coin_ids(n_coins)
+    hours = [END - timedelta(hours=h) for h in range(days * 24, 0, -1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        silver = os.path.join(tmp, "silver")
+        root = os.path.join(tmp, "markets_ipc")
+        table = silver_table(coins, hours)
+        save_data_as_delta(table, silver, mode="overwrite", partition_cols=["date"], configuration=CDF_CONFIG)
+        print(f"🧪 Silver sintética: {table.num_rows:,} filas ({days} días × {n_coins} monedas)")
+
+        start = time.perf_counter()
+        export_ipc(silver, root)
+        export_s = time.perf_counter() - start
+
+        # Una hora nueva: un segmento más por moneda
+        new_hour = silver_table(coins, [END])
+        save_data_as_delta(new_hour, silver, mode="append", partition_cols=["date"])
+        start = time.perf_counter()
+        export_ipc(silver, root, batch=new_hour.to_pandas(), batch_version=DeltaTable(silver).version())
+        increment_s = time.perf_counter() - start
+        table = pa.concat_tables([table, new_hour])
+
+        _, delta_s, delta_bytes = measured(lambda: load_from_delta(silver))
+        history, ipc_s, ipc_bytes = measured(lambda: load_history(root))
+        assert len(history) == n_coins
+        check(history, table, coins[:: max(1, n_coins // 20)])
+        print("✅ La historia exportada coincide con Silver")
+
+    print(f"\n{'etapa':<28} {'segundos':>10} {'MB heap':>10}")
+    print(f"{'exportación inicial':<28} {export_s:>10.3f}")
+    print(f"{'exportación de 1 hora':<28} {increment_s:>10.3f}")
+    print(f"{'carga delta → pandas':<28} {delta_s:>10.3f} {delta_bytes / 2**20:>10.1f}")
+    print(f"{'carga IPC (memory map)':<28} {ipc_s:>10.3f} {ipc_bytes / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
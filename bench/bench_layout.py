@@ -0,0 +1,58 @@
+# bench/bench_layout.py
+"""
+Compara layouts de particionamiento de la tabla de mercados con dos consultas típicas:
+- un día, todas las monedas
+- una moneda, todos los días
+
+Uso: python bench/bench_layout.py [días] [monedas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids, hourly_timestamps, make_market_rows  # noqa: E402
+from delta_utils import delta_table_stats, read_delta_partitions, save_data_as_delta  # noqa: E402
+from layout import LAYOUTS, add_layout_columns  # noqa: E402
+
+import pandas as pd  # noqa: E402
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(fn())
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+
+def build(path, layout, days, n_coins):
+    coins = coin_ids(n_coins)
+    stamps = hourly_timestamps(days)
+    df = pd.concat([make_market_rows(coins, ts, seed=i) for i, ts in enumerate(stamps)], ignore_index=True)
+    save_data_as_delta(add_layout_columns(df, layout), path, mode="overwrite", partition_cols=LAYOUTS[layout])
+    return stamps[-1].strftime("%Y-%m-%d"), coins[0]
+
+
+def main(days=30, n_coins=4):
+    print(f"{days} días × {n_coins} monedas (horario)")
+    print(f"{'layout':>12} {'files':>6} {'1 día/todas (s)':>16} {'1 moneda/todo (s)':>18}")
+    for layout in LAYOUTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, layout)
+            date_str, coin = build(path, layout, days, n_coins)
+            one_day, rows_day = timed(lambda: read_delta_partitions(path, [("date", "=", date_str)]))
+            one_coin, rows_coin = timed(lambda: read_delta_partitions(path, [("coin", "=", coin)]))
+            assert rows_day == 24 * n_coins and rows_coin == 24 * days
+            files = delta_table_stats(path)["files"]
+            print(f"{layout:>12} {files:>6} {one_day:>16.3f} {one_coin:>18.3f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 30, int(args[1]) if len(args) > 1 else 4)
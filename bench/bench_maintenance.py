@@ -0,0 +1,64 @@
+# bench/bench_maintenance.py
+"""
+Compara el tiempo de apertura + scan completo de una tabla Bronze fragmentada
+(un commit pequeño por corrida, 4 corridas por hora) contra la misma tabla
+después de maintain_table (compactación + checkpoint + vacuum), para el layout
+horario actual y para un layout particionado solo por fecha.
+
+Uso: python bench/bench_maintenance.py [días] [monedas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from deltalake import DeltaTable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import timedelta  # noqa: E402
+
+from synthetic import coin_ids, hourly_timestamps, make_market_rows  # noqa: E402
+from delta_utils import save_data_as_delta  # noqa: E402
+from maintenance import maintain_table  # noqa: E402
+
+
+def scan(path):
+    start = time.perf_counter()
+    rows = DeltaTable(path).to_pyarrow_table().num_rows
+    return time.perf_counter() - start, rows
+
+
+LAYOUTS = {
+    "coin/date/day/hour": ["coin", "date", "day", "hour"],
+    "date": ["date"],
+}
+
+
+def main(days=3, n_coins=20):
+    coins = coin_ids(n_coins)
+    print(f"{days} días × {n_coins} monedas, 4 corridas por hora")
+    print(f"{'layout':>20} {'':>11} {'files':>7} {'MB':>8} {'scan (s)':>9}")
+    for layout, partition_cols in LAYOUTS.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bronze")
+            for i, ts in enumerate(hourly_timestamps(days)):
+                for run in range(4):
+                    rows = make_market_rows(coins, ts + timedelta(minutes=15 * run), seed=i)
+                    save_data_as_delta(rows, path, mode="append", partition_cols=partition_cols)
+
+            fragmented, rows = scan(path)
+            report = maintain_table(path, retention_hours=0)
+            compacted, rows_after = scan(path)
+            assert rows == rows_after
+
+            for label, stats, elapsed in (("fragmented", report["before"], fragmented),
+                                          ("compacted", report["after"], compacted)):
+                print(f"{layout:>20} {label:>11} {stats['files']:>7} {stats['bytes'] / 2**20:>8.2f} {elapsed:>9.3f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 3, int(args[1]) if len(args) > 1 else 20)
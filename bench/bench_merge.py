@@ -0,0 +1,86 @@
+# bench/bench_merge.py
+"""
+Mide la latencia del upsert de una hora nueva en Bronze según la historia de la tabla, con
+los layouts "hourly" y "date":
+- full: predicado original (el MERGE escanea toda la tabla)
+- scoped: predicado restringido (scope_partitions=True) a las particiones del lote que
+  dependen de la llave (coin / coin_bucket) y a las fechas desde el last_updated más antiguo
+  del lote menos un día. El lote es una hora completa (todas las monedas), así que lo que
+  acota el MERGE es la cota de fecha.
+
+Además de los tiempos, informa los archivos del target que escaneó cada MERGE (métricas del
+commit) y verifica que el scoped escanee menos archivos que el full cuando la historia tiene
+más de dos días. Antes de medir verifica que reenviar el mismo snapshot (id, last_updated)
+en una hora posterior no agregue filas, con cada layout.
+
+Uso: python bench/bench_merge.py [días ...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_bronze_table, coin_ids, make_market_rows  # noqa: E402
+from delta_utils import read_commit_actions, read_delta_partitions, upsert_data_as_delta  # noqa: E402
+from layout import LAYOUTS, add_layout_columns  # noqa: E402
+
+PREDICATE = "target.id = source.id AND target.last_updated = source.last_updated"
+N_COINS = 4
+BENCH_LAYOUTS = ("hourly", "date")
+
+
+def check_resend(tmp):
+    """El mismo snapshot extraído en la hora siguiente actualiza la fila existente, no la duplica."""
+    ts = datetime(2025, 6, 18, 23)
+    for layout, cols in LAYOUTS.items():
+        path = os.path.join(tmp, f"resend_{layout}")
+        rows = make_market_rows(coin_ids(N_COINS), ts)
+        upsert_data_as_delta(add_layout_columns(rows, layout), path, PREDICATE, partition_cols=cols)
+        # Misma llave, particiones de extracción de la hora (y el día) siguiente
+        later = rows.assign(date="2025-06-19", day="19", hour="00")
+        upsert_data_as_delta(add_layout_columns(later, layout), path, PREDICATE, partition_cols=cols)
+        count = len(read_delta_partitions(path, columns=["id"]))
+        assert count == N_COINS, f"{layout}: {count} filas tras reenviar {N_COINS} snapshots"
+    print(f"✅ Reenviar un snapshot en otra hora no duplica filas ({', '.join(LAYOUTS)})")
+
+
+def scanned_files(path):
+    """Archivos del target que escaneó el último MERGE (None si el commit no lo informa)."""
+    return read_commit_actions(path)["metrics"].get("num_target_files_scanned")
+
+
+def main(days_list):
+    with tempfile.TemporaryDirectory() as tmp:
+        check_resend(tmp)
+    print(f"{'layout':>8} {'days':>6} {'full (s)':>10} {'scoped (s)':>11} {'files full':>11} {'files scoped':>13}")
+    for layout in BENCH_LAYOUTS:
+        for days in days_list:
+            with tempfile.TemporaryDirectory() as tmp:
+                base = os.path.join(tmp, "base")
+                last = build_bronze_table(base, days, n_coins=N_COINS, partition_cols=LAYOUTS[layout])
+                batch = make_market_rows(coin_ids(N_COINS), last + timedelta(hours=1))
+                timings, files = {}, {}
+                for mode in ("full", "scoped"):
+                    path = os.path.join(tmp, mode)
+                    shutil.copytree(base, path)
+                    start = time.perf_counter()
+                    upsert_data_as_delta(batch, path, PREDICATE, scope_partitions=(mode == "scoped"))
+                    timings[mode] = time.perf_counter() - start
+                    files[mode] = scanned_files(path)
+                    assert len(read_delta_partitions(path, columns=["id"])) == days * 24 * N_COINS + N_COINS
+                print(f"{layout:>8} {days:>6} {timings['full']:>10.3f} {timings['scoped']:>11.3f} "
+                      f"{files['full'] if files['full'] is not None else '-':>11} "
+                      f"{files['scoped'] if files['scoped'] is not None else '-':>13}")
+                if days > 2 and None not in files.values():
+                    assert files["scoped"] < files["full"], \
+                        f"{layout}, {days} días: el MERGE acotado escaneó {files['scoped']} archivos (full: {files['full']})"
+
+
+if __name__ == "__main__":
+    main([int(d) for d in sys.argv[1:]] or [1, 7, 30])
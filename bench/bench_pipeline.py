@@ -0,0 +1,169 @@
+# bench/bench_pipeline.py
+"""
+Benchmark de punta a punta de main.main, sin red, a distintas escalas de monedas y de historia.
+
+Cada escenario corre en un subproceso, dentro de un directorio temporal (el datalake y state/
+son relativos al directorio de trabajo), contra el servidor simulado de fake_api.py:
+
+1. Genera Bronze y Silver con `días` de historia (synthetic.build_market_tables) y deja el
+   watermark de Bronze al día, como después de una corrida normal.
+2. Corre main.main dos veces: "first" (además arma Gold, la exportación IPC y la coin list)
+   y "steady" (la corrida horaria típica).
+3. Toma de state/runs.jsonl el tiempo de cada etapa (extracción, upsert en Bronze, Silver,
+   verificación, ...), la mayor RSS al terminar una etapa y el pico de RSS del subproceso
+   (acumulado: el de "steady" incluye la corrida "first").
+
+Los resultados se guardan como JSON (por defecto bench/results/<commit>.json) y, con
+--compare, se contrastan etapa por etapa contra los de otro commit.
+
+Uso:
+    python bench/bench_pipeline.py [--scales 100x7 1000x30] [--layout date_bucket]
+                                   [--out PATH] [--compare bench/results/<otro>.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+DEFAULT_SCALES = ["100x7", "1000x7", "1000x30"]
+# Con el layout horario cada moneda-hora es un archivo: para escalar se usa uno por fecha
+DEFAULT_LAYOUT = "date_bucket"
+RUNS = ("first", "steady")
+
+
+def child(n_coins, days, layout, out_path):
+    """Corre un escenario en el directorio actual y escribe su resultado en `out_path`."""
+    import extract
+    import main
+    from fake_api import FakeCoinGecko
+    from layout import partition_cols
+    from process_markets import save_bronze_watermark
+    from synthetic import build_market_tables
+
+    main.init_runtime()
+    main.PARTITION_LAYOUT = layout
+    main.PARTITION_COLS = partition_cols(layout)
+    main.UNIVERSE = {"mode": "top", "top_n": n_coins}
+
+    result = {"coins": n_coins, "days": days, "layout": layout, "runs": {}}
+    with FakeCoinGecko(n_coins=n_coins) as api:
+        extract.BASE_URL = api.url
+        # Sin límite de tasa: se mide el pipeline, no la espera por presupuesto de la API
+        extract.configure_scheduler(calls_per_minute=10**6, burst=10**6)
+
+        start = time.perf_counter()
+        end = datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0) - timedelta(hours=1)
+        version = build_market_tables(main.BRONZE_PATH, main.SILVER_PATH, days, n_coins, layout=layout, end=end)
+        save_bronze_watermark(main.BRONZE_WATERMARK_FILE, version)
+        result["setup_seconds"] = round(time.perf_counter() - start, 4)
+
+        for run in RUNS:
+            # Sin el estado de la última extracción, main no saltea la corrida por frecuencia
+            if os.path.exists(main.STATE_FILE):
+                os.remove(main.STATE_FILE)
+            main.main()
+
+    with open(main.RUN_LOG_FILE) as f:
+        records = [json.loads(line) for line in f]
+    for run, record in zip(RUNS, records):
+        result["runs"][run] = {
+            "status": record["status"],
+            "seconds": record["seconds"],
+            "stage_rss_mb": max((stage["rss_mb"] for stage in record["stages"] if stage.get("rss_mb") is not None), default=None),
+            "process_peak_rss_mb": record["process_peak_rss_mb"],
+            "stages": {stage["name"]: stage["seconds"] for stage in record["stages"]},
+            "rows": {stage["name"]: stage.get("rows_out") for stage in record["stages"]},
+            "critical_path": {phase: info["stages"] for phase, info in record.get("critical_path", {}).items()},
+        }
+    with open(out_path, "w") as f:
+        json.dump(result, f)
+
+
+def run_scenario(scale, layout):
+    """Corre el escenario `scale` ("monedasxdías") en un subproceso aislado."""
+    n_coins, days = (int(part) for part in scale.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "result.json")
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join([REPO_DIR, BENCH_DIR])}
+        code = f"import bench_pipeline; bench_pipeline.child({n_coins}, {days}, {layout!r}, {out_path!r})"
+        proc = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Falló el escenario {scale}:\n{proc.stderr[-4000:]}")
+        with open(out_path) as f:
+            return json.load(f)
+
+
+def git_commit():
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def print_scenario(scenario):
+    print(f"\n📏 {scenario['coins']} monedas × {scenario['days']} días ({scenario['layout']}), "
+          f"generación {scenario['setup_seconds']:.1f}s")
+    runs = scenario["runs"]
+    stages = list(dict.fromkeys(name for run in runs.values() for name in run["stages"]))
+    print(f"{'etapa':<18}" + "".join(f"{run:>12}" for run in runs))
+    for name in stages:
+        print(f"{name:<18}" + "".join(f"{run['stages'].get(name, float('nan')):>12.3f}" for run in runs.values()))
+    print(f"{'total':<18}" + "".join(f"{run['seconds']:>12.3f}" for run in runs.values()))
+    for label, key in (("RSS etapa (MB)", "stage_rss_mb"), ("pico proceso (MB)", "process_peak_rss_mb")):
+        print(f"{label:<18}" + "".join(f"{run[key] if run[key] is not None else float('nan'):>12.1f}" for run in runs.values()))
+
+
+def compare(current, baseline):
+    """Imprime, por escenario y etapa de la corrida "steady", el tiempo actual vs. el de referencia."""
+    reference = {(s["coins"], s["days"], s["layout"]): s for s in baseline["scenarios"]}
+    print(f"\n🔁 Comparación con {baseline['commit']} (corrida steady)")
+    for scenario in current["scenarios"]:
+        other = reference.get((scenario["coins"], scenario["days"], scenario["layout"]))
+        if other is None:
+            continue
+        print(f"\n{scenario['coins']} × {scenario['days']}")
+        print(f"{'etapa':<18} {'antes':>10} {'ahora':>10} {'ratio':>8}")
+        now, before = scenario["runs"]["steady"]["stages"], other["runs"]["steady"]["stages"]
+        for name in now:
+            if name in before and before[name] > 0:
+                ratio = now[name] / before[name]
+                flag = "  ⚠️" if ratio > 1.2 else ""
+                print(f"{name:<18} {before[name]:>10.3f} {now[name]:>10.3f} {ratio:>8.2f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta del pipeline (sin red)")
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, help="Escalas monedasxdías, ej: 1000x30")
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT, help="Layout de particiones de las tablas de mercados")
+    parser.add_argument("--out", help="Archivo JSON de resultados (por defecto bench/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="Resultados de otro commit para comparar")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    results = {"commit": commit, "created_at": datetime.now(timezone.utc).isoformat(), "scenarios": []}
+    for scale in args.scales:
+        scenario = run_scenario(scale, args.layout)
+        results["scenarios"].append(scenario)
+        print_scenario(scenario)
+
+    out_path = args.out or os.path.join(BENCH_DIR, "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Resultados en {out_path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
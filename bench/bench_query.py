@@ -0,0 +1,111 @@
+# bench/bench_query.py
+"""
+Mide la latencia de consultas tipo dashboard (query.py) sobre una tabla Silver sintética:
+
+- baseline: lo que hacen hoy los consumidores (DeltaTable(path).to_pandas() de las columnas de
+  precio y filtrar en pandas; la tabla se lee una sola vez para toda la ronda).
+- frío: primera ejecución de la ronda de consultas con el cache vacío (poda + scan proyectado).
+- tibio: la misma ronda repetida (particiones servidas desde el LRU).
+- post-escritura: la ronda después de agregar una hora nueva (solo se leen las particiones nuevas).
+
+También verifica que get_prices y latest_snapshot devuelvan lo mismo que el baseline.
+
+Uso: python bench/bench_query.py [días] [monedas] [layout]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import pandas as pd
+from deltalake import DeltaTable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids, hourly_timestamps, make_market_rows  # noqa: E402
+from delta_utils import save_data_as_delta  # noqa: E402
+from layout import LAYOUTS, add_layout_columns  # noqa: E402
+import query  # noqa: E402
+
+ROUNDS = 10
+DASHBOARD_COINS = 5
+
+
+def silver_rows(coins, stamps, layout):
+    df = pd.concat([make_market_rows(coins, ts, seed=i) for i, ts in enumerate(stamps)], ignore_index=True)
+    df["last_updated"] = pd.to_datetime(df["last_updated"], utc=True)
+    return add_layout_columns(df, layout)
+
+
+def workload(path, coins, last):
+    """Consultas de un refresco de dashboard: series de 24 h y 7 días y último snapshot."""
+    picked = coins[:DASHBOARD_COINS]
+    return [
+        ("prices_24h", lambda: query.get_prices(picked, start=last - timedelta(hours=24), end=last + timedelta(hours=1), path=path)),
+        ("prices_7d", lambda: query.get_prices(picked, start=last - timedelta(days=7), end=last + timedelta(hours=1), path=path)),
+        ("latest", lambda: query.latest_snapshot(coins[:20], path=path)),
+    ]
+
+
+def baseline(path, coins, last):
+    """Equivalente a la ronda de consultas leyendo la tabla completa (una vez) y filtrando en pandas."""
+    picked = coins[:DASHBOARD_COINS]
+    table = DeltaTable(path).to_pandas(columns=query.PRICE_COLUMNS)
+    results = {}
+    for name, start in (("prices_24h", last - timedelta(hours=24)), ("prices_7d", last - timedelta(days=7))):
+        df = table[table["id"].isin(picked) & (table["last_updated"] >= start) & (table["last_updated"] < last + timedelta(hours=1))]
+        results[name] = df.sort_values(["id", "last_updated"])[query.PRICE_COLUMNS].reset_index(drop=True)
+    df = table[table["id"].isin(coins[:20])].sort_values(["id", "last_updated"], ascending=[True, False])
+    results["latest"] = df.drop_duplicates("id")[query.PRICE_COLUMNS].reset_index(drop=True)
+    return results
+
+
+def run_round(queries):
+    start = time.perf_counter()
+    results = {name: fn() for name, fn in queries}
+    return time.perf_counter() - start, results
+
+
+def main(days=7, n_coins=20, layout="hourly"):
+    coins = coin_ids(n_coins)
+    stamps = hourly_timestamps(days)
+    last = pd.Timestamp(stamps[-1], tz="UTC")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "silver")
+        save_data_as_delta(silver_rows(coins, stamps, layout), path, mode="overwrite", partition_cols=LAYOUTS[layout])
+        queries = workload(path, coins, last)
+
+        start = time.perf_counter()
+        expected = baseline(path, coins, last)
+        baseline_s = time.perf_counter() - start
+
+        query.clear_cache()
+        cold_s, results = run_round(queries)
+        for name, df in results.items():
+            pd.testing.assert_frame_equal(df.reset_index(drop=True), expected[name], check_dtype=False)
+        warm = [run_round(queries)[0] for _ in range(ROUNDS)]
+
+        # Una hora nueva: solo las particiones que cambiaron se vuelven a leer
+        new_hour = stamps[-1] + timedelta(hours=1)
+        save_data_as_delta(silver_rows(coins, [new_hour], layout), path, mode="append", partition_cols=LAYOUTS[layout])
+        misses = query.cache_stats()["misses"]
+        after_write_s, _ = run_round(workload(path, coins, last + timedelta(hours=1)))
+        reread = query.cache_stats()["misses"] - misses
+        stats = query.cache_stats()
+
+    print(f"✅ get_prices / latest_snapshot coinciden con el baseline ({layout}, {days} días, {n_coins} monedas)")
+    print(f"\n{'ronda':<16} {'segundos':>10}")
+    print(f"{'baseline':<16} {baseline_s:>10.4f}")
+    print(f"{'frío':<16} {cold_s:>10.4f}")
+    print(f"{'tibio (medio)':<16} {sum(warm) / len(warm):>10.4f}")
+    print(f"{'post-escritura':<16} {after_write_s:>10.4f}   ({reread} particiones releídas)")
+    print(f"\ncache: {stats}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(int(a) for a in args[:2]), *args[2:3])
@@ -0,0 +1,80 @@
+# bench/bench_scheduler.py
+"""
+Verifica el token bucket de request_scheduler con un reloj simulado (sin esperas reales):
+
+1. Con el bucket lleno salen `burst` llamadas juntas y después una cada 1/rate segundos.
+2. Después de una pausa por 429 (Retry-After) no sale una ráfaga: el bucket vuelve a
+   llenarse recién desde el final de la pausa, así que la primera llamada espera la pausa
+   más 1/rate y las siguientes mantienen el ritmo del presupuesto.
+3. Con muchas llamadas, la tasa observada no supera calls_per_minute.
+
+Uso: python bench/bench_scheduler.py [llamadas_por_minuto] [burst] [retry_after_s]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_scheduler import TokenBucket  # noqa: E402
+
+EPS = 1e-9
+
+
+class FakeClock:
+    """Reloj monotónico simulado: sleep() avanza el tiempo en lugar de esperar."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def acquire_times(bucket, clock, n):
+    """Instantes (reloj simulado) en que se obtuvieron `n` tokens consecutivos."""
+    times = []
+    for _ in range(n):
+        bucket.acquire()
+        times.append(clock())
+    return times
+
+
+def main(calls_per_minute=30, burst=5, retry_after=10.0):
+    rate = calls_per_minute / 60.0
+    clock = FakeClock()
+    bucket = TokenBucket(rate, burst, clock=clock, sleep=clock.sleep)
+
+    times = acquire_times(bucket, clock, burst + 3)
+    assert all(t == 0.0 for t in times[:burst]), f"la ráfaga inicial esperó: {times[:burst]}"
+    gaps = [b - a for a, b in zip(times[burst - 1:], times[burst:])]
+    assert all(abs(gap - 1 / rate) < EPS for gap in gaps), f"espaciado incorrecto tras la ráfaga: {gaps}"
+    print(f"✅ Ráfaga inicial de {burst} llamadas y luego una cada {1 / rate:.1f}s")
+
+    # 429 con Retry-After: pausa para todos los threads
+    paused_at = clock()
+    bucket.pause(retry_after)
+    times = acquire_times(bucket, clock, burst)
+    resume = paused_at + retry_after
+    assert abs(times[0] - (resume + 1 / rate)) < EPS, \
+        f"primera llamada tras la pausa en {times[0] - paused_at:.2f}s, se esperaba {retry_after + 1 / rate:.2f}s"
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert all(abs(gap - 1 / rate) < EPS for gap in gaps), f"ráfaga después de la pausa: {gaps}"
+    print(f"✅ Después de una pausa de {retry_after:.0f}s no sale una ráfaga (una llamada cada {1 / rate:.1f}s)")
+
+    # Tasa sostenida: en una ventana larga no se supera el presupuesto (más la capacidad)
+    start = clock()
+    n = calls_per_minute * 5
+    times = acquire_times(bucket, clock, n)
+    elapsed = times[-1] - start
+    allowed = burst + elapsed * rate
+    assert n <= allowed + EPS, f"{n} llamadas en {elapsed:.1f}s superan el presupuesto ({allowed:.1f})"
+    print(f"✅ {n} llamadas en {elapsed:.0f}s simulados, dentro de {calls_per_minute}/min")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 30, int(args[1]) if len(args) > 1 else 5, float(args[2]) if len(args) > 2 else 10.0)
@@ -0,0 +1,123 @@
+# bench/bench_schema_drift.py
+"""
+Verifica el manejo del drift de esquema en Bronze (schema_registry.conform_to_table + MERGE
+con merge_schema, igual que la etapa bronze_upsert de main.py):
+
+1. Primer lote: crea Bronze con los tipos del registro (roi aplanado, last_updated timestamp).
+2. Segundo lote con drift: una columna nueva de la API, una columna que la API dejó de enviar,
+   una fila con un valor no convertible y otra sin llave, más el reenvío de una fila del
+   primer lote con otro precio.
+   - Las dos filas inválidas quedan en la tabla de cuarentena con su motivo.
+   - La columna nueva se agrega a la tabla (evolución con merge_schema).
+   - La fila reenviada se actualiza y conserva el valor previo de la columna que faltó.
+3. Un MERGE que falla propaga el error y no reescribe la tabla: la versión y las filas no
+   cambian y la única escritura que no es MERGE es la creación.
+
+Informa además el tiempo de conform + MERGE del lote con drift.
+
+Uso: python bench/bench_schema_drift.py [monedas]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_api import coin_list, market_row  # noqa: E402
+from delta_utils import CDF_CONFIG, get_table, read_delta_partitions, upsert_data_as_delta  # noqa: E402
+from layout import partition_cols  # noqa: E402
+from schema_registry import conform_to_table  # noqa: E402
+
+PREDICATE = "target.id = source.id AND target.last_updated = source.last_updated"
+PARTITION_COLS = partition_cols("date")
+START = datetime(2025, 6, 18, 20, tzinfo=timezone.utc)
+DROPPED = "fully_diluted_valuation"
+ADDED = "price_change_percentage_7d"
+
+
+def market_batch(coins, ts):
+    df = pd.DataFrame([market_row(coin, rank, ts) for rank, coin in enumerate(coins, start=1)])
+    df["coin"] = df["id"]
+    df["date"] = ts.strftime("%Y-%m-%d")
+    return df
+
+
+def bronze_upsert(df, bronze, quarantine):
+    """conform_to_table + MERGE con merge_schema, como bronze_upsert/save_market_bronze."""
+    table, valid = conform_to_table(df, bronze, quarantine, "Bronze")
+    upsert_data_as_delta(table, bronze, PREDICATE, partition_cols=PARTITION_COLS, configuration=CDF_CONFIG, merge_schema=True)
+    return int(valid.sum())
+
+
+def main(n_coins=50):
+    coins = [c["id"] for c in coin_list(n_coins)]
+    with tempfile.TemporaryDirectory() as tmp:
+        bronze = os.path.join(tmp, "bronze")
+        quarantine = os.path.join(tmp, "quarantine")
+
+        first = market_batch(coins, START)
+        assert bronze_upsert(first, bronze, quarantine) == n_coins
+        schema = get_table(bronze).schema().to_arrow()
+        names = [field.name for field in schema]
+        assert "roi" not in names and "roi_times" in names, f"roi no se aplanó: {names}"
+        print(f"✅ Bronze creado con {n_coins} filas y el esquema del registro")
+
+        # Lote con drift: columna nueva, columna ausente, dos filas inválidas y un reenvío
+        second = market_batch(coins, START + timedelta(hours=1)).drop(columns=[DROPPED])
+        second[ADDED] = 2.5
+        second["current_price"] = second["current_price"].astype(object)
+        second.loc[0, "current_price"] = "n/a"
+        second.loc[1, "id"] = None
+        resent = first.iloc[[2]].drop(columns=[DROPPED]).assign(current_price=first["current_price"].iloc[2] + 1.0)
+        resent[ADDED] = 3.5
+        second = pd.concat([second, resent], ignore_index=True)
+
+        start = time.perf_counter()
+        written = bronze_upsert(second, bronze, quarantine)
+        drift_s = time.perf_counter() - start
+        assert written == n_coins - 1, f"se escribieron {written} filas válidas, se esperaban {n_coins - 1}"
+
+        bad = read_delta_partitions(quarantine, columns=["source", "reason", "record"])
+        assert len(bad) == 2, f"cuarentena con {len(bad)} filas, se esperaban 2"
+        reasons = sorted(bad["reason"])
+        assert any("current_price" in r for r in reasons) and any("'id' nulo" in r for r in reasons), reasons
+        print(f"✅ Filas inválidas en cuarentena: {reasons}")
+
+        df = read_delta_partitions(bronze, columns=["id", "last_updated", "current_price", DROPPED, ADDED])
+        assert ADDED in df.columns, "la columna nueva no se agregó a Bronze"
+        expected = 2 * n_coins - 2
+        assert len(df) == expected, f"Bronze tiene {len(df)} filas, se esperaban {expected}"
+        assert not df.duplicated(["id", "last_updated"]).any(), "filas duplicadas en Bronze"
+        row = df[(df["id"] == coins[2]) & (df["last_updated"] == df["last_updated"].min())].iloc[0]
+        assert row["current_price"] == resent["current_price"].iloc[0], "la fila reenviada no se actualizó"
+        assert row[DROPPED] == first[DROPPED].iloc[2], f"se perdió '{DROPPED}' de la fila reenviada"
+        assert row[ADDED] == 3.5, f"'{ADDED}' no se cargó en la fila reenviada"
+        print(f"✅ Columna nueva '{ADDED}' agregada; la fila reenviada conserva '{DROPPED}'")
+
+        # Un MERGE que falla no reescribe la tabla
+        version = get_table(bronze).version()
+        try:
+            upsert_data_as_delta(first, bronze, "target.no_existe = source.id", partition_cols=PARTITION_COLS)
+            failed = False
+        except Exception:
+            failed = True
+        assert failed, "el MERGE inválido no falló"
+        assert get_table(bronze).version() == version, "el MERGE fallido escribió una versión nueva"
+        assert len(read_delta_partitions(bronze, columns=["id"])) == expected, "el MERGE fallido cambió las filas"
+        operations = [entry["operation"] for entry in get_table(bronze).history()]
+        rewrites = [op for op in operations if op != "MERGE"]
+        assert len(rewrites) == 1, f"operaciones que no son MERGE: {operations}"
+        print(f"✅ Un MERGE fallido no modifica Bronze (historial: {operations[::-1]})")
+
+    print(f"\nconform + MERGE del lote con drift: {drift_s:.3f}s")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
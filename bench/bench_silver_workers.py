@@ -0,0 +1,78 @@
+# bench/bench_silver_workers.py
+"""
+Escalamiento de la transformación Bronze → Silver (process_markets) con la cantidad de procesos:
+
+- 1 worker: transform_markets en el proceso actual (camino por defecto).
+- N workers: transform_markets_parallel, con shards por moneda en un pool de procesos.
+
+Antes de medir se hace una pasada de calentamiento del pool (arranque de los procesos "spawn",
+que en modo serve se paga una sola vez). Verifica que el resultado, ya conformado al esquema
+de Silver, sea el mismo con cualquier cantidad de workers.
+
+Uso: python bench/bench_silver_workers.py [horas] [monedas] [max_workers]
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids, hourly_timestamps, make_market_rows  # noqa: E402
+from process_markets import transform_markets, transform_markets_parallel  # noqa: E402
+from schema_registry import conform  # noqa: E402
+
+REPEAT = 3
+
+
+def bronze_batch(hours, n_coins):
+    """Lote tipo Bronze (como lo lee process_markets) de hours × n_coins filas."""
+    coins = coin_ids(n_coins)
+    df = pd.concat([make_market_rows(coins, ts, seed=i) for i, ts in enumerate(hourly_timestamps(1 + hours // 24)[-hours:])], ignore_index=True)
+    df["day"] = df["day"].astype("int8")
+    df["hour"] = df["hour"].astype("int8")
+    return df
+
+
+def conformed(data):
+    table = conform(data)[0]
+    return table.sort_by([("id", "ascending"), ("last_updated", "ascending")])
+
+
+def timed(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(hours=48, n_coins=5000, max_workers=None):
+    max_workers = max_workers or os.cpu_count()
+    df = bronze_batch(hours, n_coins)
+    print(f"🧪 Lote Bronze: {len(df):,} filas ({hours} horas × {n_coins} monedas), {os.cpu_count()} CPUs")
+
+    serial_s, serial = timed(lambda: transform_markets(df.copy()))
+    expected = conformed(serial)
+
+    print(f"\n{'workers':>8} {'arranque (s)':>13} {'transformación (s)':>19} {'speedup':>8}")
+    print(f"{1:>8} {'':>13} {serial_s:>19.3f} {1.0:>8.2f}")
+    workers = 2
+    while workers <= max_workers:
+        start = time.perf_counter()
+        transform_markets_parallel(df.head(workers * 100), workers=workers)
+        startup_s = time.perf_counter() - start
+        parallel_s, table = timed(lambda: transform_markets_parallel(df, workers=workers))
+        assert conformed(table).equals(expected), f"{workers} workers: resultado distinto al serial"
+        print(f"{workers:>8} {startup_s:>13.3f} {parallel_s:>19.3f} {serial_s / parallel_s:>8.2f}")
+        workers *= 2
+    print("\n✅ Mismo resultado conformado con cualquier cantidad de workers")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,88 @@
+# bench/bench_startup.py
+"""
+Mide el arranque de una invocación de cron que se saltea (la última extracción fue hace menos
+de una hora), que es la mayoría cuando el cron corre más seguido que el pipeline:
+
+- time-to-skip: tiempo de pared de `python main.py` hasta salir por should_extract.
+- importación de main: tiempo acumulado según `python -X importtime` y módulos más costosos.
+- referencia: importar pandas, pyarrow, deltalake y requests (lo que antes se pagaba siempre).
+
+Cada medición corre en un proceso nuevo, en un directorio temporal con state/ preparado.
+
+Uso: python bench/bench_startup.py [repeticiones]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "pyarrow", "deltalake", "requests"]
+TOP_MODULES = 8
+
+
+def run(args, cwd):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONPATH": REPO_DIR})
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return elapsed, proc
+
+
+def best_ms(args, cwd, repeat):
+    return min(run(args, cwd)[0] for _ in range(repeat)) * 1000
+
+
+def import_times(module, cwd):
+    """(módulo, acumulado en ms) de `-X importtime`, del más costoso al menos costoso."""
+    _, proc = run(["-X", "importtime", "-c", f"import {module}"], cwd)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((name, int(cumulative) / 1000))
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def main(repeat=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "state"))
+        with open(os.path.join(tmp, "state", "last_extraction.json"), "w") as f:
+            json.dump({"last_extraction": datetime.now(timezone.utc).isoformat(timespec="seconds")}, f)
+
+        _, proc = run([os.path.join(REPO_DIR, "main.py")], tmp)
+        assert "Skipping" in proc.stderr, "main.py no se salteó la corrida"
+        interpreter_ms = best_ms(["-c", "pass"], tmp, repeat)
+        skip_ms = best_ms([os.path.join(REPO_DIR, "main.py")], tmp, repeat)
+        modules = import_times("main", tmp)
+        loaded = {name.strip() for name, _ in modules}
+        try:
+            heavy_ms = best_ms(["-c", "import " + ", ".join(HEAVY_MODULES)], tmp, repeat)
+        except RuntimeError:
+            heavy_ms = None
+
+    print(f"{'medición':<40} {'ms':>10}")
+    print(f"{'intérprete vacío':<40} {interpreter_ms:>10.1f}")
+    print(f"{'time-to-skip (python main.py)':<40} {skip_ms:>10.1f}")
+    print(f"{'import main (-X importtime)':<40} {modules[0][1] if modules else 0.0:>10.1f}")
+    if heavy_ms is not None:
+        print(f"{'import ' + ', '.join(HEAVY_MODULES):<40} {heavy_ms:>10.1f}")
+    print("\nMódulos más costosos al importar main:")
+    for name, ms in modules[:TOP_MODULES]:
+        print(f"  {name:<38} {ms:>10.1f}")
+    eager = sorted(module for module in HEAVY_MODULES if module in loaded)
+    if eager:
+        print(f"\n⚠️ Módulos pesados importados al arrancar: {eager}")
+    else:
+        print("\n✅ Ningún módulo pesado se importa antes de decidir si correr")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
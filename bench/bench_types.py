@@ -0,0 +1,82 @@
+# bench/bench_types.py
+"""
+Microbenchmark de la conversión de tipos de Silver sobre N filas crudas:
+- legacy: fillna(IMPUTATION_MAP) + astype/to_datetime columna por columna (implementación anterior)
+- compiled: apply_column_types(df, imputation_map=IMPUTATION_MAP) con el mapa compilado
+
+Mide tiempo (mejor de REPEAT corridas) y pico de memoria asignada (tracemalloc) por encima
+del DataFrame de entrada, y verifica que compiled no sea peor que legacy en ninguno de los dos
+(con TIME_TOLERANCE de margen para el ruido en el tiempo).
+
+Uso: python bench/bench_types.py [filas]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import coin_ids, make_market_rows  # noqa: E402
+from schema import IMPUTATION_MAP, TYPE_MAP  # noqa: E402
+from utils.data_validation import apply_column_types  # noqa: E402
+
+REPEAT = 3
+TIME_TOLERANCE = 1.05
+
+
+def legacy_apply_column_types(df):
+    df = df.fillna(IMPUTATION_MAP)
+    for col, dtype in TYPE_MAP.items():
+        if col in df.columns:
+            try:
+                if dtype == "datetime64[ns]":
+                    df[col] = pd.to_datetime(df[col], utc=True)
+                else:
+                    df[col] = df[col].astype(dtype)
+            except Exception as e:
+                print(f"⚠️ No se pudo convertir '{col}' a {dtype}: {e}")
+    return df
+
+
+def compiled_apply_column_types(df):
+    return apply_column_types(df, imputation_map=IMPUTATION_MAP)
+
+
+def measure(fn, df):
+    # Tiempo y memoria en corridas separadas: tracemalloc distorsiona los tiempos
+    elapsed = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(df.copy(deep=False))
+        elapsed = min(elapsed, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(df.copy(deep=False))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main(n_rows=1_000_000):
+    df = make_market_rows(coin_ids(n_rows), datetime(2025, 6, 18, 22))
+    df["market_cap_rank"] = (df["market_cap_rank"] % 30000).astype("float64")
+    df.loc[df.index[::10], "current_price"] = None
+    print(f"{n_rows} filas")
+    print(f"{'impl':>9} {'time (s)':>9} {'peak (MB)':>10}")
+    results = {}
+    for name, fn in (("legacy", legacy_apply_column_types), ("compiled", compiled_apply_column_types)):
+        elapsed, peak = results[name] = measure(fn, df)
+        print(f"{name:>9} {elapsed:>9.3f} {peak:>10.1f}")
+    (legacy_s, legacy_mb), (compiled_s, compiled_mb) = results["legacy"], results["compiled"]
+    assert compiled_s <= legacy_s * TIME_TOLERANCE, f"compiled más lento que legacy: {compiled_s:.3f}s vs {legacy_s:.3f}s"
+    assert compiled_mb <= legacy_mb, f"compiled usa más memoria que legacy: {compiled_mb:.1f} MB vs {legacy_mb:.1f} MB"
+    print("✅ compiled no es peor que legacy en tiempo ni en memoria")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,159 @@
+# bench/fake_api.py
+"""
+Servidor HTTP local que imita los endpoints de CoinGecko usados por el pipeline.
+Permite correr extracción y benchmarks sin tocar la API real.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def coin_list(n_coins):
+    """Payload de /coins/list con n monedas sintéticas."""
+    return [{"id": f"coin-{i:05d}", "symbol": f"c{i}", "name": f"Coin {i}"} for i in range(n_coins)]
+
+
+def market_row(coin_id, rank, now=None):
+    """Un registro de /coins/markets determinístico para la moneda dada."""
+    now = now or datetime.now(timezone.utc)
+    price = 1.0 + (hash(coin_id) % 100000) / 100
+    return {
+        "id": coin_id, "symbol": coin_id[-3:], "name": coin_id.title(),
+        "image": "https://example.invalid/coin.png",
+        "current_price": price, "market_cap": price * 1e6, "market_cap_rank": rank,
+        "fully_diluted_valuation": price * 2e6, "total_volume": price * 1e4,
+        "high_24h": price * 1.05, "low_24h": price * 0.95, "price_change_24h": price * 0.01,
+        "price_change_percentage_24h": 1.0, "market_cap_change_24h": price * 1e4,
+        "market_cap_change_percentage_24h": 1.0, "circulating_supply": 1e6,
+        "total_supply": 2e6, "max_supply": None, "ath": price * 2,
+        "ath_change_percentage": -50.0, "ath_date": "2021-11-10T14:24:11.849Z",
+        "atl": price / 10, "atl_change_percentage": 900.0, "atl_date": "2015-10-20T00:00:00.000Z",
+        "roi": None, "last_updated": now.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "price_change_percentage_24h_in_currency": 1.0,
+    }
+
+
+def chart_series(coin_id, start_ts, end_ts, step=3600):
+    """
+    Payload de /coins/{id}/market_chart/range: una serie horaria determinística
+    (misma moneda e instante, mismo valor en cualquier proceso).
+    """
+    seed = zlib.crc32(coin_id.encode())
+    base = 1.0 + (seed % 100000) / 100
+    first = -(-int(start_ts) // step) * step
+    prices, caps, volumes = [], [], []
+    for ts in range(first, int(end_ts) + 1, step):
+        price = round(base * (1 + 0.1 * math.sin(ts / 86400 + seed % 7)), 6)
+        prices.append([ts * 1000, price])
+        caps.append([ts * 1000, price * 1e6])
+        volumes.append([ts * 1000, price * 1e4])
+    return {"prices": prices, "market_caps": caps, "total_volumes": volumes}
+
+
+class FakeCoinGecko:
+    """
+    Servidor /coins/list, /coins/markets y /coins/{id}/market_chart/range en un thread aparte.
+
+    Args:
+        n_coins (int): cantidad de monedas del universo simulado.
+        latency (float): segundos de espera simulada por request.
+        throttle_every (int): si > 0, cada N-ésimo request responde 429 con Retry-After.
+        retry_after (float): valor del header Retry-After de los 429 simulados.
+    """
+
+    def __init__(self, n_coins=100, latency=0.0, throttle_every=0, retry_after=1):
+        self.n_coins = n_coins
+        self.coins = coin_list(n_coins)  # Mutable: permite simular altas, bajas y renombres
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, path, query):
+        """Devuelve (status, headers, body) para el request dado."""
+        if path.endswith("/coins/list"):
+            return 200, {}, self.coins
+        if path.endswith("/coins/markets"):
+            if "ids" in query:
+                ids = [c for c in query["ids"][0].split(",") if c]
+            else:
+                ids = [c["id"] for c in self.coins]
+            per_page = int(query.get("per_page", ["100"])[0])
+            page = int(query.get("page", ["1"])[0])
+            start = (page - 1) * per_page
+            now = datetime.now(timezone.utc)
+            return 200, {}, [market_row(c, start + i + 1, now) for i, c in enumerate(ids[start:start + per_page])]
+        if path.endswith("/market_chart/range"):
+            coin_id = path.split("/")[-3]
+            if coin_id not in {c["id"] for c in self.coins}:
+                return 404, {}, {"error": "coin not found"}
+            return 200, {}, chart_series(coin_id, float(query["from"][0]), float(query["to"][0]))
+        return 404, {}, {"error": "not found"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                    throttled = fake.throttle_every and fake.requests % fake.throttle_every == 0
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlparse(self.path)
+                if throttled:
+                    status, headers, body = 429, {"Retry-After": str(fake.retry_after)}, {"error": "rate limited"}
+                else:
+                    status, headers, body = fake.handle(url.path, parse_qs(url.query))
+                data = json.dumps(body).encode()
+                if status == 200 and url.path.endswith("/coins/list"):
+                    # ETag fuerte sobre el contenido, como un CDN
+                    etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+                    headers = {**headers, "ETag": etag}
+                    if self.headers.get("If-None-Match") == etag:
+                        status, data = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
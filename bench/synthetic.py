@@ -0,0 +1,117 @@
+# bench/synthetic.py
+"""
+Generadores de datos sintéticos para los benchmarks del pipeline.
+Producen filas con la misma forma que la respuesta de /coins/markets.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from delta_utils import CDF_CONFIG, get_table, save_data_as_delta  # noqa: E402
+from layout import add_layout_columns, partition_cols as layout_partition_cols  # noqa: E402
+from process_markets import transform_markets  # noqa: E402
+
+
+def coin_ids(n):
+    """Devuelve n ids de monedas sintéticas."""
+    return [f"coin-{i:05d}" for i in range(n)]
+
+
+def make_market_rows(coins, ts, seed=0):
+    """
+    Genera un DataFrame con una fila por moneda para el instante `ts`,
+    con las columnas crudas de /coins/markets más las de partición.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(coins)
+    price = rng.lognormal(mean=2.0, sigma=2.0, size=n)
+    df = pd.DataFrame({
+        "id": coins,
+        "symbol": [c[-3:] for c in coins],
+        "name": [c.title() for c in coins],
+        "image": "https://example.invalid/coin.png",
+        "current_price": price,
+        "market_cap": price * 1e6,
+        "market_cap_rank": np.arange(1, n + 1),
+        "fully_diluted_valuation": price * 2e6,
+        "total_volume": price * 1e4,
+        "high_24h": price * 1.05,
+        "low_24h": price * 0.95,
+        "price_change_24h": price * 0.01,
+        "price_change_percentage_24h": rng.normal(size=n),
+        "market_cap_change_24h": price * 1e4,
+        "market_cap_change_percentage_24h": rng.normal(size=n),
+        "circulating_supply": 1e6,
+        "total_supply": 2e6,
+        "max_supply": 2e6,
+        "ath": price * 2,
+        "ath_change_percentage": -50.0,
+        "ath_date": "2021-11-10T14:24:11.849Z",
+        "atl": price / 10,
+        "atl_change_percentage": 900.0,
+        "atl_date": "2015-10-20T00:00:00.000Z",
+        "last_updated": ts.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    })
+    df["coin"] = df["id"]
+    df["date"] = ts.strftime("%Y-%m-%d")
+    df["day"] = ts.strftime("%d")
+    df["hour"] = ts.strftime("%H")
+    return df
+
+
+def hourly_timestamps(days, end=None):
+    """Devuelve los instantes horarios de los últimos `days` días (el más reciente al final)."""
+    end = end or datetime(2025, 6, 30, 23)
+    return [end - timedelta(hours=h) for h in range(days * 24 - 1, -1, -1)]
+
+
+def build_bronze_table(path, days, n_coins=4, partition_cols=None):
+    """
+    Construye una tabla Bronze sintética con `days` días de particiones horarias.
+    Devuelve el último instante escrito.
+    """
+    partition_cols = partition_cols or ["coin", "date", "day", "hour"]
+    coins = coin_ids(n_coins)
+    stamps = hourly_timestamps(days)
+    df = pd.concat([make_market_rows(coins, ts, seed=i) for i, ts in enumerate(stamps)], ignore_index=True)
+    save_data_as_delta(df, path, mode="overwrite", partition_cols=partition_cols)
+    return stamps[-1]
+
+
+def to_silver_rows(bronze_rows, layout="hourly"):
+    """
+    Aplica a filas de Bronze las transformaciones de process_markets (tipos, imputación,
+    columna derivada y columnas de partición del layout).
+    """
+    df = bronze_rows.copy()
+    df["day"] = df["day"].astype("int8")
+    df["hour"] = df["hour"].astype("int8")
+    return transform_markets(df, layout)
+
+
+def build_market_tables(bronze_path, silver_path, days, n_coins, layout="hourly", end=None):
+    """
+    Construye tablas Bronze (con change data feed) y Silver de mercados con `days` días de
+    historia horaria, como las dejaría el pipeline. Las horas se escriben de a un día para
+    acotar la memoria.
+
+    Retorna:
+        int: versión de Bronze escrita (watermark para que Silver procese solo lo nuevo).
+    """
+    coins = coin_ids(n_coins)
+    stamps = hourly_timestamps(days, end=end)
+    cols = layout_partition_cols(layout)
+    for day_start in range(0, len(stamps), 24):
+        hours = stamps[day_start:day_start + 24]
+        bronze = pd.concat([make_market_rows(coins, ts, seed=day_start + i) for i, ts in enumerate(hours)], ignore_index=True)
+        bronze = add_layout_columns(bronze, layout)
+        mode = "overwrite" if day_start == 0 else "append"
+        save_data_as_delta(bronze, bronze_path, mode=mode, partition_cols=cols, configuration=CDF_CONFIG)
+        save_data_as_delta(to_silver_rows(bronze, layout), silver_path, mode=mode, partition_cols=cols, configuration=CDF_CONFIG)
+    return get_table(bronze_path).version()
@@ -0,0 +1,148 @@
+# change_index.py
+
+"""
+Supresión de filas sin cambios antes de los MERGE de mercados.
+
+CoinGecko suele devolver el mismo snapshot de una moneda (mismo last_updated y mismos valores)
+en llamadas consecutivas. Reescribirlo igual cuesta un MERGE que reescribe archivos y agranda el
+log de Delta. RowChangeIndex guarda, por id, el último (last_updated, hash de la fila) escrito y
+filtra las filas idénticas antes del upsert; si no queda ninguna, el MERGE se omite.
+
+El hash cubre las columnas de valores: se excluyen las de partición y de layout, que dependen
+del momento de la extracción y no del contenido.
+"""
+
+import logging
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from layout import LAYOUT_COLS
+
+logger = logging.getLogger(__name__)
+
+KEY_COL = "id"
+VERSION_COL = "last_updated"
+EXCLUDED_COLS = {"coin", "date", "day", "hour"} | LAYOUT_COLS
+
+# Índices abiertos por ruta (en el modo serve quedan en memoria entre ticks)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def row_hashes(df, exclude=EXCLUDED_COLS):
+    """
+    Hash uint64 por fila de las columnas de valores (orden de columnas estable).
+    Las columnas object (ej: roi como dict) se hashean por su representación en texto.
+    """
+    cols = sorted(col for col in df.columns if col not in exclude)
+    values = df[cols].copy()
+    for col in cols:
+        if values[col].dtype == object:
+            values[col] = values[col].astype(str)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def to_epoch_ns(values):
+    """last_updated (string ISO, datetime o timestamp de Arrow) como int64 ns UTC."""
+    return pd.to_datetime(pd.Series(values), utc=True, format="ISO8601").to_numpy("datetime64[ns]").astype("int64")
+
+
+class RowChangeIndex:
+    """
+    Índice id → (last_updated, hash) persistido en Parquet.
+
+    Uso:
+        changed, pending = index.filter_changed(batch)
+        ... escribir `changed` ...
+        index.commit(pending)   # recién cuando la escritura quedó confirmada
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._entries = pd.read_parquet(path)
+        else:
+            self._entries = pd.DataFrame({
+                KEY_COL: pd.Series(dtype=str),
+                VERSION_COL: pd.Series(dtype="int64"),
+                "row_hash": pd.Series(dtype="uint64"),
+            })
+
+    def __len__(self):
+        return len(self._entries)
+
+    def filter_changed(self, data):
+        """
+        Separa las filas nuevas o modificadas de las idénticas a la última escrita para su id.
+
+        Args:
+            data (DataFrame | pyarrow.Table): lote con columnas id y last_updated.
+
+        Retorna:
+            (DataFrame | pyarrow.Table, DataFrame): filas a escribir (mismo tipo que `data`) y
+            entradas pendientes para commit().
+        """
+        is_arrow = isinstance(data, pa.Table)
+        df = data.to_pandas() if is_arrow else data
+        pending = pd.DataFrame({
+            KEY_COL: df[KEY_COL].astype(str).to_numpy(),
+            VERSION_COL: to_epoch_ns(df[VERSION_COL]),
+            "row_hash": row_hashes(df),
+        })
+        with self._lock:
+            known = pending.merge(self._entries, on=KEY_COL, how="left", suffixes=("", "_known"))
+        unchanged = (known[VERSION_COL] == known[f"{VERSION_COL}_known"]) & (known["row_hash"] == known["row_hash_known"])
+        mask = ~unchanged.to_numpy()
+
+        if mask.all():
+            return data, pending
+        pending = pending[mask].reset_index(drop=True)
+        if is_arrow:
+            return data.filter(pa.array(mask)), pending
+        return data[mask], pending
+
+    def commit(self, pending):
+        """
+        Incorpora las filas escritas y persiste el índice (reemplazo atómico).
+        Por id queda la fila con el last_updated más reciente.
+        """
+        if pending is None or pending.empty:
+            return
+        with self._lock:
+            entries = pd.concat([self._entries, pending], ignore_index=True)
+            entries = entries.sort_values(VERSION_COL, kind="stable").drop_duplicates(KEY_COL, keep="last")
+            self._entries = entries.reset_index(drop=True)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            self._entries.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+
+
+def get_change_index(path):
+    """
+    Devuelve el RowChangeIndex de `path`, cargándolo del disco solo la primera vez.
+    """
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = RowChangeIndex(path)
+        return index
+
+
+def suppress_unchanged(data, index_path, label):
+    """
+    Filtra las filas sin cambios de `data` con el índice de `index_path` y loguea el resultado.
+
+    Retorna:
+        (datos a escribir, entradas pendientes, filas suprimidas)
+    """
+    index = get_change_index(index_path)
+    changed, pending = index.filter_changed(data)
+    suppressed = len(data) - len(changed)
+    if suppressed:
+        logger.info(f"♻️ {label}: {suppressed} filas sin cambios suprimidas, {len(changed)} a escribir.")
+    return changed, pending, suppressed
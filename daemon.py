@@ -0,0 +1,184 @@
+# daemon.py
+
+"""
+Modo residente del pipeline (`python main.py serve`).
+
+En lugar de un cron que lanza un proceso por hora (que vuelve a importar pandas/pyarrow/deltalake
+y a abrir cada tabla), el proceso queda vivo y ejecuta una corrida en cada tick de un calendario
+alineado: cada `every` minutos contados desde la época UTC, desplazados `offset` minutos
+(ej: every=60, offset=2 → hh:02 de cada hora).
+
+- La sesión HTTP (extract.get_session) y los DeltaTable (delta_utils.get_table) quedan abiertos
+  entre ticks y solo se actualizan de forma incremental.
+- La extracción corre en el thread principal y el procesamiento Silver/Gold en un worker aparte:
+  la extracción del tick N+1 puede empezar mientras el tick N todavía se procesa.
+- Un lock de archivo impide que dos instancias (daemon o corrida por cron) ejecuten a la vez.
+"""
+
+import logging
+import math
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from instrumentation import RunRecorder
+
+logger = logging.getLogger(__name__)
+
+
+def _try_lock(f):
+    """Lock exclusivo no bloqueante: flock en Unix, msvcrt.locking (primer byte) en Windows."""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _unlock(f):
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def pipeline_lock(path):
+    """
+    Lock exclusivo no bloqueante sobre `path`. Produce True si se obtuvo el lock y False si
+    otra instancia lo tiene. El lock se libera al salir o si el proceso muere.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as f:
+        if not _try_lock(f):
+            yield False
+            return
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        try:
+            yield True
+        finally:
+            _unlock(f)
+
+
+def next_tick(now_ts, every_s, offset_s=0.0):
+    """
+    Próximo instante (timestamp) estrictamente posterior a `now_ts` alineado a
+    múltiplos de `every_s` desde la época, desplazado `offset_s`.
+    """
+    return (math.floor((now_ts - offset_s) / every_s) + 1) * every_s + offset_s
+
+
+class PipelineDaemon:
+    """
+    Ejecuta el pipeline en cada tick hasta recibir SIGINT/SIGTERM (o `max_ticks`).
+
+    Args:
+        extract_phase (callable): f(now, recorder) -> lote a procesar, o None si no hay datos.
+        process_phase (callable): f(now, recorder, lote); procesamiento Silver/Gold.
+        finish_run (callable): f(recorder); persiste el registro de la corrida.
+        warmup (callable, optional): abre sesiones y tablas antes del primer tick.
+        every_minutes (float): período del calendario.
+        offset_minutes (float): desplazamiento dentro del período.
+        lock_file (str): archivo de lock compartido con las corridas por cron.
+        started_at (float, optional): time.perf_counter() del inicio del proceso, para
+            informar la latencia de arranque.
+        max_ticks (int, optional): cantidad de ticks a ejecutar (por defecto, sin límite).
+    """
+
+    def __init__(self, extract_phase, process_phase, finish_run, warmup=None, every_minutes=60,
+                 offset_minutes=0, lock_file="state/pipeline.lock", started_at=None, max_ticks=None):
+        self.extract_phase = extract_phase
+        self.process_phase = process_phase
+        self.finish_run = finish_run
+        self.warmup = warmup
+        self.every_s = every_minutes * 60
+        self.offset_s = offset_minutes * 60
+        self.lock_file = lock_file
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.max_ticks = max_ticks
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        logger.info("🛑 Deteniendo el daemon al terminar el tick en curso...")
+        self._stop.set()
+
+    def run(self):
+        with pipeline_lock(self.lock_file) as acquired:
+            if not acquired:
+                logger.error(f"❌ Otra instancia tiene el lock {self.lock_file}. No se inicia el daemon.")
+                return False
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGTERM, self.stop)
+                signal.signal(signal.SIGINT, self.stop)
+            if self.warmup:
+                self.warmup()
+            logger.info(f"🚀 Daemon listo en {time.perf_counter() - self.started_at:.2f}s "
+                        f"(cada {self.every_s / 60:g} min, offset {self.offset_s / 60:g} min)")
+
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="serve") as pool:
+                pending = None
+                ticks = 0
+                while not self._stop.is_set() and (self.max_ticks is None or ticks < self.max_ticks):
+                    scheduled = next_tick(time.time(), self.every_s, self.offset_s)
+                    if self._stop.wait(max(0.0, scheduled - time.time())):
+                        break
+                    ticks += 1
+                    if pending is not None and not pending.done():
+                        logger.warning("⏳ El procesamiento del tick anterior sigue en curso; se superpone con la extracción.")
+                    pending = self._tick(pool, scheduled)
+        return True
+
+    def _tick(self, pool, scheduled):
+        """Extrae en este thread y encola el procesamiento en el worker."""
+        recorder = RunRecorder()
+        now = datetime.now(timezone.utc)
+        start = time.time()
+        timing = recorder.extra["tick"] = {
+            "scheduled": datetime.fromtimestamp(scheduled, timezone.utc).isoformat(),
+            "start_delay_s": round(start - scheduled, 3),
+        }
+        try:
+            batch = self.extract_phase(now, recorder)
+        except Exception as e:
+            logger.error(f"❌ Falló la extracción del tick: {e}")
+            self.finish_run(recorder)
+            return None
+        timing["extract_s"] = round(time.time() - start, 3)
+        return pool.submit(self._process, now, recorder, scheduled, batch)
+
+    def _process(self, now, recorder, scheduled, batch):
+        timing = recorder.extra["tick"]
+        start = time.time()
+        try:
+            if batch is not None:
+                self.process_phase(now, recorder, batch)
+        except Exception as e:
+            logger.error(f"❌ Falló el procesamiento del tick: {e}")
+        finally:
+            timing["process_s"] = round(time.time() - start, 3)
+            timing["end_to_end_s"] = round(time.time() - scheduled, 3)
+            self.finish_run(recorder)
+            logger.info(f"⏱️ Tick {timing['scheduled']}: demora {timing['start_delay_s']}s, "
+                        f"extracción {timing['extract_s']}s, procesamiento {timing['process_s']}s, "
+                        f"total {timing['end_to_end_s']}s")
@@ -0,0 +1,132 @@
+# dag.py
+
+"""
+Ejecutor mínimo de etapas con dependencias (DAG).
+
+Cada etapa declara de qué etapas depende; las que no dependen entre sí corren en paralelo
+en un pool de threads acotado. El resultado de cada etapa se pasa en memoria a las que
+dependen de ella (como argumento con el nombre de la dependencia), sin escribir y volver
+a leer Delta entre etapas. Al terminar se informa la ruta crítica: la cadena de etapas
+que determinó el tiempo total.
+
+Ejemplo:
+    stages = [
+        Stage("coins", lambda st: extract_coins()),
+        Stage("markets", lambda st: extract_markets()),
+        Stage("silver", lambda st, markets: process(markets), deps=["markets"]),
+    ]
+    results = run_dag(stages, recorder)
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+DAG_WORKERS = 4
+
+
+@dataclass
+class Stage:
+    """
+    Etapa del DAG. `fn(st, **deps)` recibe el StageRecord de instrumentación y los
+    resultados de sus dependencias; lo que retorna queda disponible para las siguientes.
+    """
+    name: str
+    fn: callable
+    deps: list = field(default_factory=list)
+
+
+def critical_path(stages, spans):
+    """
+    Reconstruye la ruta crítica desde la etapa que terminó última, siguiendo en cada paso
+    la dependencia que terminó más tarde (la que la habilitó).
+
+    Args:
+        stages (dict): nombre → Stage.
+        spans (dict): nombre → (inicio, fin) en segundos desde el comienzo del DAG.
+    """
+    if not spans:
+        return []
+    current = max(spans, key=lambda name: spans[name][1])
+    path = [current]
+    while True:
+        deps = [dep for dep in stages[current].deps if dep in spans]
+        if not deps:
+            break
+        current = max(deps, key=lambda name: spans[name][1])
+        path.append(current)
+    return path[::-1]
+
+
+def run_dag(stages, recorder, name="dag", max_workers=DAG_WORKERS):
+    """
+    Ejecuta las etapas respetando dependencias, con hasta `max_workers` en paralelo.
+
+    Si una etapa falla, las que dependen de ella no se ejecutan (quedan como "skipped"),
+    las independientes continúan y al final se relanza el primer error.
+
+    Retorna:
+        dict: nombre de etapa → resultado.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"La etapa '{stage.name}' depende de etapas inexistentes: {missing}")
+
+    results, spans, errors, skipped = {}, {}, [], set()
+    pending = dict(by_name)
+    start = time.perf_counter()
+
+    def execute(stage):
+        began = time.perf_counter() - start
+        try:
+            with recorder.stage(stage.name) as st:
+                return stage.fn(st, **{dep: results[dep] for dep in stage.deps})
+        finally:
+            spans[stage.name] = (began, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name) as pool:
+        running = {}
+        while pending or running:
+            failed = {stage for stage, error in errors} | skipped
+            for stage in list(pending.values()):
+                if any(dep in failed for dep in stage.deps):
+                    logger.warning(f"⏭️ Etapa '{stage.name}' omitida: falló una dependencia.")
+                    skipped.add(stage.name)
+                    del pending[stage.name]
+                elif all(dep in results for dep in stage.deps):
+                    running[pool.submit(execute, stage)] = stage
+                    del pending[stage.name]
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependencias circulares entre {sorted(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Falló la etapa '{stage.name}': {e}")
+                    errors.append((stage.name, e))
+
+    path = critical_path(by_name, spans)
+    total = time.perf_counter() - start
+    report = recorder.extra.setdefault("critical_path", {})
+    report[name] = {
+        "stages": path,
+        "seconds": round(total, 4),
+        "spans": {stage: [round(a, 4), round(b, 4)] for stage, (a, b) in spans.items()},
+        "skipped": sorted(skipped),
+    }
+    logger.info(f"🧭 Ruta crítica ({name}, {total:.3f}s): " + " → ".join(
+        f"{stage} {spans[stage][1] - spans[stage][0]:.3f}s" for stage in path
+    ))
+    if errors:
+        raise errors[0][1]
+    return results
+
@@ -1,25 +1,310 @@
 # delta_utils.py
 
 import pyarrow as pa
+import pyarrow.compute as pc
 from deltalake import write_deltalake, DeltaTable
 from deltalake.exceptions import TableNotFoundError
+import json
+import os
 import logging
+import threading
+from datetime import date, timedelta
 
 logger = logging.getLogger(__name__)
 
-def save_data_as_delta(df, path, mode="overwrite", partition_cols=None):
+# Propiedades de tabla para habilitar el change data feed (lectura incremental por versión)
+CDF_CONFIG = {"delta.enableChangeDataFeed": "true"}
+CDF_META_COLS = ["_change_type", "_commit_version", "_commit_timestamp"]
+
+# Handles de tablas abiertos, propios de cada thread (ver get_table)
+_open_tables = threading.local()
+
+def get_table(path):
+    """
+    Devuelve un DeltaTable reutilizable para `path`, actualizado a la última versión.
+
+    El primer acceso abre la tabla (lee el log completo o el último checkpoint); los
+    siguientes solo aplican los commits nuevos (update_incremental). En un proceso residente
+    esto evita reabrir cada tabla en cada ejecución. Los handles son propios de cada thread
+    (threading.local): un DeltaTable no debe actualizarse mientras otro thread lo usa, aunque
+    dos threads compartan el nombre. Los threads de vida larga (el principal y el worker del
+    daemon) reutilizan sus handles entre ejecuciones; los de un pool se liberan con el thread.
+    """
+    tables = getattr(_open_tables, "tables", None)
+    if tables is None:
+        tables = _open_tables.tables = {}
+    dt = tables.get(path)
+    if dt is not None:
+        try:
+            dt.update_incremental()
+            return dt
+        except Exception:
+            # La tabla fue reemplazada o borrada (ej: migración): se vuelve a abrir
+            pass
+    dt = DeltaTable(path)
+    tables[path] = dt
+    return dt
+
+def save_data_as_delta(df, path, mode="overwrite", partition_cols=None, configuration=None):
+    """
+    Guarda un DataFrame (o pyarrow.Table) como tabla Delta Lake en la ruta especificada.
+    `configuration` se aplica como propiedades de la tabla al crearla.
+    """
+    write_deltalake(path, df, mode=mode, partition_by=partition_cols, configuration=configuration)
+
+def read_delta_partitions(path, partitions=None, columns=None):
+    """
+    Lee una tabla Delta empujando los filtros y la proyección de columnas al scan.
+
+    Los filtros sobre columnas de partición descartan archivos a partir del log de Delta;
+    los filtros sobre columnas normales (ej: 'hour' en un layout por fecha) se aplican con
+    las estadísticas de los row groups Parquet. Así el costo depende del tamaño del slice
+    pedido y no de la historia de la tabla.
+
+    Args:
+        path (str): Ruta del Delta Lake.
+        partitions (list, optional): Filtros, ej: [("date", "=", "2025-06-18"), ("hour", "=", "22")].
+        columns (list, optional): Columnas a leer (por defecto, todas).
+    """
+    dt = get_table(path)
+    if columns is not None:
+        available = {field.name for field in dt.schema().fields}
+        columns = [col for col in columns if col in available]
+    table_partitions = set(dt.metadata().partition_columns)
+    on_partitions = [f for f in partitions or [] if f[0] in table_partitions]
+    on_data = [f for f in partitions or [] if f[0] not in table_partitions]
+    try:
+        return dt.to_pandas(partitions=on_partitions or None, columns=columns, filters=on_data or None)
+    except pa.ArrowNotImplementedError:
+        # Los archivos escritos por MERGE guardan strings como string_view y pyarrow no puede
+        # comparar el filtro contra ellos: se filtra después del scan (sin poda por estadísticas)
+        read_columns = None if columns is None else list(dict.fromkeys(columns + [f[0] for f in on_data]))
+        table = dt.to_pyarrow_table(partitions=on_partitions or None, columns=read_columns)
+        table = table.filter(_filter_mask(table, on_data))
+        return table.select(columns or table.column_names).to_pandas()
+
+_FILTER_OPS = {"=": pc.equal, "!=": pc.not_equal, "<": pc.less, "<=": pc.less_equal, ">": pc.greater, ">=": pc.greater_equal}
+
+def _filter_mask(table, filters):
+    """Máscara booleana para filtros estilo DNF (col, op, valor) combinados con AND."""
+    mask = None
+    for col, op, value in filters:
+        column = table.column(col)
+        if op in ("in", "not in"):
+            cond = pc.is_in(column, value_set=pa.array(value).cast(column.type))
+            cond = pc.invert(cond) if op == "not in" else cond
+        else:
+            cond = _FILTER_OPS[op](column, pa.scalar(value).cast(column.type))
+        mask = cond if mask is None else pc.and_(mask, cond)
+    return mask
+
+def delta_table_stats(path):
+    """
+    Retorna estadísticas de la versión actual de la tabla a partir del log de transacciones
+    (sin leer datos): versión, cantidad de archivos, bytes y filas.
+    """
+    dt = get_table(path)
+    actions = pa.table(dt.get_add_actions(flatten=True))
+    rows = actions.column("num_records") if "num_records" in actions.column_names else None
+    return {
+        "version": dt.version(),
+        "files": actions.num_rows,
+        "bytes": pc.sum(actions.column("size_bytes")).as_py() or 0,
+        "rows": (pc.sum(rows).as_py() or 0) if rows is not None else None,
+    }
+
+def read_commit_actions(path, version=None):
+    """
+    Resume las acciones de un commit leyendo solo su archivo JSON del _delta_log
+    (costo constante respecto del tamaño de la tabla). Solo para tablas locales.
+
+    Args:
+        path (str): Ruta del Delta Lake.
+        version (int, optional): Versión del commit (por defecto, la última).
+
+    Retorna:
+        dict: version, operation, files_added, bytes_added, rows_added (None si faltan
+        estadísticas), files_removed, partitions (valores de partición de los archivos agregados)
+        y metrics (operationMetrics del commit).
+    """
+    if version is None:
+        version = get_table(path).version()
+    summary = {
+        "version": version,
+        "operation": None,
+        "files_added": 0,
+        "bytes_added": 0,
+        "rows_added": 0,
+        "files_removed": 0,
+        "partitions": [],
+        "metrics": {},
+    }
+    with open(os.path.join(path, "_delta_log", f"{version:020d}.json")) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            action = json.loads(line)
+            if "add" in action:
+                add = action["add"]
+                summary["files_added"] += 1
+                summary["bytes_added"] += add.get("size", 0)
+                stats = json.loads(add["stats"]) if add.get("stats") else {}
+                if summary["rows_added"] is not None and "numRecords" in stats:
+                    summary["rows_added"] += stats["numRecords"]
+                else:
+                    summary["rows_added"] = None
+                if add.get("partitionValues") and add["partitionValues"] not in summary["partitions"]:
+                    summary["partitions"].append(add["partitionValues"])
+            elif "remove" in action:
+                summary["files_removed"] += 1
+            elif "commitInfo" in action:
+                summary["operation"] = action["commitInfo"].get("operation")
+                summary["metrics"] = action["commitInfo"].get("operationMetrics") or {}
+    return summary
+
+def to_arrow(data):
+    """
+    Convierte un DataFrame a pyarrow.Table; si ya es un Table lo devuelve sin copiar.
+    """
+    if isinstance(data, pa.Table):
+        return data
+    return pa.Table.from_pandas(data)
+
+def is_change_data_feed_enabled(dt):
+    """
+    Indica si la tabla Delta tiene habilitado el change data feed.
+    """
+    return dt.metadata().configuration.get("delta.enableChangeDataFeed") == "true"
+
+def enable_change_data_feed(path):
     """
-    Guarda un DataFrame como tabla Delta Lake en la ruta especificada.
+    Habilita el change data feed en una tabla existente (genera una nueva versión de metadata).
+    Los cambios quedan disponibles a partir de la versión retornada.
     """
-    write_deltalake(path, df, mode=mode, partition_by=partition_cols)
+    dt = get_table(path)
+    if not is_change_data_feed_enabled(dt):
+        dt.alter.set_table_properties(CDF_CONFIG)
+        dt = get_table(path)
+    return dt.version()
 
-def save_new_data_as_delta(new_data, data_path, predicate, partition_cols=None):
+def read_delta_changes(path, starting_version, ending_version=None, columns=None):
+    """
+    Lee del change data feed las filas insertadas o actualizadas entre dos versiones (inclusive).
+
+    El costo depende de los archivos escritos en esas versiones, no del tamaño de la tabla.
+    Si una misma fila cambió en varias versiones, se devuelven todas sus versiones ordenadas
+    por `_commit_version` (la última al final).
+
+    Args:
+        path (str): Ruta del Delta Lake (debe tener el change data feed habilitado).
+        starting_version (int): Primera versión a leer.
+        ending_version (int, optional): Última versión a leer (por defecto, la actual).
+        columns (list, optional): Columnas a leer (por defecto, todas).
+    """
+    dt = get_table(path)
+    if columns is not None:
+        columns = list(columns) + [col for col in CDF_META_COLS if col not in columns]
+    reader = dt.load_cdf(starting_version=starting_version, ending_version=ending_version, columns=columns)
+    df = pa.table(reader).to_pandas()
+    df = df[df["_change_type"].isin(["insert", "update_postimage"])]
+    df = df.sort_values("_commit_version", kind="stable")
+    return df.drop(columns=CDF_META_COLS).reset_index(drop=True)
+
+# Más valores distintos que esto en una columna de partición no se agregan al predicado
+MAX_PARTITION_VALUES = 1000
+
+# Columnas de partición de las tablas de mercados que dependen solo de la llave (id): una fila
+# con la misma llave siempre cae en la misma partición. date/day/hour dependen del momento de
+# la extracción, así que restringir por ellas dejaría pasar duplicados de horas anteriores.
+KEY_PARTITION_COLS = ("coin", "coin_bucket")
+
+# Cota temporal del MERGE: una fila se extrae después de su last_updated, así que la partición
+# `date` donde ya puede estar guardada no es anterior a la fecha de last_updated. El margen
+# cubre particiones etiquetadas en hora local antes del paso a UTC.
+TIME_PARTITION_COL = "date"
+TIME_BOUND_MARGIN = timedelta(days=1)
+
+def _sql_literal(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+def partition_predicate(source, partition_cols, alias="target"):
+    """
+    Construye restricciones sobre las particiones del target a partir de los valores
+    distintos de cada columna de partición en el lote fuente.
+
+    Ej: "target.date IN ('2025-06-18') AND target.hour IN ('21', '22')"
+
+    Retorna None si no hay columnas de partición aplicables.
+    """
+    clauses = []
+    for col in partition_cols or []:
+        if col not in source.column_names:
+            continue
+        values = pc.unique(source.column(col)).drop_null().to_pylist()
+        if not values or len(values) > MAX_PARTITION_VALUES:
+            continue
+        literals = ", ".join(_sql_literal(v) for v in sorted(values))
+        clauses.append(f"{alias}.{col} IN ({literals})")
+    return " AND ".join(clauses) if clauses else None
+
+def time_lower_bound(source, time_col="last_updated", alias="target"):
+    """
+    Cota inferior de la partición `date` a partir del last_updated más antiguo del lote:
+    "target.date >= '<fecha mínima - TIME_BOUND_MARGIN>'". None si el lote no trae la columna
+    o no se puede interpretar.
+    """
+    if time_col not in source.column_names:
+        return None
+    values = source.column(time_col)
+    first = pc.min(values).as_py()
+    if first is None:
+        return None
+    if pa.types.is_timestamp(values.type):
+        first = first.date()
+    elif pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        try:
+            first = date.fromisoformat(first[:10])
+        except ValueError:
+            return None
+    else:
+        return None
+    return f"{alias}.{TIME_PARTITION_COL} >= '{(first - TIME_BOUND_MARGIN).isoformat()}'"
+
+def scope_predicate(dt, source, predicate, scope_cols=KEY_PARTITION_COLS, time_col="last_updated"):
+    """
+    Agrega al predicado del MERGE las particiones del target que toca el lote fuente,
+    para que Delta solo escanee y reescriba esas particiones.
+
+    Solo se usan las columnas de partición incluidas en `scope_cols`, que deben ser función
+    de la llave del MERGE; si no, una fila ya guardada en otra partición no coincidiría y se
+    insertaría de nuevo. Si la tabla está particionada por `date` y el lote trae `time_col`,
+    se agrega además una cota inferior de fecha (ver time_lower_bound): una hora nueva
+    escanea solo los últimos días y no toda la historia.
+    """
+    partition_columns = dt.metadata().partition_columns
+    clauses = [partition_predicate(source, [col for col in partition_columns if col in scope_cols])]
+    if TIME_PARTITION_COL in partition_columns and TIME_PARTITION_COL not in scope_cols:
+        clauses.append(time_lower_bound(source, time_col))
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        return predicate
+    return f"({predicate}) AND " + " AND ".join(clauses)
+
+def save_new_data_as_delta(new_data, data_path, predicate, partition_cols=None, configuration=None, scope_partitions=True, scope_cols=KEY_PARTITION_COLS):
     """
     Inserta nuevos datos si no existen previamente en la tabla Delta.
+    Si la tabla no existe se crea con `configuration` (ej: CDF_CONFIG).
+
+    Con `scope_partitions`, el predicado se restringe a las particiones presentes en el lote
+    de las columnas `scope_cols` (ver scope_predicate).
     """
     try:
-        dt = DeltaTable(data_path)
-        new_data_pa = pa.Table.from_pandas(new_data)
+        dt = get_table(data_path)
+        new_data_pa = to_arrow(new_data)
+        if scope_partitions:
+            predicate = scope_predicate(dt, new_data_pa, predicate, scope_cols)
         dt.merge(
             source=new_data_pa,
             source_alias="source",
@@ -27,44 +312,95 @@ def save_new_data_as_delta(new_data, data_path, predicate, partition_cols=None):
             predicate=predicate
         ).when_not_matched_insert_all().execute()
     except TableNotFoundError:
-        save_data_as_delta(new_data, data_path, partition_cols=partition_cols)
+        save_data_as_delta(new_data, data_path, partition_cols=partition_cols, configuration=configuration)
 
-def upsert_data_as_delta(data, data_path, predicate, partition_cols=None):
+def upsert_data_as_delta(data, data_path, predicate, partition_cols=None, configuration=None, scope_partitions=True, merge_schema=False, scope_cols=KEY_PARTITION_COLS):
     """
     Realiza un upsert (insertar o actualizar) en la tabla Delta Lake.
+    Acepta un DataFrame o un pyarrow.Table (que se pasa a Delta sin conversiones).
+    Con `merge_schema`, las columnas nuevas del lote se agregan a la tabla (y las void se amplían).
+
+    Con `scope_partitions`, el predicado se restringe a las particiones presentes en el lote
+    de las columnas `scope_cols` (ver scope_predicate), así el costo del MERGE no crece con
+    la historia de otras monedas.
     """
     try:
-        dt = DeltaTable(data_path)
-        data_pa = pa.Table.from_pandas(data)
+        dt = get_table(data_path)
+        data_pa = to_arrow(data)
+        if scope_partitions:
+            predicate = scope_predicate(dt, data_pa, predicate, scope_cols)
         dt.merge(
             source=data_pa,
             source_alias="source",
             target_alias="target",
-            predicate=predicate
+            predicate=predicate,
+            merge_schema=merge_schema,
         ).when_matched_update_all().when_not_matched_insert_all().execute()
     except TableNotFoundError:
-        save_data_as_delta(data, data_path, mode="overwrite", partition_cols=partition_cols)
+        save_data_as_delta(data, data_path, mode="overwrite", partition_cols=partition_cols, configuration=configuration)
 
-def verify_delta_write(path, date_str, hour):
+def committed_rows(commit):
+    """
+    Filas que escribió la operación de un commit (no las copiadas sin cambios al reescribir
+    archivos en un MERGE). None si el commit no trae métricas ni estadísticas.
     """
-    Verifica que los datos fueron escritos correctamente en la tabla Delta Lake.
+    metrics = commit["metrics"]
+    if commit["operation"] == "MERGE" and "num_target_rows_inserted" in metrics:
+        return metrics["num_target_rows_inserted"] + metrics["num_target_rows_updated"]
+    if "num_added_rows" in metrics:
+        return metrics["num_added_rows"]
+    return commit["rows_added"]
 
-    Args:
-        path (str): Ruta del Delta Lake (ej: silver_path).
-        date_str (str): Fecha de partición (formato YYYY-MM-DD).
-        hour (int): Hora de partición (0–23).
+def verify_delta_write(path, expected_rows, version=None, expected_partitions=None, count_rows=False, scope_cols=KEY_PARTITION_COLS):
     """
-    try:
-        dt = DeltaTable(path)
-        df = dt.to_pandas()
+    Verifica una escritura a partir del log de transacciones (costo constante respecto del
+    tamaño de la tabla): filas escritas por el commit y particiones de los archivos agregados.
 
-        logger.info(f"📅 Fechas disponibles: {df['date'].unique()}")
-        logger.info(f"🕐 Horas disponibles: {df['hour'].unique()}")
+    Args:
+        path (str): Ruta del Delta Lake (ej: silver_path).
+        expected_rows (int): Filas que la etapa intentó escribir.
+        version (int, optional): Versión del commit a verificar (por defecto, la última).
+        expected_partitions (list, optional): Valores de partición del lote (lista de dicts).
+            Los archivos agregados deben caer dentro de ellos en las columnas de `scope_cols`:
+            un MERGE puede reescribir legítimamente archivos de otra fecha u hora (donde ya
+            estaba la fila que actualiza), pero no de otra moneda o bucket.
+        scope_cols (tuple, optional): Columnas de partición que dependen de la llave.
+        count_rows (bool, optional): Si True, además cuenta las filas de las particiones
+            tocadas (lectura podada por partición) y exige que haya al menos `expected_rows`.
 
-        df["hour"] = df["hour"].astype(int)
-        df = df[(df["date"] == date_str) & (df["hour"] == hour)]
+    Retorna:
+        dict: resumen del commit (ver read_commit_actions).
 
-        logger.info(f"✅ Verificación de registros para {date_str} {hour}hs:\n{df.head()}")
+    Lanza:
+        RuntimeError: si el commit no coincide con lo que se intentó escribir.
+    """
+    commit = read_commit_actions(path, version)
+    written = committed_rows(commit)
+    problems = []
+    if written is not None and written != expected_rows:
+        problems.append(f"se escribieron {written} filas y se esperaban {expected_rows}")
+    if expected_rows and not commit["files_added"]:
+        problems.append("el commit no agregó archivos")
+    if expected_partitions is not None:
+        allowed = [{k: v for k, v in p.items() if k in scope_cols} for p in expected_partitions]
+        allowed = [p for p in allowed if p]
+        unexpected = [] if not allowed else [
+            values for values in commit["partitions"]
+            if not any(all(values.get(k) == str(v) for k, v in p.items()) for p in allowed)
+        ]
+        if unexpected:
+            problems.append(f"archivos en particiones fuera del lote: {unexpected[:3]}")
+    if count_rows and commit["partitions"]:
+        dt = get_table(path)
+        found = sum(
+            dt.to_pyarrow_dataset(partitions=[(k, "=", v) for k, v in values.items()]).count_rows()
+            for values in commit["partitions"]
+        )
+        if found < expected_rows:
+            problems.append(f"las particiones tocadas tienen {found} filas (< {expected_rows})")
 
-    except Exception as e:
-        logger.warning(f"⚠️ No se pudo leer/verificar datos en Delta: {e}")
+    if problems:
+        raise RuntimeError(f"Verificación fallida en {path} v{commit['version']} ({commit['operation']}): " + "; ".join(problems))
+    logger.info(f"✅ Verificación {path} v{commit['version']} ({commit['operation']}): {written} filas, "
+                f"{commit['files_added']} archivos, {len(commit['partitions'])} particiones.")
+    return commit
@@ -1,11 +1,111 @@
 # extract.py
 
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import pyarrow as pa
+
+from utils.arrow_utils import json_to_arrow
+from request_scheduler import RequestScheduler
+from archive import ResponseArchive
 
 BASE_URL = "https://api.coingecko.com/api/v3"
 
-def fetch_data(endpoint, data_field=None, params=None, headers=None, as_dataframe=False, record_path=None, meta=None):
+# === CONFIGURACIÓN DE EXTRACCIÓN CONCURRENTE ===
+MAX_WORKERS = 4            # Requests simultáneos como máximo
+MARKETS_PER_PAGE = 250     # Máximo permitido por /coins/markets
+MAX_IDS_CHARS = 4000       # Largo máximo del parámetro ids por request
+POOL_SIZE = 32             # Conexiones persistentes por host en la sesión compartida
+
+# === LÍMITE DE TASA ===
+CALLS_PER_MINUTE = 30      # Presupuesto de la API pública
+MAX_RETRIES = 5            # Reintentos ante 429/5xx
+
+_scheduler = RequestScheduler(calls_per_minute=CALLS_PER_MINUTE, max_retries=MAX_RETRIES)
+
+_session = None
+_session_lock = threading.Lock()
+
+_archive = None
+_replay = False
+_replay_as_of = None
+
+def get_session():
+    """
+    Devuelve la sesión HTTP compartida (con pool de conexiones reutilizables).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def configure_scheduler(**kwargs):
+    """
+    Reemplaza el planificador compartido de requests (ver RequestScheduler).
+    Ej: configure_scheduler(calls_per_minute=500, max_retries=3)
+    """
+    global _scheduler
+    kwargs.setdefault("calls_per_minute", CALLS_PER_MINUTE)
+    kwargs.setdefault("max_retries", MAX_RETRIES)
+    _scheduler = RequestScheduler(**kwargs)
+    return _scheduler
+
+def get_request_stats():
+    """
+    Retorna los contadores del planificador (requests, reintentos, espera por throttling, uso de cuota).
+    """
+    return _scheduler.stats()
+
+def reset_request_stats():
+    """
+    Reinicia los contadores del planificador (ej: al comenzar cada tick del modo serve).
+    """
+    _scheduler.reset_stats()
+
+def configure_archive(root=None, replay=False, as_of=None):
+    """
+    Configura el archivo de respuestas crudas (ver archive.ResponseArchive).
+
+    Parámetros:
+    - root (str): directorio del archivo; None lo desactiva.
+    - replay (bool): si True, los requests se responden desde el archivo sin usar la red.
+    - as_of (datetime): en replay, usar la última respuesta archivada hasta este instante.
+    """
+    global _archive, _replay, _replay_as_of
+    if replay and root is None:
+        raise ValueError("El modo replay requiere un directorio de archivo")
+    _archive = ResponseArchive(root) if root else None
+    _replay = replay
+    _replay_as_of = as_of
+    return _archive
+
+def _get(endpoint, params=None, headers=None):
+    """
+    GET a la API a través del planificador, archivando las respuestas 200.
+    En modo replay responde desde el archivo (un If-None-Match que coincide con el
+    ETag archivado produce un 304, igual que el servidor).
+    """
+    if _replay:
+        response = _archive.replay(endpoint, params, _replay_as_of)
+        etag = (headers or {}).get("If-None-Match")
+        if etag and etag == response.headers.get("ETag"):
+            response.status_code = 304
+            response._content = b""
+        return response
+    response = _scheduler.get(get_session(), f"{BASE_URL}/{endpoint}", params=params, headers=headers)
+    if _archive is not None and response.status_code == 200:
+        _archive.store(endpoint, params, response)
+    return response
+
+def fetch_data(endpoint, data_field=None, params=None, headers=None, as_dataframe=False, record_path=None, meta=None, as_arrow=False):
     """
     Realiza una solicitud GET a la CoinGecko API y devuelve los datos.
 
@@ -17,16 +117,19 @@ def fetch_data(endpoint, data_field=None, params=None, headers=None, as_datafram
     - as_dataframe (bool): si True, intenta convertir a DataFrame (opcional).
     - record_path (str | list): ruta a la lista anidada si se usa json_normalize.
     - meta (list): claves para incluir como columnas auxiliares.
+    - as_arrow (bool): si True, parsea el cuerpo directo a pyarrow.Table tipado según TYPE_MAP
+      (solo para respuestas que son una lista de objetos; ignora data_field/record_path).
 
     Retorna:
-    - dict | list | DataFrame | None
+    - dict | list | DataFrame | pyarrow.Table | None
     """
     try:
-        url = f"{BASE_URL}/{endpoint}"
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
+        response = _get(endpoint, params=params, headers=headers)
 
         try:
+            if as_arrow:
+                return json_to_arrow(response.content)
+
             data = response.json()
             if data_field:
                 data = data[data_field]
@@ -56,6 +159,51 @@ def extract_coin_list():
     """
     return fetch_data("coins/list")
 
+def extract_coin_list_if_changed(etag=None, last_modified=None):
+    """
+    Extrae /coins/list con un request condicional (If-None-Match / If-Modified-Since).
+
+    Parámetros:
+    - etag (str): ETag de la última respuesta procesada (opcional).
+    - last_modified (str): Last-Modified de la última respuesta procesada (opcional).
+
+    Retorna:
+    - dict con:
+        - not_modified (bool): True si el servidor respondió 304.
+        - data (list | None): lista de monedas (None si 304 o error).
+        - sha256 (str | None): hash del cuerpo de la respuesta.
+        - etag, last_modified (str | None): validadores para el próximo request.
+      None si el request falló.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    try:
+        response = _get("coins/list", headers=headers or None)
+    except requests.exceptions.RequestException as e:
+        print(f" HTTP request failed for endpoint 'coins/list': {e}")
+        return None
+
+    result = {
+        "not_modified": response.status_code == 304,
+        "data": None,
+        "sha256": None,
+        "etag": response.headers.get("ETag", etag),
+        "last_modified": response.headers.get("Last-Modified", last_modified),
+    }
+    if result["not_modified"]:
+        return result
+    try:
+        result["data"] = response.json()
+    except ValueError as e:
+        print(f" Failed to parse JSON: {e}")
+        return None
+    result["sha256"] = hashlib.sha256(response.content).hexdigest()
+    return result
+
 def extract_prices(coin_ids, vs_currency="usd"):
     """
     Extrae los precios actuales de una lista de monedas.
@@ -73,31 +221,140 @@ def extract_prices(coin_ids, vs_currency="usd"):
     }
     return fetch_data("simple/price", params=params)
 
-def extract_market_data(coins: list, vs_currency="usd", as_dataframe=True):
+def batch_ids(coins, max_ids=MARKETS_PER_PAGE, max_chars=MAX_IDS_CHARS):
+    """
+    Divide una lista de ids en lotes que entran en una URL y en una página de resultados.
+
+    Parámetros:
+    - coins (list): ids de monedas.
+    - max_ids (int): cantidad máxima de ids por lote.
+    - max_chars (int): largo máximo del parámetro ids (separado por comas).
+
+    Retorna:
+    - list[list]: lotes de ids.
+    """
+    batches, current, length = [], [], 0
+    for coin in coins:
+        extra = len(coin) + (1 if current else 0)
+        if current and (len(current) >= max_ids or length + extra > max_chars):
+            batches.append(current)
+            current, length, extra = [], 0, len(coin)
+        current.append(coin)
+        length += extra
+    if current:
+        batches.append(current)
+    return batches
+
+def fetch_market_pages(params, per_page=MARKETS_PER_PAGE, expected=None, as_arrow=False):
+    """
+    Recorre las páginas de /coins/markets para un conjunto de parámetros.
+    Se detiene en la primera página incompleta o al alcanzar `expected` registros.
+
+    Retorna:
+    - list: páginas obtenidas (listas de dicts o pyarrow.Table); None si falló algún request.
+    """
+    pages = []
+    total = 0
+    page = 1
+    while True:
+        data = fetch_data("coins/markets", params={**params, "per_page": per_page, "page": page}, as_arrow=as_arrow)
+        if data is None:
+            return None
+        pages.append(data)
+        total += len(data)
+        if len(data) < per_page or (expected is not None and total >= expected):
+            return pages
+        page += 1
+
+def extract_market_data(coins: list, vs_currency="usd", as_dataframe=True, max_workers=MAX_WORKERS, per_page=MARKETS_PER_PAGE, as_arrow=False):
     """
     Extrae datos de mercado para una lista de monedas desde CoinGecko.
 
+    Los ids se dividen en lotes que entran en una URL y se consultan en paralelo
+    (hasta `max_workers` requests simultáneos) reutilizando las conexiones del pool.
+
     Parámetros:
     - coins (list): lista de monedas (ej: ['bitcoin', 'ethereum']).
     - vs_currency (str): moneda de referencia (ej: 'usd').
     - as_dataframe (bool): si True, devuelve un pandas.DataFrame.
+    - max_workers (int): cantidad máxima de requests concurrentes.
+    - per_page (int): resultados por página (máximo 250).
+    - as_arrow (bool): si True, devuelve un pyarrow.Table tipado sin pasar por pandas.
 
     Retorna:
-    - DataFrame o lista de dicts con datos como market cap, precios, etc.
+    - DataFrame, pyarrow.Table o lista de dicts con datos como market cap, precios, etc.
+      None si no se pudo extraer ningún lote.
     """
     if not coins:
         print("⚠️ Lista de monedas vacía.")
+        if as_arrow:
+            return pa.table({})
         return pd.DataFrame() if as_dataframe else []
 
-    ids_param = ",".join(coins)
-
-    endpoint = "coins/markets"
-    params = {
+    base_params = {
         "vs_currency": vs_currency,
-        "ids": ids_param,
         "order": "market_cap_desc",
         "sparkline": "false",
         "price_change_percentage": "24h"
     }
+    batches = batch_ids(coins, max_ids=per_page)
+
+    def fetch_batch(batch):
+        return fetch_market_pages({**base_params, "ids": ",".join(batch)}, per_page=per_page, expected=len(batch), as_arrow=as_arrow)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+        results = list(pool.map(fetch_batch, batches))
 
-    return fetch_data(endpoint=endpoint, params=params, as_dataframe=as_dataframe)
+    failed = sum(result is None for result in results)
+    if failed:
+        print(f"⚠️ Fallaron {failed} de {len(batches)} lotes de /coins/markets.")
+    if failed == len(batches):
+        return None
+
+    pages = [page for result in results if result for page in result]
+    if as_arrow:
+        return pa.concat_tables(pages, promote_options="permissive")
+    records = [row for page in pages for row in page]
+    return pd.DataFrame(records) if as_dataframe else records
+
+def extract_top_coins(top_n, vs_currency="usd", category=None, per_page=MARKETS_PER_PAGE):
+    """
+    Descubre las `top_n` monedas de mayor market cap recorriendo /coins/markets sin ids
+    (opcionalmente filtradas por categoría).
+
+    Parámetros:
+    - top_n (int): cantidad de monedas a obtener.
+    - vs_currency (str): moneda de referencia.
+    - category (str): categoría de CoinGecko (ej: 'layer-1'), opcional.
+    - per_page (int): resultados por página (máximo 250).
+
+    Retorna:
+    - list: ids ordenados por market cap descendente; None si falló algún request.
+    """
+    params = {"vs_currency": vs_currency, "order": "market_cap_desc", "sparkline": "false"}
+    if category:
+        params["category"] = category
+    pages = fetch_market_pages(params, per_page=min(per_page, top_n), expected=top_n)
+    if pages is None:
+        return None
+    return [row["id"] for page in pages for row in page][:top_n]
+
+def extract_market_chart_range(coin_id, start, end, vs_currency="usd"):
+    """
+    Extrae la serie histórica de una moneda entre dos instantes desde /coins/{id}/market_chart/range.
+    Para rangos de hasta 90 días la API devuelve puntos horarios.
+
+    Parámetros:
+    - coin_id (str): id de la moneda.
+    - start, end (datetime): inicio y fin del rango (con zona horaria).
+    - vs_currency (str): moneda de referencia.
+
+    Retorna:
+    - dict: {"prices": [[ms, valor], ...], "market_caps": [...], "total_volumes": [...]}; None si falló.
+    """
+    params = {
+        "vs_currency": vs_currency,
+        "from": int(start.timestamp()),
+        "to": int(end.timestamp()),
+    }
+    return fetch_data(f"coins/{coin_id}/market_chart/range", params=params)
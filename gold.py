@@ -0,0 +1,386 @@
+# gold.py
+
+"""
+Capa Gold: barras OHLCV por moneda (horarias y diarias) y métricas móviles sobre las
+barras horarias (medias móviles, volatilidad de retornos logarítmicos y VWAP).
+
+La actualización es incremental: se leen de Silver solo los cambios desde la última versión
+consumida (change data feed) y se combinan con las barras ya guardadas de las mismas horas/días.
+Para las ventanas móviles se persiste, por moneda, la cola de las últimas MAX_WINDOW barras
+horarias: si los datos nuevos son posteriores a esa cola (caso normal) no hace falta leer
+la historia. Si llegan barras atrasadas (backfill), se recalcula la moneda desde la tabla Gold.
+
+Las ventanas se miden en cantidad de barras horarias (no en tiempo de reloj). `volume` es el
+último total_volume observado en la barra (volumen de 24 h informado por la API).
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from deltalake import DeltaTable
+
+from delta_utils import (
+    get_table,
+    enable_change_data_feed,
+    is_change_data_feed_enabled,
+    read_delta_changes,
+    read_delta_partitions,
+    upsert_data_as_delta,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ventanas de las métricas móviles, en barras horarias
+MA_WINDOWS = {"ma_24h": 24, "ma_168h": 168}
+VOLATILITY_WINDOW = 24
+VWAP_WINDOW = 24
+MAX_WINDOW = max([*MA_WINDOWS.values(), VOLATILITY_WINDOW + 1, VWAP_WINDOW])
+
+SILVER_COLUMNS = ["id", "last_updated", "current_price", "total_volume"]
+BAR_KEY = ["coin", "bar_start"]
+BAR_COLUMNS = ["open", "high", "low", "close", "volume", "open_ts", "close_ts", "n_obs"]
+METRIC_COLUMNS = [*MA_WINDOWS, "volatility_24h", "vwap_24h"]
+BAR_PREDICATE = "target.coin = source.coin AND target.bar_start = source.bar_start"
+
+# Columna de partición de cada tabla y formato a partir de bar_start
+HOURLY_PARTITION = ("date", "%Y-%m-%d")
+DAILY_PARTITION = ("month", "%Y-%m")
+
+
+# === WATERMARK DE VERSIÓN DE SILVER ===
+def read_silver_watermark(watermark_file):
+    if not watermark_file or not os.path.exists(watermark_file):
+        return None
+    with open(watermark_file, "r") as f:
+        return json.load(f)["silver_version"]
+
+
+def save_silver_watermark(watermark_file, version):
+    with open(watermark_file, "w") as f:
+        json.dump({"silver_version": version}, f)
+
+
+def read_silver_increment(silver_path, watermark_file):
+    """
+    Lee de Silver las observaciones nuevas desde la última versión consumida por Gold.
+    Sin watermark (primera ejecución) habilita el change data feed y lee la tabla completa.
+
+    Retorna:
+        (DataFrame | None, int): observaciones (None si no hay versiones nuevas) y versión leída.
+    """
+    last_version = read_silver_watermark(watermark_file)
+    dt = get_table(silver_path)
+    if last_version is None or not is_change_data_feed_enabled(dt):
+        logger.info("🔖 Sin watermark de Silver: se construye Gold desde la tabla completa.")
+        version = enable_change_data_feed(silver_path)
+        return read_delta_partitions(silver_path, columns=SILVER_COLUMNS), version
+    current_version = dt.version()
+    if last_version >= current_version:
+        return None, current_version
+    return read_delta_changes(silver_path, last_version + 1, current_version, columns=SILVER_COLUMNS), current_version
+
+
+def to_observations(df):
+    """
+    Normaliza filas de Silver a observaciones (coin, ts, price, volume), ordenadas por tiempo.
+    """
+    obs = pd.DataFrame({
+        "coin": df["id"].astype(str),
+        "ts": pd.to_datetime(df["last_updated"], utc=True),
+        "price": pd.to_numeric(df["current_price"], errors="coerce"),
+        "volume": pd.to_numeric(df["total_volume"], errors="coerce"),
+    })
+    obs = obs.dropna(subset=["ts", "price"])
+    obs = obs.drop_duplicates(subset=["coin", "ts"], keep="last")
+    return obs.sort_values(["coin", "ts"], kind="stable").reset_index(drop=True)
+
+
+# === BARRAS OHLCV ===
+def build_bars(obs, freq):
+    """
+    Agrega observaciones en barras OHLCV de frecuencia `freq` ("h" o "D").
+    """
+    obs = obs.assign(bar_start=obs["ts"].dt.floor(freq))
+    bars = obs.groupby(BAR_KEY, sort=False).agg(
+        open=("price", "first"),
+        high=("price", "max"),
+        low=("price", "min"),
+        close=("price", "last"),
+        volume=("volume", "last"),
+        open_ts=("ts", "min"),
+        close_ts=("ts", "max"),
+        n_obs=("price", "size"),
+    )
+    return bars.reset_index()
+
+
+def merge_bars(existing, partial):
+    """
+    Combina barras ya guardadas con barras parciales de las mismas claves: open del primer
+    instante, close/volume del último, extremos y cantidad de observaciones acumulados.
+    Supone que las observaciones parciales no están ya contadas (ver update_bars).
+    """
+    if existing is None or existing.empty:
+        return partial.sort_values(BAR_KEY).reset_index(drop=True)
+    both = pd.concat([existing[BAR_KEY + BAR_COLUMNS], partial[BAR_KEY + BAR_COLUMNS]], ignore_index=True)
+    first = both.sort_values("open_ts", kind="stable").groupby(BAR_KEY).agg(
+        open=("open", "first"), open_ts=("open_ts", "first"), high=("high", "max"), low=("low", "min"), n_obs=("n_obs", "sum")
+    )
+    last = both.sort_values("close_ts", kind="stable").groupby(BAR_KEY).agg(
+        close=("close", "last"), volume=("volume", "last"), close_ts=("close_ts", "last")
+    )
+    return first.join(last)[BAR_COLUMNS].reset_index()
+
+
+def bar_mask(df, keys):
+    """Máscara de las filas de `df` cuyas claves (coin, bar_start) están en `keys`."""
+    return pd.MultiIndex.from_frame(df[BAR_KEY]).isin(pd.MultiIndex.from_frame(keys[BAR_KEY]))
+
+
+def overlapping_bars(existing, obs, freq):
+    """
+    Claves de barras guardadas con alguna observación del lote dentro de [open_ts, close_ts]:
+    puede ser una fila de Silver reenviada o corregida (misma llave), que ya está contada en
+    la barra. Las observaciones fuera de ese rango no pueden repetirse y se combinan sin más.
+    """
+    obs = obs.assign(bar_start=obs["ts"].dt.floor(freq)).merge(existing[BAR_KEY + ["open_ts", "close_ts"]], on=BAR_KEY)
+    inside = obs[(obs["ts"] >= obs["open_ts"]) & (obs["ts"] <= obs["close_ts"])]
+    return inside[BAR_KEY].drop_duplicates().reset_index(drop=True)
+
+
+def read_silver_observations(silver_path, keys, freq):
+    """
+    Observaciones de Silver (deduplicadas por coin, ts) de las barras `keys`, leyendo solo el
+    rango de tiempo que cubren (y, si Silver está particionada por fecha o moneda, solo esas
+    particiones; las fechas con un día de margen porque la partición es la de la extracción).
+    """
+    coins = sorted(keys["coin"].unique())
+    start = keys["bar_start"].min()
+    end = keys["bar_start"].max() + pd.Timedelta(1, unit=freq)
+    filters = [("last_updated", ">=", start.to_pydatetime()), ("last_updated", "<", end.to_pydatetime())]
+    partition_columns = get_table(silver_path).metadata().partition_columns
+    if "date" in partition_columns:
+        dates = pd.date_range(start.floor("D") - pd.Timedelta(days=1), end.floor("D") + pd.Timedelta(days=1), freq="D")
+        filters.append(("date", "in", list(dates.strftime("%Y-%m-%d"))))
+    if "coin" in partition_columns:
+        filters.append(("coin", "in", coins))
+    obs = to_observations(read_delta_partitions(silver_path, partitions=filters, columns=SILVER_COLUMNS))
+    return obs[obs["coin"].isin(coins)]
+
+
+def update_bars(path, partition, obs, freq, silver_path):
+    """
+    Barras de frecuencia `freq` actualizadas con las observaciones del lote.
+
+    Las barras sin observaciones repetidas se combinan con las guardadas (merge_bars). Las que
+    reciben una observación dentro de su rango (ver overlapping_bars) se recalculan desde las
+    filas de Silver: sumarlas contaría dos veces una fila reenviada o corregida.
+    """
+    partial = build_bars(obs, freq)
+    existing = read_bars(path, partial, partition, columns=BAR_KEY + BAR_COLUMNS)
+    if existing is None or existing.empty:
+        return merge_bars(existing, partial)
+    overlap = overlapping_bars(existing, obs, freq)
+    if overlap.empty:
+        return merge_bars(existing, partial)
+    logger.info(f"🔁 Recalculando desde Silver {len(overlap)} barras ({freq}) con filas reenviadas o corregidas.")
+    recomputed = build_bars(read_silver_observations(silver_path, overlap, freq), freq)
+    recomputed = recomputed[bar_mask(recomputed, overlap)]
+    merged = merge_bars(existing[~bar_mask(existing, overlap)], partial[~bar_mask(partial, overlap)])
+    bars = pd.concat([merged, recomputed[BAR_KEY + BAR_COLUMNS]], ignore_index=True)
+    return bars.sort_values(BAR_KEY).reset_index(drop=True)
+
+
+def read_bars(path, keys, partition, columns=None):
+    """
+    Lee de una tabla Gold las barras de las claves (coin, bar_start) indicadas, filtrando por
+    partición y moneda (None si la tabla no existe).
+    """
+    if not DeltaTable.is_deltatable(path):
+        return None
+    col, fmt = partition
+    values = sorted(keys["bar_start"].dt.strftime(fmt).unique())
+    df = read_delta_partitions(path, partitions=[(col, "in", values), ("coin", "in", sorted(keys["coin"].unique()))], columns=columns)
+    for ts_col in ("bar_start", "open_ts", "close_ts"):
+        df[ts_col] = pd.to_datetime(df[ts_col], utc=True)
+    return df.merge(keys[BAR_KEY], on=BAR_KEY, how="inner")
+
+
+def write_bars(bars, path, partition):
+    """Upsert de barras en una tabla Gold, acotado a las particiones tocadas."""
+    col, fmt = partition
+    bars = bars.assign(**{col: bars["bar_start"].dt.strftime(fmt)})
+    # La partición sale de bar_start (parte de la llave): se puede acotar el MERGE por ella
+    upsert_data_as_delta(bars, path, BAR_PREDICATE, partition_cols=[col], scope_cols=[col])
+    return len(bars)
+
+
+# === MÉTRICAS MÓVILES ===
+def _group_positions(codes):
+    """Posición de cada fila dentro de su grupo (las filas de un mismo grupo son contiguas)."""
+    n = len(codes)
+    idx = np.arange(n)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    return idx - np.maximum.accumulate(np.where(is_start, idx, 0))
+
+
+def _window_sum(values, pos, window, min_pos):
+    """
+    Suma móvil de `window` elementos por grupo con sumas acumuladas; NaN donde la ventana
+    no tiene historia suficiente (pos < min_pos) o cruzaría el inicio del grupo.
+    """
+    cs = np.concatenate([[0.0], np.cumsum(values)])
+    out = np.full(len(values), np.nan)
+    idx = np.flatnonzero(pos >= min_pos)
+    out[idx] = cs[idx + 1] - cs[idx + 1 - window]
+    return out
+
+
+def rolling_metrics(bars):
+    """
+    Calcula las métricas móviles sobre barras horarias ordenadas por (coin, bar_start).
+    Vectorizado sobre todas las monedas a la vez.
+    """
+    codes = pd.factorize(bars["coin"])[0]
+    pos = _group_positions(codes)
+    close = bars["close"].to_numpy(dtype="float64")
+    volume = np.nan_to_num(bars["volume"].to_numpy(dtype="float64"))
+
+    metrics = {}
+    for name, window in MA_WINDOWS.items():
+        metrics[name] = _window_sum(close, pos, window, window - 1) / window
+
+    w = VOLATILITY_WINDOW
+    returns = np.zeros(len(close))
+    returns[1:] = np.log(close[1:] / close[:-1])
+    returns[pos == 0] = 0.0
+    s1 = _window_sum(returns, pos, w, w)
+    s2 = _window_sum(returns ** 2, pos, w, w)
+    metrics["volatility_24h"] = np.sqrt(np.maximum((s2 - s1 ** 2 / w) / (w - 1), 0.0))
+
+    pv = _window_sum(close * volume, pos, VWAP_WINDOW, VWAP_WINDOW - 1)
+    v = _window_sum(volume, pos, VWAP_WINDOW, VWAP_WINDOW - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics["vwap_24h"] = np.where(v > 0, pv / v, np.nan)
+
+    return bars.assign(**metrics)
+
+
+def compute_gold_full(obs):
+    """
+    Recalcula barras horarias (con métricas) y diarias desde todas las observaciones.
+    Referencia para validar la actualización incremental.
+    """
+    hourly = build_bars(obs, "h").sort_values(BAR_KEY).reset_index(drop=True)
+    daily = build_bars(obs, "D").sort_values(BAR_KEY).reset_index(drop=True)
+    return rolling_metrics(hourly), daily
+
+
+# === ESTADO DE VENTANAS ===
+def load_window_tail(state_file):
+    """Cola persistida de barras horarias por moneda (None si no existe)."""
+    if not state_file or not os.path.exists(state_file):
+        return None
+    return pd.read_parquet(state_file)
+
+
+def save_window_tail(state_file, tail):
+    tmp_path = f"{state_file}.tmp"
+    tail.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, state_file)
+
+
+def update_hourly_metrics(merged, hourly_path, tail):
+    """
+    Calcula las métricas de las barras horarias actualizadas.
+
+    Retorna:
+        (DataFrame, DataFrame): barras a escribir (con métricas) y nueva cola de ventanas.
+    """
+    min_new = merged.groupby("coin")["bar_start"].min()
+    empty = merged.iloc[0:0][BAR_KEY + BAR_COLUMNS]
+    if tail is None:
+        # Sin estado: si ya hay Gold, todas las monedas van por el camino lento
+        tail = empty
+        slow = set(min_new.index) if DeltaTable.is_deltatable(hourly_path) else set()
+    else:
+        tail_last = tail.groupby("coin")["bar_start"].max()
+        late = min_new[min_new.index.isin(tail_last.index)]
+        slow = set(late[late < tail_last.reindex(late.index)].index)
+
+    # Camino rápido: historia previa desde la cola persistida
+    history = tail[tail["coin"].isin(min_new.index) & ~tail["coin"].isin(slow)]
+    history = history[history["bar_start"] < history["coin"].map(min_new)]
+    later = empty
+
+    # Camino lento (datos atrasados): historia y barras posteriores desde la tabla Gold
+    if slow:
+        logger.info(f"🐢 Recalculando ventanas de {len(slow)} monedas con barras atrasadas.")
+        stored = read_delta_partitions(hourly_path, partitions=[("coin", "in", sorted(slow))], columns=BAR_KEY + BAR_COLUMNS)
+        stored["bar_start"] = pd.to_datetime(stored["bar_start"], utc=True)
+        stored = stored.merge(merged[BAR_KEY], on=BAR_KEY, how="left", indicator=True)
+        stored = stored[stored["_merge"] == "left_only"].drop(columns="_merge")
+        before = stored["bar_start"] < stored["coin"].map(min_new)
+        history = pd.concat([history, stored[before]], ignore_index=True)
+        later = stored[~before]
+
+    history = history.sort_values(BAR_KEY).groupby("coin").tail(MAX_WINDOW)
+    series = pd.concat(
+        [history.assign(_output=False), merged.assign(_output=True), later.assign(_output=True)],
+        ignore_index=True,
+    )
+    series = series.sort_values(BAR_KEY, kind="stable").reset_index(drop=True)
+    series = rolling_metrics(series)
+
+    output = series[series["_output"]].drop(columns="_output")
+    touched = set(series["coin"])
+    new_tail = pd.concat([tail[~tail["coin"].isin(touched)], series[BAR_KEY + BAR_COLUMNS]], ignore_index=True)
+    new_tail = new_tail.sort_values(BAR_KEY).groupby("coin").tail(MAX_WINDOW).reset_index(drop=True)
+    return output.reset_index(drop=True), new_tail
+
+
+def update_gold(silver_path, hourly_path, daily_path, watermark_file, state_file, batch=None, batch_version=None):
+    """
+    Actualiza las tablas Gold con los cambios de Silver desde la última ejecución.
+
+    Args:
+        silver_path (str): Ruta de Silver (mercados).
+        hourly_path (str): Ruta de Gold con barras horarias y métricas móviles.
+        daily_path (str): Ruta de Gold con barras diarias.
+        watermark_file (str): Archivo JSON con la última versión de Silver consumida.
+        state_file (str): Archivo Parquet con la cola de ventanas por moneda.
+        batch (DataFrame, optional): Filas recién escritas en Silver. Si son el único cambio
+            pendiente (watermark == batch_version - 1) se usan en memoria sin releer Silver.
+        batch_version (int, optional): Versión de Silver que produjo `batch`.
+
+    Retorna:
+        dict: observaciones leídas y barras horarias/diarias escritas.
+    """
+    if batch is not None and read_silver_watermark(watermark_file) == batch_version - 1:
+        logger.info(f"🔗 Gold: procesando en memoria el lote de Silver (versión {batch_version}).")
+        df, version = batch[SILVER_COLUMNS], batch_version
+    else:
+        df, version = read_silver_increment(silver_path, watermark_file)
+    if df is None or df.empty:
+        logger.info("⏩ Gold al día: no hay cambios nuevos en Silver.")
+        save_silver_watermark(watermark_file, version)
+        return {"rows_in": 0, "hourly": 0, "daily": 0}
+
+    obs = to_observations(df)
+    hourly = update_bars(hourly_path, HOURLY_PARTITION, obs, "h", silver_path)
+    daily = update_bars(daily_path, DAILY_PARTITION, obs, "D", silver_path)
+    hourly, tail = update_hourly_metrics(hourly, hourly_path, load_window_tail(state_file))
+
+    result = {
+        "rows_in": len(obs),
+        "hourly": write_bars(hourly, hourly_path, HOURLY_PARTITION),
+        "daily": write_bars(daily, daily_path, DAILY_PARTITION),
+    }
+    save_window_tail(state_file, tail)
+    save_silver_watermark(watermark_file, version)
+    logger.info(f"🥇 Gold actualizado: {result}")
+    return result
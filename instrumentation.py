@@ -0,0 +1,164 @@
+# instrumentation.py
+
+"""
+Instrumentación liviana del pipeline.
+
+Cada etapa se envuelve con RunRecorder.stage(nombre), que mide tiempo de pared y la memoria
+residente (RSS) actual del proceso al terminar, junto con su variación durante la etapa. En
+un proceso residente (serve) el pico de RSS acumula todas las corridas anteriores, por eso
+solo se informa a nivel de corrida y con el nombre process_peak_rss_mb. Dentro de la etapa se pueden registrar filas de entrada/salida,
+bytes escritos y versión Delta producida. Al final de la corrida el registro se agrega como
+una línea JSON (runs.jsonl) y, opcionalmente, como textfile de Prometheus.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, el pico de memoria no se informa
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # Opcional: fuera de Linux, sin psutil la RSS actual no se informa
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+STAGE_FIELDS = ("rows_in", "rows_out", "bytes_written", "delta_version")
+MEMORY_FIELDS = ("rss_mb", "rss_delta_mb")
+
+
+def current_rss_mb():
+    """Memoria residente actual del proceso, en MB (None si no está disponible)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is None:
+        return None
+    return round(psutil.Process().memory_info().rss / 2**20, 1)
+
+
+def process_peak_rss_mb():
+    """
+    Pico de memoria residente desde que arrancó el proceso, en MB (None si no está disponible).
+    No es el pico de una corrida: en un proceso residente incluye las corridas anteriores.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS, bytes
+    return round(peak / 2**20 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class StageRecord(dict):
+    """Métricas de una etapa; se completan con atributos (st.rows_out = 10)."""
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class RunRecorder:
+    """
+    Registro de una ejecución del pipeline.
+
+    Ejemplo:
+        recorder = RunRecorder()
+        with recorder.stage("market_extract") as st:
+            df = extract_market_data(...)
+            st.rows_out = len(df)
+        recorder.write_jsonl("state/runs.jsonl")
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.stages = []
+        self.status = "ok"
+        self.extra = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Mide una etapa; si lanza una excepción se registra como fallida y se propaga."""
+        record = StageRecord(name=name, status="ok")
+        rss_start = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.status = "error"
+            record.error = str(e)
+            self.status = "error"
+            raise
+        finally:
+            record.seconds = round(time.perf_counter() - start, 4)
+            # Con etapas concurrentes (run_dag) la variación incluye la memoria de las demás
+            record.rss_mb = current_rss_mb()
+            if record.rss_mb is not None and rss_start is not None:
+                record.rss_delta_mb = round(record.rss_mb - rss_start, 1)
+            self.stages.append(record)
+            logger.info(f"⏱️ {name}: {record.seconds:.3f}s " + " ".join(
+                f"{field}={record[field]}" for field in STAGE_FIELDS if record.get(field) is not None
+            ))
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(time.perf_counter() - self._start, 4),
+            "status": self.status,
+            "rss_mb": current_rss_mb(),
+            "process_peak_rss_mb": process_peak_rss_mb(),
+            "stages": [dict(stage) for stage in self.stages],
+            **self.extra,
+        }
+
+    def write_jsonl(self, path):
+        """Agrega el registro de la corrida como una línea JSON."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(self.to_dict(), default=str) + "\n")
+
+    def write_prometheus(self, path, prefix="coingecko_pipeline"):
+        """
+        Escribe las métricas en formato textfile de Prometheus (reemplazo atómico del archivo).
+        """
+        record = self.to_dict()
+        lines = [
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds {record['seconds']}",
+            f"# TYPE {prefix}_run_success gauge",
+            f"{prefix}_run_success {int(record['status'] == 'ok')}",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds {self.started_at.timestamp():.0f}",
+        ]
+        for field in ("rss_mb", "process_peak_rss_mb"):
+            if record[field] is not None:
+                lines += [f"# TYPE {prefix}_{field} gauge", f"{prefix}_{field} {record[field]}"]
+        for field in ("seconds",) + STAGE_FIELDS + MEMORY_FIELDS:
+            metric = f"{prefix}_stage_{field}"
+            lines.append(f"# TYPE {metric} gauge")
+            for stage in record["stages"]:
+                if stage.get(field) is not None:
+                    lines.append(f'{metric}{{stage="{stage["name"]}"}} {stage[field]}')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
@@ -0,0 +1,256 @@
+# ipc_export.py
+
+"""
+Exportación de la historia de precios de Silver a archivos Arrow IPC por moneda, pensada
+para consumidores que cargan muchas monedas completas una y otra vez (ej: backtesting).
+
+Esquema fijo y sin nulos: last_updated_us (int64, microsegundos UTC desde epoch) y
+current_price / market_cap / total_volume (float64, NaN si falta el dato). Los archivos se
+escriben sin compresión, así que abrirlos con pyarrow.memory_map no copia datos: cada columna
+es un buffer contiguo dentro del archivo mapeado.
+
+Estructura de `root`:
+    _manifest.json                  versión de Silver exportada y segmentos de cada moneda
+    <coin>/000000.arrow, 000001...  segmentos (formato de archivo IPC), ordenados por tiempo
+
+La exportación es incremental: se leen de Silver los cambios desde la versión exportada
+(change data feed) y, por moneda, las filas posteriores al último instante exportado se
+agregan como un segmento nuevo. Si llegan filas atrasadas o corregidas (backfill) o la moneda
+acumula más de MAX_SEGMENTS segmentos, sus segmentos se reescriben en uno solo. El manifiesto
+se reemplaza recién cuando los segmentos nuevos están escritos: un lector que lo abre ve
+siempre un conjunto completo de archivos.
+
+    from ipc_export import load_history
+    history = load_history("datalake/export/coingecko/markets_ipc", ["bitcoin"])
+    prices = history["bitcoin"].column("current_price")
+"""
+
+import json
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from delta_utils import enable_change_data_feed, get_table, is_change_data_feed_enabled, read_delta_changes, read_delta_partitions
+
+logger = logging.getLogger(__name__)
+
+SILVER_COLUMNS = ["id", "last_updated", "current_price", "market_cap", "total_volume"]
+VALUE_COLUMNS = ["current_price", "market_cap", "total_volume"]
+TS_COLUMN = "last_updated_us"
+EXPORT_SCHEMA = pa.schema(
+    [(TS_COLUMN, pa.int64())] + [(col, pa.float64()) for col in VALUE_COLUMNS],
+    metadata={"ts_unit": "us", "ts_tz": "UTC"},
+)
+MANIFEST_FILE = "_manifest.json"
+MAX_SEGMENTS = 64  # Segmentos por moneda antes de reescribirlos en uno
+
+
+# === MANIFIESTO ===
+def read_manifest(root):
+    """Manifiesto de la exportación ({"silver_version", "coins"}); vacío si no existe."""
+    path = os.path.join(root, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"silver_version": None, "coins": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def mark_exported(root, version):
+    """
+    Registra `version` como la versión de Silver ya exportada, sin tocar los segmentos
+    (ej: después de migrar Silver, que se reescribe con el mismo contenido en la versión 0).
+    """
+    if os.path.exists(os.path.join(root, MANIFEST_FILE)):
+        manifest = read_manifest(root)
+        manifest["silver_version"] = version
+        save_manifest(root, manifest)
+
+
+def save_manifest(root, manifest):
+    tmp_path = os.path.join(root, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(root, MANIFEST_FILE))
+
+
+# === LECTURA / ESCRITURA DE SEGMENTOS ===
+def to_columns(df):
+    """
+    Convierte filas de Silver a arrays por moneda con el esquema de exportación, ordenados por
+    tiempo y sin instantes repetidos (gana la última fila: en el CDF, la versión más nueva).
+
+    Retorna:
+        dict: coin → pyarrow.Table con EXPORT_SCHEMA.
+    """
+    ts = pd.to_datetime(df["last_updated"], utc=True).dt.tz_convert(None)
+    frame = pd.DataFrame({"coin": df["id"].astype(str).to_numpy(), TS_COLUMN: ts.to_numpy().astype("datetime64[us]").view("int64")})
+    for col in VALUE_COLUMNS:
+        frame[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+    frame = frame[ts.notna().to_numpy()]
+    frame = frame.drop_duplicates(subset=["coin", TS_COLUMN], keep="last")
+    frame = frame.sort_values(["coin", TS_COLUMN], kind="stable")
+    return {coin: _table(group) for coin, group in frame.groupby("coin", sort=False)}
+
+
+def _table(frame):
+    arrays = [pa.array(frame[col].to_numpy(dtype=field.type.to_pandas_dtype())) for col, field in zip(EXPORT_SCHEMA.names, EXPORT_SCHEMA)]
+    return pa.Table.from_arrays(arrays, schema=EXPORT_SCHEMA)
+
+
+def write_segment(path, table):
+    """Escribe un segmento IPC sin compresión (temporal + rename)."""
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, EXPORT_SCHEMA) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_segment(path):
+    """Abre un segmento con memory map: el Table resultante no copia los buffers del archivo."""
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def load_coin(root, coin, manifest=None):
+    """
+    Historia exportada de una moneda como pyarrow.Table (un chunk por segmento, sin copiar).
+    Retorna None si la moneda no está exportada.
+    """
+    manifest = manifest or read_manifest(root)
+    entry = manifest["coins"].get(coin)
+    if entry is None:
+        return None
+    tables = [read_segment(os.path.join(root, coin, name)) for name in entry["segments"]]
+    return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+
+def load_history(root, coins=None):
+    """
+    Historia exportada de varias monedas (por defecto, todas).
+
+    Retorna:
+        dict: coin → pyarrow.Table con EXPORT_SCHEMA (las monedas sin datos se omiten).
+    """
+    manifest = read_manifest(root)
+    coins = sorted(manifest["coins"]) if coins is None else coins
+    history = {}
+    for coin in coins:
+        table = load_coin(root, coin, manifest)
+        if table is not None:
+            history[coin] = table
+    return history
+
+
+# === ACTUALIZACIÓN INCREMENTAL ===
+def _next_segment(entry):
+    return f"{entry['next_segment']:06d}.arrow"
+
+
+def update_coin(root, coin, new, manifest):
+    """
+    Agrega a la exportación de `coin` las filas de `new` (Table con EXPORT_SCHEMA, ordenado).
+
+    Retorna:
+        (list, bool): segmentos que dejaron de usarse y si se reescribió la moneda.
+    """
+    coin_dir = os.path.join(root, coin)
+    os.makedirs(coin_dir, exist_ok=True)
+    entry = manifest["coins"].setdefault(coin, {"segments": [], "next_segment": 0, "last_ts": None, "rows": 0})
+    first_ts = new.column(TS_COLUMN)[0].as_py()
+    appendable = entry["last_ts"] is None or first_ts > entry["last_ts"]
+
+    obsolete = []
+    if appendable and len(entry["segments"]) < MAX_SEGMENTS:
+        table = new
+        segments = entry["segments"] + [_next_segment(entry)]
+    else:
+        # Filas atrasadas o demasiados segmentos: se reescribe la moneda en un solo segmento
+        existing = load_coin(root, coin, manifest)
+        table = pa.concat_tables([existing, new]).combine_chunks()
+        if not appendable:
+            table = to_columns(_frame(coin, table))[coin]
+        obsolete = list(entry["segments"])
+        segments = [_next_segment(entry)]
+
+    write_segment(os.path.join(coin_dir, segments[-1]), table)
+    entry["segments"] = segments
+    entry["next_segment"] += 1
+    entry["last_ts"] = max(entry["last_ts"] or first_ts, new.column(TS_COLUMN)[-1].as_py())
+    entry["rows"] = table.num_rows if obsolete else entry["rows"] + table.num_rows
+    return obsolete, not appendable
+
+
+def _frame(coin, table):
+    """Table exportado → filas estilo Silver (para volver a ordenar y deduplicar)."""
+    df = table.to_pandas()
+    df.insert(0, "id", coin)
+    df["last_updated"] = pd.to_datetime(df.pop(TS_COLUMN), unit="us", utc=True)
+    return df
+
+
+def read_silver_increment(silver_path, last_version):
+    """
+    Cambios de Silver desde `last_version` (o la tabla completa si no hay versión exportada).
+    Si la tabla está en una versión anterior a `last_version` fue recreada (ej: migración):
+    se vuelve a leer completa y las filas ya exportadas se deduplican al reescribir cada moneda.
+
+    Retorna:
+        (DataFrame | None, int): filas (None si no hay versiones nuevas) y versión leída.
+    """
+    dt = get_table(silver_path)
+    if last_version is None or not is_change_data_feed_enabled(dt):
+        logger.info("🔖 Exportación IPC vacía: se exporta Silver completo.")
+        version = enable_change_data_feed(silver_path)
+        return read_delta_partitions(silver_path, columns=SILVER_COLUMNS), version
+    current_version = dt.version()
+    if last_version > current_version:
+        logger.warning(f"⚠️ Silver está en la versión {current_version}, anterior a la exportada ({last_version}): "
+                       "la tabla fue recreada, se vuelve a exportar completa.")
+        return read_delta_partitions(silver_path, columns=SILVER_COLUMNS), current_version
+    if last_version == current_version:
+        return None, current_version
+    return read_delta_changes(silver_path, last_version + 1, current_version, columns=SILVER_COLUMNS), current_version
+
+
+def export_ipc(silver_path, root, batch=None, batch_version=None):
+    """
+    Actualiza la exportación IPC con los cambios de Silver desde la última versión exportada.
+
+    Args:
+        silver_path (str): Ruta de Silver (mercados).
+        root (str): Directorio de la exportación.
+        batch (DataFrame, optional): Filas recién escritas en Silver. Si son el único cambio
+            pendiente (versión exportada == batch_version - 1) se usan sin releer Silver.
+        batch_version (int, optional): Versión de Silver que produjo `batch`.
+
+    Retorna:
+        dict: filas leídas, monedas actualizadas y monedas reescritas.
+    """
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    last_version = manifest["silver_version"]
+    if batch is not None and last_version is not None and last_version == batch_version - 1:
+        logger.info(f"🔗 Exportación IPC: usando en memoria el lote de Silver (versión {batch_version}).")
+        df, version = batch[SILVER_COLUMNS], batch_version
+    else:
+        df, version = read_silver_increment(silver_path, last_version)
+
+    result = {"rows_in": 0, "coins": 0, "rewritten": 0}
+    obsolete = []
+    if df is not None and not df.empty:
+        result["rows_in"] = len(df)
+        for coin, new in to_columns(df).items():
+            removed, rewritten = update_coin(root, coin, new, manifest)
+            obsolete.extend(os.path.join(root, coin, name) for name in removed)
+            result["coins"] += 1
+            result["rewritten"] += int(rewritten)
+
+    manifest["silver_version"] = version
+    save_manifest(root, manifest)
+    for path in obsolete:
+        os.remove(path)
+    if result["coins"]:
+        logger.info(f"📦 Exportación IPC actualizada: {result}")
+    return result
@@ -0,0 +1,64 @@
+# layout.py
+
+"""
+Layouts de particionamiento para las tablas de mercados (Bronze y Silver).
+
+- hourly: coin / date / day / hour (layout original: un directorio por moneda por hora).
+- date: solo date; hour y day quedan como columnas normales, filtrables por estadísticas Parquet.
+- date_bucket: date / coin_bucket, con coin_bucket = hash estable del id módulo COIN_BUCKETS.
+"""
+
+import zlib
+
+LAYOUTS = {
+    "hourly": ["coin", "date", "day", "hour"],
+    "date": ["date"],
+    "date_bucket": ["date", "coin_bucket"],
+}
+DEFAULT_LAYOUT = "hourly"
+COIN_BUCKETS = 16
+
+# Columnas que existen solo por el layout (no vienen de la API)
+LAYOUT_COLS = {"coin_bucket"}
+
+
+def partition_cols(layout=DEFAULT_LAYOUT):
+    """
+    Columnas de partición del layout indicado.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout desconocido '{layout}'. Opciones: {sorted(LAYOUTS)}")
+    return list(LAYOUTS[layout])
+
+
+def coin_bucket(coin_id, buckets=COIN_BUCKETS):
+    """
+    Bucket estable (entre ejecuciones y procesos) de una moneda, como string de 2 dígitos.
+    """
+    return f"{zlib.crc32(coin_id.encode()) % buckets:02d}"
+
+
+def add_layout_columns(data, layout=DEFAULT_LAYOUT, buckets=COIN_BUCKETS):
+    """
+    Agrega (o quita) las columnas derivadas que requiere el layout.
+    Acepta un DataFrame, un pyarrow.Table o un pyarrow.RecordBatch con la columna 'id'.
+    """
+    import pyarrow as pa  # Diferido: main.py importa este módulo antes de decidir si corre
+
+    cols = partition_cols(layout)
+    needs_bucket = "coin_bucket" in cols
+
+    if isinstance(data, (pa.Table, pa.RecordBatch)):
+        names = data.schema.names
+        if "coin_bucket" in names:
+            data = data.drop_columns(["coin_bucket"])
+        if needs_bucket:
+            values = pa.array([coin_bucket(c, buckets) for c in data.column("id").to_pylist()], pa.string())
+            data = data.append_column("coin_bucket", values)
+        return data
+
+    if needs_bucket:
+        data["coin_bucket"] = data["id"].astype(str).map(lambda c: coin_bucket(c, buckets))
+    elif "coin_bucket" in data.columns:
+        data = data.drop(columns=["coin_bucket"])
+    return data
@@ -1,40 +1,105 @@
+import time
+PROCESS_START = time.perf_counter()  # Referencia para la latencia de arranque del modo serve
+
 import os
 import json
 import logging
-import pandas as pd
-from datetime import datetime, timedelta
+import argparse
+from datetime import datetime, timedelta, timezone
 
-from extract import extract_market_data, extract_coin_list
-from delta_utils import save_data_as_delta, upsert_data_as_delta
-from process_coinlist import process_and_save_coinlist
-from process_markets import process_and_save_markets
+# Solo módulos livianos al importar: pandas, pyarrow, deltalake y requests se importan dentro
+# de cada etapa, así una corrida de cron que se saltea (should_extract) no paga su carga
+from layout import LAYOUTS, add_layout_columns, partition_cols
+from instrumentation import RunRecorder
+from daemon import PipelineDaemon, pipeline_lock
+from dag import Stage, run_dag
 
 # === CONFIGURACIÓN ===
 COINS = ["bitcoin", "ethereum", "mochicat", "dogecoin"]
+# Universo de monedas (ver universe.py): {"mode": "ids", "ids": [...]} | {"mode": "top", "top_n": 2500}
+# | {"mode": "category", "category": "layer-1", "top_n": 500}
+UNIVERSE = {"mode": "ids", "ids": COINS}
+UNIVERSE_CACHE_FILE = "state/universe.json"
+UNIVERSE_TTL_HOURS = 24  # El descubrimiento por market cap se repite como mucho una vez por TTL
 STATE_FILE = "state/last_extraction.json"
+BRONZE_WATERMARK_FILE = "state/bronze_markets_version.json"
+COINLIST_STATE_FILE = "state/coinlist_state.json"  # ETag / Last-Modified / hash de la última coin list
 BRONZE_PATH = "datalake/bronze/coingecko/markets"
 SILVER_PATH = "datalake/silver/coingecko/markets"
 COINS_SILVER_PATH = "datalake/silver/coingecko/coins"
 COINS_BRONZE_PATH = "datalake/bronze/coingecko/coins"
-PARTITION_COLS = ["coin", "date", "day", "hour"]
-os.makedirs("state", exist_ok=True)
-os.makedirs(COINS_BRONZE_PATH, exist_ok=True)
+COINS_HISTORY_PATH = "datalake/silver/coingecko/coins_history"
+QUARANTINE_PATH = "datalake/quarantine/coingecko/markets"  # Filas que no se pudieron conformar al esquema
+GOLD_HOURLY_PATH = "datalake/gold/coingecko/ohlcv_hourly"  # Barras horarias + métricas móviles
+GOLD_DAILY_PATH = "datalake/gold/coingecko/ohlcv_daily"
+SILVER_WATERMARK_FILE = "state/silver_markets_version.json"  # Última versión de Silver consumida por Gold
+GOLD_STATE_FILE = "state/gold_window_tail.parquet"  # Cola de barras por moneda para las ventanas móviles
+IPC_EXPORT_DIR = "datalake/export/coingecko/markets_ipc"  # Historia por moneda en Arrow IPC (ver ipc_export.py); None la desactiva
+PARTITION_LAYOUT = "hourly"  # "hourly" | "date" | "date_bucket" (ver layout.py)
+PARTITION_COLS = partition_cols(PARTITION_LAYOUT)
+BRONZE_TABLE_CONFIG = {"delta.enableChangeDataFeed": "true"}  # Silver lee Bronze por versión
+INGEST_MODE = "pandas"  # "pandas" | "arrow" (JSON → pyarrow.Table tipado, sin pasar por pandas)
+RUN_LOG_FILE = "state/runs.jsonl"  # Registro JSON por ejecución (tiempos, filas, bytes, versiones)
+PROMETHEUS_FILE = None  # Ruta opcional de textfile para el node_exporter de Prometheus
+LOCK_FILE = "state/pipeline.lock"  # Evita que dos instancias (cron o serve) corran a la vez
+SERVE_EVERY_MINUTES = 60  # Período del modo serve
+DAG_WORKERS = 4  # Etapas independientes que corren en paralelo (ver dag.py)
+SILVER_WORKERS = 1  # Procesos para transformar lotes grandes de Bronze a Silver (1 = en el proceso actual)
+SERVE_OFFSET_MINUTES = 2  # Minuto dentro del período en que corre cada tick (ej: hh:02)
+ARCHIVE_DIR = "datalake/raw/coingecko/responses"  # Respuestas crudas comprimidas (ver archive.py); None lo desactiva
+BRONZE_ROW_INDEX_FILE = "state/bronze_row_index.parquet"  # id → (last_updated, hash) de la última fila escrita
+SILVER_ROW_INDEX_FILE = "state/silver_row_index.parquet"
+REPLAY = False  # --replay: los requests se responden desde ARCHIVE_DIR, sin red
+ARCHIVE_OPTIONS = None  # Opciones de configure_archive (las completa cli); None: sin archivo
 
-# === LOGGING ===
-logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 logger = logging.getLogger(__name__)
 
+# === ARRANQUE ===
+def init_runtime():
+    """
+    Efectos de arranque del proceso: logging y directorios de estado y del datalake.
+    Lo llama cli(); quien use el módulo como librería lo llama una vez antes de correr etapas.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    os.makedirs("state", exist_ok=True)
+    os.makedirs(COINS_BRONZE_PATH, exist_ok=True)
+
+def configure_extraction():
+    """
+    Configura el archivo de respuestas crudas (o el modo replay) justo antes de la primera
+    etapa que usa la API, para no importar extract/requests en corridas que se saltean.
+    """
+    if ARCHIVE_OPTIONS is not None:
+        from extract import configure_archive
+        configure_archive(ARCHIVE_DIR, **ARCHIVE_OPTIONS)
+
 # === FUNCIONES DE CONTROL DE ESTADO ===
 def read_last_extraction():
+    """Última extracción en UTC (los estados anteriores, sin zona horaria, se leen como hora local)."""
     if not os.path.exists(STATE_FILE):
         return None
     with open(STATE_FILE, "r") as f:
         state = json.load(f)
-        return datetime.strptime(state["last_extraction"], "%Y-%m-%dT%H:%M:%S")
+        return datetime.fromisoformat(state["last_extraction"]).astimezone(timezone.utc)
+
+def parse_utc(value):
+    """Instante ISO de la línea de comandos; sin zona horaria se interpreta como UTC."""
+    moment = datetime.fromisoformat(value)
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
 
 def save_current_extraction(current_time):
     with open(STATE_FILE, "w") as f:
-        json.dump({"last_extraction": current_time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+        json.dump({"last_extraction": current_time.astimezone(timezone.utc).isoformat(timespec="seconds")}, f)
+
+def read_coinlist_state():
+    if not os.path.exists(COINLIST_STATE_FILE):
+        return {}
+    with open(COINLIST_STATE_FILE, "r") as f:
+        return json.load(f)
+
+def save_coinlist_state(state):
+    with open(COINLIST_STATE_FILE, "w") as f:
+        json.dump(state, f)
 
 def should_extract(now, last_time):
     if last_time is None:
@@ -50,8 +115,31 @@ def should_extract(now, last_time):
 
 # === FLUJO FUNCIONAL ===
 def run_coin_list_extraction(now):
+    """
+    Extrae /coins/list y la guarda en Bronze solo si cambió desde la última corrida
+    (304 del servidor o mismo hash del contenido → sin escrituras).
+
+    Retorna:
+        (DataFrame | None, dict | None): monedas guardadas en Bronze (None si no hubo cambios
+        o hubo error) y el estado a persistir una vez procesado Silver.
+    """
+    import pandas as pd
+    from delta_utils import save_data_as_delta
+    from extract import extract_coin_list_if_changed
+
     logger.info("🚀 Extracción FULL desde /coins/list...")
-    coin_list = extract_coin_list()
+    state = read_coinlist_state()
+    result = extract_coin_list_if_changed(etag=state.get("etag"), last_modified=state.get("last_modified"))
+    if result is None:
+        logger.error("❌ Error al extraer la lista de monedas.")
+        return None, None
+
+    new_state = {"etag": result["etag"], "last_modified": result["last_modified"], "sha256": result["sha256"] or state.get("sha256")}
+    if result["not_modified"] or result["sha256"] == state.get("sha256"):
+        logger.info("⏩ La lista de monedas no cambió desde la última extracción. Sin escrituras.")
+        return None, new_state
+
+    coin_list = result["data"]
     if coin_list:
         logger.info(f"🪙 Extraído {len(coin_list)} monedas.")
         logger.info(f"{coin_list[:3]}")
@@ -61,32 +149,205 @@ def run_coin_list_extraction(now):
         df_coins["hour"] = now.strftime("%H")
         save_data_as_delta(df_coins, path=COINS_BRONZE_PATH, mode="overwrite", partition_cols=["date", "hour"])
         logger.info(f"✅ Datos de monedas guardados en {COINS_BRONZE_PATH}.")
+        return df_coins, new_state
     else:
         logger.error("❌ Error al extraer la lista de monedas.")
+        return None, None
+
+def run_market_extraction(now, coins):
+    """
+    Extrae los datos de mercado de `coins` y agrega las columnas de partición.
+    Retorna el DataFrame (o pyarrow.Table en modo Arrow) o None si no hubo datos.
+    """
+    from extract import extract_market_data
+    from utils.arrow_utils import add_partition_columns
 
-def run_market_extraction(now):
     logger.info("📈 Extracción INCREMENTAL de datos crudos del mercado...")
-    df_raw = extract_market_data(coins=COINS, vs_currency="usd", as_dataframe=True)
-    if df_raw is not None and not df_raw.empty:
-        df_raw["coin"] = df_raw["id"]
-        df_raw["date"] = now.strftime("%Y-%m-%d")
-        df_raw["day"] = now.strftime("%d")
-        df_raw["hour"] = now.strftime("%H")
+    as_arrow = INGEST_MODE == "arrow"
+    df_raw = extract_market_data(coins=coins, vs_currency="usd", as_dataframe=True, as_arrow=as_arrow)
+    if df_raw is not None and len(df_raw) > 0:
+        if as_arrow:
+            df_raw = add_partition_columns(df_raw, now)
+        else:
+            df_raw["coin"] = df_raw["id"]
+            df_raw["date"] = now.strftime("%Y-%m-%d")
+            df_raw["day"] = now.strftime("%d")
+            df_raw["hour"] = now.strftime("%H")
+        return add_layout_columns(df_raw, PARTITION_LAYOUT)
+    else:
+        logger.error("❌ No se extrajo información desde CoinGecko.")
+        return None
 
-        predicate = "target.id = source.id AND target.last_updated = source.last_updated"
+def save_market_bronze(df_raw):
+    """
+    Upsert de los datos crudos de mercado en Bronze (crea la tabla si no existe).
+    Las columnas nuevas de la API se agregan a la tabla (ver schema_registry.py); si el
+    MERGE falla, el error se propaga: la tabla nunca se reescribe.
+    """
+    from delta_utils import upsert_data_as_delta
 
-        try:
-            upsert_data_as_delta(df_raw, BRONZE_PATH, predicate)
-            logger.info("✅ Upsert realizado con éxito en Delta Lake.")
-        except Exception as e:
-            logger.warning(f"⚠️ Falló el upsert. Se realizará inserción inicial: {e}")
-            save_data_as_delta(df_raw, BRONZE_PATH, mode="overwrite", partition_cols=PARTITION_COLS)
-            logger.info("✅ Datos insertados por primera vez con 'overwrite'.")
+    predicate = "target.id = source.id AND target.last_updated = source.last_updated"
+
+    try:
+        upsert_data_as_delta(df_raw, BRONZE_PATH, predicate, partition_cols=PARTITION_COLS,
+                             configuration=BRONZE_TABLE_CONFIG, merge_schema=True)
+        logger.info("✅ Upsert realizado con éxito en Delta Lake.")
+    except Exception as e:
+        logger.error(f"❌ Falló el upsert en Bronze (la tabla no se modificó): {e}")
+        raise
+
+def record_commit(stage, path):
+    """
+    Completa la etapa con la versión y los bytes escritos del último commit de la tabla.
+    """
+    from delta_utils import read_commit_actions
+
+    commit = read_commit_actions(path)
+    stage.delta_version = commit["version"]
+    stage.bytes_written = commit["bytes_added"]
+
+def run_extract_phase(now, recorder):
+    """
+    Etapas de extracción como DAG (ver dag.py): la rama de la coin list (extract → Silver)
+    corre en paralelo con la de mercados (universo → extract → upsert en Bronze).
+    El universo se resuelve con la coin list ya confirmada en Silver, así la extracción de
+    mercados no espera las escrituras de la coin list.
+
+    Retorna:
+        dict | None: lote escrito en Bronze y su versión ({"data", "version"}), o None si no
+        se guardaron datos de mercado.
+    """
+    from change_index import get_change_index, suppress_unchanged
+    from extract import get_request_stats
+    from process_coinlist import process_and_save_coinlist
+    from schema_registry import conform_to_table
+    from universe import load_universe
+
+    def coinlist_extract(st):
+        df_coins, coinlist_state = run_coin_list_extraction(now)
+        st.rows_out = len(df_coins) if df_coins is not None else 0
+        if df_coins is not None:
+            record_commit(st, COINS_BRONZE_PATH)
+        return df_coins, coinlist_state
+
+    # Limpieza y guardado de la coin list en Silver (solo si cambió)
+    def coinlist_silver(st, coinlist_extract):
+        df_coins, coinlist_state = coinlist_extract
+        if df_coins is not None:
+            st.rows_out = process_and_save_coinlist(COINS_BRONZE_PATH, COINS_SILVER_PATH, history_path=COINS_HISTORY_PATH, data=df_coins)
+            if st.rows_out:
+                record_commit(st, COINS_SILVER_PATH)
+        if coinlist_state is not None and (df_coins is None or st.get("rows_out") is not None):
+            save_coinlist_state(coinlist_state)
 
+    def universe(st):
+        coins = load_universe(UNIVERSE, UNIVERSE_CACHE_FILE, coins_silver_path=COINS_SILVER_PATH, ttl_hours=UNIVERSE_TTL_HOURS)
+        st.rows_out = len(coins) if coins else 0
+        return coins
+
+    def market_extract(st, universe):
+        df_raw = run_market_extraction(now, universe) if universe else None
+        st.rows_out = len(df_raw) if df_raw is not None else 0
         return df_raw
+
+    def bronze_upsert(st, market_extract):
+        if market_extract is None:
+            return None
+        st.rows_in = len(market_extract)
+        conformed, valid = conform_to_table(market_extract, BRONZE_PATH, QUARANTINE_PATH, "Bronze")
+        st.quarantined = int((~valid).sum())
+        changed, pending, st.suppressed = suppress_unchanged(conformed, BRONZE_ROW_INDEX_FILE, "Bronze")
+        if len(changed) == 0:
+            logger.info("♻️ Ningún snapshot cambió desde la última extracción: se omite el MERGE en Bronze.")
+            st.rows_out = 0
+            return {}
+        save_market_bronze(changed)
+        record_commit(st, BRONZE_PATH)
+        get_change_index(BRONZE_ROW_INDEX_FILE).commit(pending)
+        st.rows_out = len(changed)
+        return {"data": changed, "version": st.delta_version}
+
+    stages = [
+        Stage("coinlist_extract", coinlist_extract),
+        Stage("coinlist_silver", coinlist_silver, deps=["coinlist_extract"]),
+        Stage("universe", universe),
+        Stage("market_extract", market_extract, deps=["universe"]),
+        Stage("bronze_upsert", bronze_upsert, deps=["market_extract"]),
+    ]
+    try:
+        return run_dag(stages, recorder, name="extract", max_workers=DAG_WORKERS)["bronze_upsert"]
+    finally:
+        recorder.extra["api"] = get_request_stats()
+
+def run_process_phase(now, recorder, bronze_batch=None):
+    """
+    Etapas de procesamiento como DAG: Bronze → Silver y luego Gold y verificación en paralelo
+    (la exportación Arrow IPC, si está configurada, corre después de Gold).
+    Los lotes recién escritos pasan en memoria a la etapa siguiente (ver `batch` en
+    process_and_save_markets y update_gold); si hay otros cambios pendientes se leen por CDF.
+    """
+    from delta_utils import committed_rows, verify_delta_write
+    from gold import update_gold
+    from ipc_export import export_ipc
+    from process_markets import process_and_save_markets
+
+    date_str = now.strftime("%Y-%m-%d")
+    bronze_batch = bronze_batch or {}
+
+    def silver_process(st):
+        st.rows_out, df = process_and_save_markets(
+            BRONZE_PATH, SILVER_PATH, day=now.day, hour=now.hour, date_str=date_str,
+            watermark_file=BRONZE_WATERMARK_FILE, layout=PARTITION_LAYOUT, verify=False, change_index_file=SILVER_ROW_INDEX_FILE,
+            quarantine_path=QUARANTINE_PATH, workers=SILVER_WORKERS,
+            batch=bronze_batch.get("data"), batch_version=bronze_batch.get("version"), return_frame=True,
+        )
+        if st.rows_out:
+            record_commit(st, SILVER_PATH)
+            return {"data": df, "version": st.delta_version}
+        return {}
+
+    def gold(st, silver_process):
+        result = update_gold(SILVER_PATH, GOLD_HOURLY_PATH, GOLD_DAILY_PATH, SILVER_WATERMARK_FILE, GOLD_STATE_FILE,
+                             batch=silver_process.get("data"), batch_version=silver_process.get("version"))
+        st.rows_in = result["rows_in"]
+        st.rows_out = result["hourly"] + result["daily"]
+
+    # Exportación Arrow IPC por moneda. Espera a Gold: en la primera corrida ambos habilitan el CDF de Silver
+    def ipc_export(st, silver_process, gold):
+        result = export_ipc(SILVER_PATH, IPC_EXPORT_DIR, batch=silver_process.get("data"), batch_version=silver_process.get("version"))
+        st.rows_in = result["rows_in"]
+        st.rows_out = result["coins"]
+
+    # Verificación por log de transacciones: filas y particiones del commit de Silver
+    def verify(st, silver_process):
+        if not silver_process:
+            return
+        df = silver_process["data"]
+        partitions = df[PARTITION_COLS].drop_duplicates().to_dict("records")
+        commit = verify_delta_write(SILVER_PATH, len(df), version=silver_process["version"], expected_partitions=partitions)
+        st.rows_out = committed_rows(commit)
+
+    stages = [
+        Stage("silver_process", silver_process),
+        Stage("gold", gold, deps=["silver_process"]),
+        Stage("verify", verify, deps=["silver_process"]),
+    ]
+    if IPC_EXPORT_DIR:
+        stages.append(Stage("ipc_export", ipc_export, deps=["silver_process", "gold"]))
+    run_dag(stages, recorder, name="process", max_workers=DAG_WORKERS)
+    if REPLAY:
+        # Un replay reprocesa datos archivados: no cuenta como extracción para el próximo cron
+        logger.info("📼 Modo replay: no se actualiza el estado de la última extracción.")
     else:
-        logger.error("❌ No se extrajo información desde CoinGecko.")
-        return None
+        save_current_extraction(now)
+
+def finish_run(recorder):
+    """
+    Persiste el registro de la corrida (JSONL y, si está configurado, textfile de Prometheus).
+    """
+    recorder.write_jsonl(RUN_LOG_FILE)
+    if PROMETHEUS_FILE:
+        recorder.write_prometheus(PROMETHEUS_FILE)
 
 def main():
     """
@@ -96,31 +357,206 @@ def main():
     - Extrae y guarda market data (incremental)
     - Procesa ambos hacia Silver
     - Actualiza estado de ejecución
+    Cada etapa queda registrada (tiempo, filas, bytes, memoria, versión Delta) en RUN_LOG_FILE.
     """
     
-     # Timestamp actual
-    now = datetime.now()
+     # Timestamp actual (UTC, igual que los ticks de serve y el estado de la última extracción)
+    now = datetime.now(timezone.utc)
     date_str = now.strftime("%Y-%m-%d")
     hour_str = now.strftime("%H")
     logger.info(f"🕐 Ejecutando extracción {date_str} a las {hour_str}hs")
 
     # Verificación de estado
     last_extraction = read_last_extraction()
-    if not should_extract(now, last_extraction):
+    if REPLAY:
+        logger.info("📼 Modo replay: se omite la verificación de frecuencia.")
+    elif not should_extract(now, last_extraction):
         return
 
-    # Ejecución del flujo de trabajo
-    run_coin_list_extraction(now)
+    with pipeline_lock(LOCK_FILE) as acquired:
+        if not acquired:
+            logger.warning(f"🔒 Otra instancia del pipeline está corriendo ({LOCK_FILE}). Se omite esta ejecución.")
+            return
+        configure_extraction()
+        recorder = RunRecorder()
+        try:
+            bronze_batch = run_extract_phase(now, recorder)
+            if bronze_batch is not None:
+                run_process_phase(now, recorder, bronze_batch)
+        finally:
+            finish_run(recorder)
+
+    from extract import get_request_stats
+    logger.info(f"📊 Uso de la API en esta ejecución: {get_request_stats()}")
 
-    # Limpieza y guardado de la coin list en Silver
-    process_and_save_coinlist(COINS_BRONZE_PATH,COINS_SILVER_PATH)
+def warm_up():
+    """
+    Abre la sesión HTTP y las tablas existentes antes del primer tick del daemon.
+    """
+    from deltalake import DeltaTable
+    from delta_utils import get_table
+    from extract import get_session
 
+    get_session()
+    for path in (BRONZE_PATH, SILVER_PATH, COINS_SILVER_PATH, GOLD_HOURLY_PATH, GOLD_DAILY_PATH):
+        if DeltaTable.is_deltatable(path):
+            get_table(path)
 
-    df_raw = run_market_extraction(now)
-    if df_raw is not None:
-        process_and_save_markets(BRONZE_PATH, SILVER_PATH, day=now.day, hour=now.hour)
-        save_current_extraction(now)
+def run_serve(args):
+    """
+    Modo residente: ejecuta el pipeline en cada tick del calendario (ver daemon.py).
+    """
+    from extract import reset_request_stats
+
+    configure_extraction()
+    def extract_phase(now, recorder):
+        reset_request_stats()
+        return run_extract_phase(now, recorder)
+
+    daemon = PipelineDaemon(
+        extract_phase, run_process_phase, finish_run, warmup=warm_up,
+        every_minutes=args.every, offset_minutes=args.offset, lock_file=LOCK_FILE,
+        started_at=PROCESS_START, max_ticks=args.max_ticks,
+    )
+    daemon.run()
+
+def run_maintain(args):
+    """
+    Mantenimiento de las tablas del datalake (compactación, Z-order, checkpoint y vacuum).
+    """
+    from gold import read_silver_watermark
+    from maintenance import RETENTION_HOURS, run_maintenance
+    from process_markets import read_bronze_watermark
+
+    tables = [BRONZE_PATH, SILVER_PATH, COINS_BRONZE_PATH, COINS_SILVER_PATH, COINS_HISTORY_PATH, GOLD_HOURLY_PATH, GOLD_DAILY_PATH]
+    logger.info("🧹 Iniciando mantenimiento del datalake...")
+    run_maintenance(
+        tables,
+        zorder=args.zorder,
+        dates=args.dates,
+        retention_hours=RETENTION_HOURS if args.retention_hours is None else args.retention_hours,
+        vacuum=not args.no_vacuum,
+        force=args.force,
+        watermarks={
+            BRONZE_PATH: read_bronze_watermark(BRONZE_WATERMARK_FILE),
+            SILVER_PATH: read_silver_watermark(SILVER_WATERMARK_FILE),
+        },
+    )
+
+def run_migrate(args):
+    """
+    Reescribe las tablas de mercados al layout de particionamiento indicado.
+    La tabla migrada empieza de nuevo en la versión 0: tras migrar Bronze, el watermark de
+    Silver apunta a la versión nueva, y tras migrar Silver, el de Gold y la exportación IPC (ejecutar después de
+    una corrida normal para no dejar cambios sin procesar).
+    """
+    from gold import save_silver_watermark
+    from ipc_export import mark_exported
+    from maintenance import migrate_table
+    from process_markets import save_bronze_watermark
+
+    cols = partition_cols(args.layout)
+    tables = {"bronze": BRONZE_PATH, "silver": SILVER_PATH}
+    for name in args.tables:
+        path = tables[name]
+        logger.info(f"🚚 Migrando {path} al layout '{args.layout}' ({cols})...")
+        version = migrate_table(path, cols, transform=lambda batch: add_layout_columns(batch, args.layout))
+        if name == "bronze":
+            save_bronze_watermark(BRONZE_WATERMARK_FILE, version)
+        else:
+            if os.path.exists(SILVER_WATERMARK_FILE):
+                save_silver_watermark(SILVER_WATERMARK_FILE, version)
+            if IPC_EXPORT_DIR:
+                mark_exported(IPC_EXPORT_DIR, version)
+    logger.info(f"✅ Migración completa. Actualizar PARTITION_LAYOUT = \"{args.layout}\" en main.py.")
+
+def run_backfill_command(args):
+    """
+    Reconstruye en Bronze las horas faltantes entre --start y --end (por defecto, desde la
+    última extracción hasta la hora actual). La próxima corrida procesa esas filas hacia
+    Silver a través del change data feed.
+    """
+    from backfill import CHUNK_DAYS, run_backfill
+    from universe import load_universe
+
+    configure_extraction()
+    end = parse_utc(args.end) if args.end else datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = parse_utc(args.start) if args.start else read_last_extraction()
+    if start is None:
+        logger.error("❌ No hay última extracción registrada: indicar --start.")
+        return
+    if start >= end:
+        logger.info("⏩ No hay horas para reconstruir.")
+        return
+    coins = args.coins or load_universe(UNIVERSE, UNIVERSE_CACHE_FILE, coins_silver_path=COINS_SILVER_PATH, ttl_hours=UNIVERSE_TTL_HOURS)
+    if not coins:
+        logger.error("❌ No se pudo resolver el universo de monedas.")
+        return
+    summary = run_backfill(coins, start, end, BRONZE_PATH, layout=PARTITION_LAYOUT,
+                           chunk_days=args.chunk_days or CHUNK_DAYS, max_workers=args.workers, quarantine_path=QUARANTINE_PATH)
+    logger.info(f"✅ Backfill terminado: {summary}")
+
+# Comandos que modifican las tablas fuera de una corrida: se ejecutan con el lock del pipeline
+ADMIN_COMMANDS = {"maintain": run_maintain, "migrate": run_migrate, "backfill": run_backfill_command}
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline ELT de CoinGecko hacia Delta Lake")
+    subparsers = parser.add_subparsers(dest="command")
+    parser.add_argument("--debug", action="store_true", help="Log DEBUG con diagnósticos de memoria (costosos)")
+    parser.add_argument("--prometheus", metavar="PATH", help="Escribe las métricas de la corrida como textfile de Prometheus")
+    parser.add_argument("--replay", action="store_true", help="Responde los requests desde el archivo de respuestas, sin red")
+    parser.add_argument("--replay-as-of", metavar="ISO", help="En replay, usa las respuestas archivadas hasta este instante (UTC si no indica zona)")
+    parser.add_argument("--no-archive", action="store_true", help="No archiva las respuestas crudas de la API")
+    subparsers.add_parser("run", help="Ejecuta el pipeline horario (por defecto)")
+
+    maintain = subparsers.add_parser("maintain", help="Compacta, ordena y limpia las tablas Delta")
+    maintain.add_argument("--zorder", action="store_true", help="Aplica Z-order por id, last_updated")
+    maintain.add_argument("--date", action="append", dest="dates", help="Fecha YYYY-MM-DD a compactar (repetible)")
+    maintain.add_argument("--retention-hours", type=int, help="Retención del vacuum en horas (por defecto, maintenance.RETENTION_HOURS)")
+    maintain.add_argument("--no-vacuum", action="store_true", help="No borra archivos expirados")
+    maintain.add_argument("--force", action="store_true", help="Permite una retención menor que maintenance.RETENTION_HOURS (nunca menor que el change data feed sin consumir)")
+
+    migrate = subparsers.add_parser("migrate", help="Reescribe las tablas de mercados a otro layout de particiones")
+    migrate.add_argument("--layout", required=True, choices=sorted(LAYOUTS), help="Layout destino")
+    migrate.add_argument("--tables", nargs="+", choices=["bronze", "silver"], default=["bronze", "silver"])
+
+    backfill = subparsers.add_parser("backfill", help="Reconstruye horas faltantes desde market_chart/range")
+    backfill.add_argument("--start", help="Inicio YYYY-MM-DD[THH:MM] en UTC (por defecto, la última extracción)")
+    backfill.add_argument("--end", help="Fin excluido YYYY-MM-DD[THH:MM] en UTC (por defecto, la hora actual)")
+    backfill.add_argument("--coins", nargs="+", help="Ids de monedas (por defecto, el universo configurado)")
+    backfill.add_argument("--chunk-days", type=int, help="Días por request (máximo 90; por defecto, backfill.CHUNK_DAYS)")
+    backfill.add_argument("--workers", type=int, default=4, help="Requests simultáneos")
+
+    serve = subparsers.add_parser("serve", help="Proceso residente con calendario alineado")
+    serve.add_argument("--every", type=float, default=SERVE_EVERY_MINUTES, help="Período en minutos")
+    serve.add_argument("--offset", type=float, default=SERVE_OFFSET_MINUTES, help="Desplazamiento en minutos dentro del período")
+    serve.add_argument("--max-ticks", type=int, help="Termina después de N ticks")
+
+    args = parser.parse_args(argv)
+    init_runtime()
+    if args.debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+    if args.prometheus:
+        global PROMETHEUS_FILE
+        PROMETHEUS_FILE = args.prometheus
+    if args.replay or not args.no_archive:
+        global REPLAY, ARCHIVE_OPTIONS
+        REPLAY = args.replay
+        as_of = parse_utc(args.replay_as_of) if args.replay_as_of else None
+        ARCHIVE_OPTIONS = {"replay": args.replay, "as_of": as_of}
+
+    if args.command in ADMIN_COMMANDS:
+        # Mismo lock que run/serve: migrate renombra tablas y maintain hace vacuum
+        with pipeline_lock(LOCK_FILE) as acquired:
+            if not acquired:
+                logger.warning(f"🔒 Otra instancia del pipeline está corriendo ({LOCK_FILE}). No se ejecuta '{args.command}'.")
+                return
+            ADMIN_COMMANDS[args.command](args)
+    elif args.command == "serve":
+        run_serve(args)
+    else:
+        main()
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,221 @@
+# maintenance.py
+
+"""
+Mantenimiento de las tablas Delta del datalake.
+
+Las corridas horarias generan muchos archivos Parquet pequeños y muchas entradas en el
+log de Delta. Este módulo:
+- Compacta archivos pequeños por partición (opcionalmente solo para ciertas fechas).
+- Opcionalmente aplica Z-order por id, last_updated.
+- Crea un checkpoint del log y limpia entradas de log expiradas.
+- Ejecuta vacuum de los archivos que ya no referencia la tabla.
+- Migra una tabla a otro layout de particionamiento (migrate_table).
+
+Reporta archivos y bytes antes y después de cada tabla. La retención del vacuum debe
+cubrir el atraso de los watermarks (Bronze → Silver, Silver → Gold): el change data feed
+de las versiones todavía no consumidas deja de poder leerse si se borran sus archivos. Por
+eso el vacuum se niega a usar una retención menor que la antigüedad de la versión más
+vieja sin consumir, y una retención menor que RETENTION_HOURS requiere `force=True`.
+"""
+
+import logging
+import os
+import shutil
+import time
+
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+
+from delta_utils import delta_table_stats
+
+logger = logging.getLogger(__name__)
+
+ZORDER_COLS = ["id", "last_updated"]
+RETENTION_HOURS = 168  # 7 días: retención por defecto de Delta
+TARGET_FILE_SIZE = 64 * 1024 * 1024
+
+
+def unconsumed_cdf_age_hours(path, consumed_version):
+    """
+    Antigüedad (horas) del commit más viejo cuyo change data feed todavía no se consumió,
+    es decir, la versión siguiente a `consumed_version`. Retorna None si no hay pendientes.
+    """
+    if consumed_version is None:
+        return None
+    dt = DeltaTable(path)
+    current = dt.version()
+    pending = consumed_version + 1
+    if pending > current:
+        return None
+    for i, entry in enumerate(dt.history(limit=current - pending + 1)):
+        if entry.get("version", current - i) == pending:
+            return (time.time() * 1000 - entry["timestamp"]) / 3_600_000
+    return None
+
+
+def check_retention(path, retention_hours, consumed_version=None, force=False):
+    """
+    Valida la retención del vacuum antes de borrar archivos.
+
+    Lanza:
+    - ValueError si la retención es menor que RETENTION_HOURS sin `force`, o si es menor que
+      la antigüedad de la versión más vieja cuyo change data feed no se consumió.
+    """
+    if retention_hours < RETENTION_HOURS and not force:
+        raise ValueError(
+            f"Retención de {retention_hours}h menor que {RETENTION_HOURS}h en {path}: usar force para confirmarla"
+        )
+    age = unconsumed_cdf_age_hours(path, consumed_version)
+    if age is not None and retention_hours < age:
+        raise ValueError(
+            f"Retención de {retention_hours}h menor que la antigüedad ({age:.1f}h) de la versión "
+            f"{consumed_version + 1} de {path}, que el watermark todavía no consumió"
+        )
+
+
+def maintain_table(path, zorder=False, zorder_cols=None, dates=None, retention_hours=RETENTION_HOURS,
+                   target_size=TARGET_FILE_SIZE, vacuum=True, consumed_version=None, force=False):
+    """
+    Compacta, (opcionalmente) ordena por Z-order, hace checkpoint y vacuum de una tabla Delta.
+
+    Args:
+        path (str): Ruta de la tabla Delta.
+        zorder (bool): si True, aplica Z-order en lugar de la compactación simple.
+        zorder_cols (list, optional): columnas del Z-order (por defecto, id y last_updated).
+        dates (list, optional): fechas (YYYY-MM-DD) a compactar; por defecto, toda la tabla.
+        retention_hours (int): antigüedad mínima de los archivos a borrar en el vacuum.
+        target_size (int): tamaño objetivo de los archivos compactados (bytes).
+        vacuum (bool): si False, no se borran archivos (solo compactación y checkpoint).
+        consumed_version (int, optional): última versión consumida por el watermark de la
+            tabla; el vacuum no borra archivos que su change data feed pendiente necesita.
+        force (bool): permite una retención menor que RETENTION_HOURS (desactiva el control
+            de retención de delta-rs).
+
+    Retorna:
+        dict: estadísticas antes/después y métricas de la optimización.
+    """
+    if vacuum:
+        check_retention(path, retention_hours, consumed_version, force)
+
+    before = delta_table_stats(path)
+    dt = DeltaTable(path)
+    partition_cols = dt.metadata().partition_columns
+
+    filters = None
+    if dates:
+        if "date" not in partition_cols:
+            raise ValueError(f"La tabla {path} no está particionada por 'date'")
+        filters = [("date", "in", list(dates))]
+
+    if zorder:
+        cols = [c for c in (zorder_cols or ZORDER_COLS) if c not in partition_cols]
+        metrics = dt.optimize.z_order(cols, partition_filters=filters, target_size=target_size)
+    else:
+        metrics = dt.optimize.compact(partition_filters=filters, target_size=target_size)
+
+    dt = DeltaTable(path)
+    dt.create_checkpoint()
+    dt.cleanup_metadata()
+
+    removed = []
+    if vacuum:
+        removed = dt.vacuum(
+            retention_hours=retention_hours,
+            dry_run=False,
+            enforce_retention_duration=not force,
+        )
+
+    after = delta_table_stats(path)
+    logger.info(
+        f"🧹 {path}: {before['files']} → {after['files']} archivos, "
+        f"{before['bytes'] / 2**20:.1f} → {after['bytes'] / 2**20:.1f} MB, "
+        f"{len(removed)} archivos borrados por vacuum"
+    )
+    return {
+        "path": path,
+        "before": before,
+        "after": after,
+        "files_added": metrics.get("numFilesAdded"),
+        "files_removed": metrics.get("numFilesRemoved"),
+        "vacuumed_files": len(removed),
+    }
+
+
+def run_maintenance(paths, watermarks=None, **kwargs):
+    """
+    Ejecuta maintain_table sobre cada tabla existente de `paths`.
+    `watermarks` mapea una ruta a la última versión consumida de su change data feed.
+    Retorna la lista de reportes (las tablas inexistentes o con error se informan y se saltean).
+    """
+    watermarks = watermarks or {}
+    reports = []
+    for path in paths:
+        if not DeltaTable.is_deltatable(path):
+            logger.warning(f"⚠️ {path} no es una tabla Delta. Se omite.")
+            continue
+        try:
+            reports.append(maintain_table(path, consumed_version=watermarks.get(path), **kwargs))
+        except Exception as e:
+            logger.error(f"❌ ERROR en el mantenimiento de {path}: {e}")
+    return reports
+
+
+def migrate_table(path, partition_cols, transform=None, batch_size=65536):
+    """
+    Reescribe una tabla Delta con otras columnas de partición, leyendo y escribiendo por lotes
+    (sin cargar la tabla completa en memoria).
+
+    La tabla nueva se escribe en `<path>__migrating` conservando las propiedades de la tabla
+    original; al terminar, la original se renombra a `<path>__backup_v<versión>` y la nueva
+    ocupa su lugar. El backup se puede borrar manualmente una vez verificada la migración.
+
+    Args:
+        path (str): Ruta de la tabla Delta (local).
+        partition_cols (list): Nuevas columnas de partición.
+        transform (callable, optional): función RecordBatch → RecordBatch aplicada a cada lote
+            (ej: agregar columnas derivadas del layout).
+        batch_size (int): filas por lote.
+
+    Retorna:
+        int: versión de la tabla migrada.
+    """
+    dt = DeltaTable(path)
+    source_version = dt.version()
+    configuration = dt.metadata().configuration
+    dataset = dt.to_pyarrow_dataset()
+    batches = dataset.to_batches(batch_size=batch_size)
+
+    if transform is not None:
+        first = next(iter(dataset.to_batches(batch_size=1)), None)
+        if first is None:
+            raise ValueError(f"La tabla {path} está vacía: no hay nada que migrar")
+        schema = transform(first).schema
+        batches = (transform(batch) for batch in batches)
+    else:
+        schema = dataset.schema
+
+    tmp_path = f"{path}__migrating"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    write_deltalake(
+        tmp_path,
+        pa.RecordBatchReader.from_batches(schema, batches),
+        partition_by=partition_cols,
+        mode="overwrite",
+        configuration=configuration or None,
+    )
+
+    before = delta_table_stats(path)
+    after = delta_table_stats(tmp_path)
+    if before["rows"] is not None and before["rows"] != after["rows"]:
+        shutil.rmtree(tmp_path)
+        raise RuntimeError(f"La migración de {path} no conserva las filas ({before['rows']} → {after['rows']})")
+
+    backup_path = f"{path}__backup_v{source_version}"
+    os.rename(path, backup_path)
+    os.rename(tmp_path, path)
+    logger.info(
+        f"🚚 {path}: {before['files']} → {after['files']} archivos, particiones {partition_cols}. "
+        f"Backup en {backup_path}"
+    )
+    return DeltaTable(path).version()
@@ -1,14 +1,102 @@
 import logging
-from deltalake import DeltaTable
+import pandas as pd
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+from deltalake.exceptions import TableNotFoundError
 from delta_utils import save_data_as_delta
 from utils.data_validation import apply_column_types, validate_required_columns
 from schema import REQUIRED_COINLIST_COLUMNS
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
 
-def process_and_save_coinlist(bronze_path, silver_path, day=None, hour=None):
+COIN_KEY_COLS = ["id", "symbol", "name"]
+
+def read_coin_snapshot(silver_path):
+    """
+    Lee el snapshot actual de monedas (id, symbol, name) desde Silver. None si no existe.
+    """
+    try:
+        return DeltaTable(silver_path).to_pandas(columns=COIN_KEY_COLS)
+    except TableNotFoundError:
+        return None
+
+def diff_coin_lists(old, new):
+    """
+    Compara dos listas de monedas por id.
+
+    Retorna:
+        dict: DataFrames 'added', 'removed' y 'renamed' (cambio de symbol o name),
+        con columnas id, symbol, name (para 'removed', los valores anteriores).
+    """
+    old = old[COIN_KEY_COLS].astype("string")
+    new = new[COIN_KEY_COLS].astype("string")
+    merged = old.merge(new, on="id", how="outer", suffixes=("_old", "_new"), indicator=True)
+
+    def pick(rows, suffix):
+        return rows[["id", f"symbol{suffix}", f"name{suffix}"]].set_axis(COIN_KEY_COLS, axis=1).reset_index(drop=True)
+
+    both = merged[merged["_merge"] == "both"]
+    changed = (both["symbol_old"].ne(both["symbol_new"]) | both["name_old"].ne(both["name_new"])).fillna(True)
+    return {
+        "added": pick(merged[merged["_merge"] == "right_only"], "_new"),
+        "removed": pick(merged[merged["_merge"] == "left_only"], "_old"),
+        "renamed": pick(both[changed], "_new"),
+    }
+
+def update_coin_history(history_path, changes, timestamp, initial=None):
+    """
+    Aplica los cambios de la lista de monedas a la tabla de historia (SCD tipo 2).
+
+    Cada versión de una moneda es una fila con valid_from / valid_to e is_current.
+    - added: nueva fila vigente (change_type='added').
+    - renamed: se cierra la fila vigente (end_reason='renamed') y se abre una nueva.
+    - removed: se cierra la fila vigente (end_reason='removed').
+
+    Si la tabla no existe se inicializa con `initial` (la lista completa, change_type='initial').
+
+    Retorna:
+        int: filas insertadas en la historia.
+    """
+    def versions(rows, change_type):
+        rows = rows[COIN_KEY_COLS].astype("string").copy()
+        rows["valid_from"] = timestamp
+        rows["valid_to"] = pd.Series(pd.NA, index=rows.index, dtype="string")
+        rows["is_current"] = True
+        rows["change_type"] = change_type
+        rows["end_reason"] = pd.Series(pd.NA, index=rows.index, dtype="string")
+        return pa.Table.from_pandas(rows, preserve_index=False)
+
+    if not DeltaTable.is_deltatable(history_path):
+        seed = initial if initial is not None else changes["added"]
+        write_deltalake(history_path, versions(seed, "initial"), mode="overwrite")
+        return len(seed)
+
+    closing = pd.concat([
+        changes["renamed"][["id"]].assign(end_reason="renamed"),
+        changes["removed"][["id"]].assign(end_reason="removed"),
+    ], ignore_index=True).astype("string")
+    if not closing.empty:
+        DeltaTable(history_path).merge(
+            source=pa.Table.from_pandas(closing, preserve_index=False),
+            predicate="target.id = source.id AND target.is_current = true",
+            source_alias="source",
+            target_alias="target",
+        ).when_matched_update({
+            "valid_to": f"'{timestamp}'",
+            "is_current": "false",
+            "end_reason": "source.end_reason",
+        }).execute()
+
+    inserts = [t for t in (versions(changes["added"], "added"), versions(changes["renamed"], "renamed")) if t.num_rows]
+    if not inserts:
+        return 0
+    table = pa.concat_tables(inserts)
+    write_deltalake(history_path, table, mode="append")
+    return table.num_rows
+
+def process_and_save_coinlist(bronze_path, silver_path, day=None, hour=None, history_path=None, data=None):
     """
     Procesa los datos crudos de coinlist desde Bronze y los guarda en Silver.
 
@@ -23,10 +111,16 @@ def process_and_save_coinlist(bronze_path, silver_path, day=None, hour=None):
         silver_path (str): Ruta de destino para la capa Silver.
         day (int, optional): Día de ejecución.
         hour (int, optional): Hora de ejecución.
+        history_path (str, optional): Tabla de historia SCD2 de altas, bajas y renombres.
+            Si se indica, el snapshot se compara contra Silver y solo se reescribe si cambió.
+        data (DataFrame, optional): Coin list recién guardada en Bronze; evita releer la tabla.
+
+    Returns:
+        int | None: Registros guardados en Silver (0 si la lista no cambió, None si no se guardó nada).
     """
     logger.info("🔧 Iniciando procesamiento (Limpieza) de datos crudos de coinlist desde Bronze a Silver...")
 
-    now = datetime.now()
+    now = datetime.now(timezone.utc)
     if day is None:
         day = now.day
     if hour is None:
@@ -34,15 +128,19 @@ def process_and_save_coinlist(bronze_path, silver_path, day=None, hour=None):
 
     date_str = now.strftime("%Y-%m-%d")
 
-    try:
-        dt = DeltaTable(bronze_path)
-        df = dt.to_pandas()
-    except Exception as e:
-        logger.error(f"❌ ERROR al leer datos desde bronze (coinlist): {e}")
-        return
+    if data is not None:
+        # Lote recién escrito en Bronze, recibido en memoria
+        df = data.copy()
+    else:
+        try:
+            dt = DeltaTable(bronze_path)
+            df = dt.to_pandas()
+        except Exception as e:
+            logger.error(f"❌ ERROR al leer datos desde bronze (coinlist): {e}")
+            return
 
-    # Filtrar por fecha y hora actuales
-    df = df[(df["date"] == date_str) & (df["hour"] == now.strftime("%H"))]
+        # Filtrar por fecha y hora actuales
+        df = df[(df["date"] == date_str) & (df["hour"] == now.strftime("%H"))]
 
     if df.empty:
         logger.warning("⚠️ No hay registros nuevos para procesar (coinlist).")
@@ -58,6 +156,19 @@ def process_and_save_coinlist(bronze_path, silver_path, day=None, hour=None):
             logger.error(f"❌ ERROR: Columna de partición '{col}' está ausente o contiene nulos.")
             return
 
+    if history_path:
+        current = read_coin_snapshot(silver_path)
+        changes = diff_coin_lists(current, df) if current is not None else {
+            "added": df[COIN_KEY_COLS], "removed": df.iloc[0:0][COIN_KEY_COLS], "renamed": df.iloc[0:0][COIN_KEY_COLS]
+        }
+        counts = {kind: len(rows) for kind, rows in changes.items()}
+        if current is not None and not any(counts.values()):
+            logger.info("⏩ La lista de monedas no cambió respecto de Silver. No se reescribe.")
+            return 0
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        inserted = update_coin_history(history_path, changes, timestamp, initial=df)
+        logger.info(f"🗂️ Cambios en la lista de monedas: {counts}. Historia: {inserted} filas nuevas.")
+
     logger.info("✅ Transformaciones de coinlist completadas. Guardando en Silver (overwrite)...")
 
     save_data_as_delta(
@@ -67,3 +178,4 @@ def process_and_save_coinlist(bronze_path, silver_path, day=None, hour=None):
         partition_cols=["date", "hour"]
     )
     logger.info(f"✅ Coinlist guardado en Silver: {silver_path}")
+    return len(df)
@@ -1,124 +1,326 @@
 # process_markets.py
+import io
+import os
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from deltalake import DeltaTable
-from utils.data_validation import apply_column_types, validate_required_columns
-from delta_utils import save_data_as_delta, upsert_data_as_delta, verify_delta_write
-from schema import IMPUTATION_MAP,REQUIRED_COLUMNS
-from datetime import datetime
+import pyarrow as pa
+from utils.data_validation import apply_column_types
+from delta_utils import (
+    CDF_CONFIG,
+    enable_change_data_feed,
+    get_table,
+    is_change_data_feed_enabled,
+    read_delta_changes,
+    read_delta_partitions,
+    upsert_data_as_delta,
+    verify_delta_write,
+)
+from schema import IMPUTATION_MAP, KEY_COLUMNS, REQUIRED_COLUMNS
+from schema_registry import conform_to_table
+from change_index import get_change_index, suppress_unchanged
+from layout import DEFAULT_LAYOUT, add_layout_columns, partition_cols as layout_partition_cols
+from datetime import datetime, timezone
 import logging
 
-# Configuración de logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 logger = logging.getLogger(__name__)
 
-def process_and_save_markets(bronze_path, silver_path, day=None, hour=None):
+# Columnas de moneda, fecha y hora agregadas en la extracción (se guardan como string)
+PARTITION_COLS = ["coin", "date", "day", "hour"]
+
+# Con varios workers, los lotes más chicos que esto se transforman igual en el proceso actual
+PARALLEL_MIN_ROWS = 50_000
+
+# === WATERMARK DE VERSIÓN DE BRONZE ===
+def read_bronze_watermark(watermark_file):
+    """
+    Retorna la última versión de Bronze ya consumida por Silver (None si no hay registro).
+    """
+    if not watermark_file or not os.path.exists(watermark_file):
+        return None
+    with open(watermark_file, "r") as f:
+        return json.load(f)["bronze_version"]
+
+def save_bronze_watermark(watermark_file, version):
+    with open(watermark_file, "w") as f:
+        json.dump({"bronze_version": version}, f)
+
+def read_bronze_increment(bronze_path, watermark_file, partitions, columns=None):
+    """
+    Lee desde Bronze solo las filas agregadas o actualizadas desde la última versión consumida.
+
+    Usa el change data feed de Delta entre la versión del watermark y la actual, por lo que
+    el costo es proporcional a los datos nuevos e incluye escrituras tardías o backfills en
+    cualquier partición. Si todavía no hay watermark o el feed no está habilitado, lo habilita
+    y procesa solo las `partitions` indicadas (arranque).
+
+    Retorna:
+        (DataFrame | None, int): filas a procesar (None si no hay versiones nuevas) y
+        versión de Bronze hasta la que se leyó.
+    """
+    last_version = read_bronze_watermark(watermark_file)
+    dt = get_table(bronze_path)
+    current_version = dt.version()
+
+    if last_version is None or not is_change_data_feed_enabled(dt):
+        logger.info("🔖 Sin watermark de Bronze: se habilita el change data feed y se procesa la hora actual.")
+        version = enable_change_data_feed(bronze_path)
+        return read_delta_partitions(bronze_path, partitions=partitions, columns=columns), version
+
+    if last_version >= current_version:
+        return None, current_version
+
+    logger.info(f"🔖 Leyendo cambios de Bronze entre las versiones {last_version + 1} y {current_version}")
+    return read_delta_changes(bronze_path, last_version + 1, current_version, columns=columns), current_version
+
+def log_frame_diagnostics(df, title):
+    """
+    Loguea tipos y uso de memoria (deep) del DataFrame. Solo con nivel DEBUG, porque
+    el cálculo deep recorre todas las columnas object.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    buffer = io.StringIO()
+    df.info(buf=buffer, memory_usage="deep")
+    logger.debug(f"\n📊 {title}:")
+    logger.debug(f"\nTipos de datos:\n{df.dtypes}")
+    logger.debug(f"\n{buffer.getvalue()}")
+    logger.debug(f"\nTamaño por columna (bytes):\n{df.memory_usage(deep=True)}")
+
+# === TRANSFORMACIÓN ===
+def transform_markets(df, layout=DEFAULT_LAYOUT):
+    """
+    Transformaciones de Bronze a Silver: duplicados por llave, tipos e imputación de nulos,
+    columna derivada y columnas de partición como string.
+    """
+    # 2. Eliminar duplicados donde la llave primaria es id y last_updated (se conserva la última versión)
+    df = df.drop_duplicates(subset=["id", "last_updated"], keep="last")
+
+    # 3 y 4. Conversión de tipos y reemplazo de nulos en una sola pasada
+    df = apply_column_types(df, imputation_map=IMPUTATION_MAP)
+
+    # Nueva columna para análisis
+    df["is_high_value"] = df["current_price"] > 50000
+
+    # Conversión a string para particiones
+    for col in PARTITION_COLS:
+        df[col] = df[col].astype(str)
+    return add_layout_columns(df, layout)
+
+def _transform_shard(table, layout):
+    """
+    Transforma un shard dentro de un proceso del pool. Entra y sale un pyarrow.Table, que se
+    serializa como buffers IPC (sin pickle fila por fila).
+    """
+    result = pa.Table.from_pandas(transform_markets(table.to_pandas(), layout), preserve_index=False)
+    # Cada shard tiene sus propios diccionarios (category): se decodifican para unir los shards
+    for i, field in enumerate(result.schema):
+        if pa.types.is_dictionary(field.type):
+            result = result.set_column(i, field.name, result.column(i).cast(field.type.value_type))
+    return result
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_process_pool(workers):
+    """
+    Pool de procesos reutilizable entre corridas (en modo serve no se paga el arranque de los
+    workers en cada tick). Usa "spawn": el pipeline corre en threads (dag.py) y hacer fork de
+    un proceso con threads puede dejar locks tomados en el hijo.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+def transform_markets_parallel(df, layout=DEFAULT_LAYOUT, workers=2):
+    """
+    Transforma el lote en `workers` procesos, repartiendo las monedas en shards disjuntos
+    (la llave id, last_updated nunca cruza shards, así que la deduplicación es la misma).
+
+    Retorna:
+        pyarrow.Table: filas transformadas de todos los shards.
+    """
+    shard_of = pd.factorize(df["id"])[0] % workers
+    shards = [pa.Table.from_pandas(df[shard_of == i], preserve_index=False) for i in range(workers)]
+    shards = [shard for shard in shards if shard.num_rows]
+    tables = list(get_process_pool(workers).map(_transform_shard, shards, [layout] * len(shards)))
+    return pa.concat_tables(tables, promote_options="permissive")
+
+def process_and_save_markets(bronze_path, silver_path, day=None, hour=None, date_str=None, coins=None, columns=None, watermark_file=None, layout=DEFAULT_LAYOUT, verify=True, batch=None, batch_version=None, return_frame=False, change_index_file=None, quarantine_path=None, workers=1):
     """
     Procesa datos crudos desde Bronze y los guarda en Silver.
 
+    Si se indica `watermark_file`, el procesamiento es incremental por versión de Bronze:
+    se leen solo los cambios desde la última versión consumida (sin importar fecha/hora)
+    y el watermark se avanza recién cuando Silver quedó escrito.
+
     Args:
         bronze_path (str): Ruta al Delta Lake (bronze).
         silver_path (str): Ruta al Delta Lake (silver).
         day (int, optional): Día a procesar (por defecto, día actual).
         hour (int, optional): Hora a procesar (por defecto, hora actual).
+        date_str (str, optional): Fecha a procesar YYYY-MM-DD (por defecto, fecha actual).
+        coins (list, optional): Monedas a procesar (por defecto, todas las de la partición).
+        columns (list, optional): Columnas a leer desde Bronze (por defecto, todas).
+        watermark_file (str, optional): Archivo JSON con la última versión de Bronze consumida.
+        layout (str, optional): Layout de particionamiento de Silver (ver layout.LAYOUTS).
+        verify (bool, optional): Si True, verifica la escritura en Silver al finalizar.
+        batch (DataFrame | pyarrow.Table, optional): Lote recién escrito en Bronze. Si es el
+            único cambio pendiente (watermark == batch_version - 1) se procesa en memoria.
+        batch_version (int, optional): Versión de Bronze que produjo `batch`.
+        return_frame (bool, optional): Si True, retorna también el DataFrame guardado.
+        change_index_file (str, optional): Índice de filas ya escritas en Silver (ver
+            change_index.py); las filas idénticas a la última escrita por id no se reescriben.
+        quarantine_path (str, optional): Tabla Delta donde se guardan las filas que no se pueden
+            conformar al esquema de Silver (sin ella, esas filas solo se descartan con un aviso).
+        workers (int, optional): Procesos para transformar lotes de al menos PARALLEL_MIN_ROWS
+            filas (1 = en el proceso actual). El resultado se guarda en un único MERGE.
+
+    Returns:
+        int | None: Registros guardados en Silver (0 si no había datos nuevos, None si hubo error).
+        Con `return_frame`, una tupla (registros, DataFrame | None).
     """
 
+    count, df = _process_markets(bronze_path, silver_path, day, hour, date_str, coins, columns, watermark_file, layout, verify, batch, batch_version, change_index_file, quarantine_path, workers)
+    return (count, df) if return_frame else count
+
+def _process_markets(bronze_path, silver_path, day, hour, date_str, coins, columns, watermark_file, layout, verify, batch, batch_version, change_index_file=None, quarantine_path=None, workers=1):
+    """Implementación de process_and_save_markets; retorna (registros, DataFrame | None)."""
     logger.info("🔧 Iniciando procesamiento de datos crudos desde Bronze...")
 
     # Obtener fecha y hora actuales para filtrar los datos recién ingresados
-    now = datetime.now()
-    date_str = now.strftime("%Y-%m-%d")
-    hour_int = int(now.strftime("%H"))
+    now = datetime.now(timezone.utc)
     if day is None:
         day = now.day
     if hour is None:
         hour = now.hour
-    date_str = now.strftime("%Y-%m-%d")
+    if date_str is None:
+        date_str = now.strftime("%Y-%m-%d")
+
+    # 1. Leer solo la partición correspondiente a la hora XX (filtro empujado al scan de Delta)
+    partitions = [
+        ("date", "=", date_str),
+        ("day", "=", f"{int(day):02d}"),
+        ("hour", "=", f"{int(hour):02d}"),
+    ]
+    if coins:
+        partitions.append(("coin", "in", list(coins)))
+    if columns is not None:
+        columns = list(columns) + [col for col in PARTITION_COLS if col not in columns]
 
-    # 1. Leer todos los datos desde Delta Lake (filtro posterior en pandas)
+    bronze_version = None
     try:
-        dt = DeltaTable(bronze_path)
-        df = dt.to_pandas()
+        if watermark_file and batch is not None and read_bronze_watermark(watermark_file) == batch_version - 1:
+            # El lote recién escrito es exactamente el cambio pendiente: se usa en memoria
+            logger.info(f"🔗 Procesando el lote en memoria (Bronze versión {batch_version}), sin releer Bronze.")
+            df = batch.to_pandas() if isinstance(batch, pa.Table) else batch.copy()
+            if columns is not None:
+                df = df[[col for col in columns if col in df.columns]]
+            if coins:
+                df = df[df["coin"].isin(list(coins))]
+            bronze_version = batch_version
+        elif watermark_file:
+            df, bronze_version = read_bronze_increment(bronze_path, watermark_file, partitions, columns=columns)
+            if df is not None and coins:
+                df = df[df["coin"].isin(list(coins))]
+        else:
+            df = read_delta_partitions(bronze_path, partitions=partitions, columns=columns)
     except Exception as e:
         logger.error(f"❌ ERROR al leer datos desde bronze: {e}")
-        return
+        return None, None
+
+    if df is None:
+        logger.warning("⚠️ No hay versiones nuevas en Bronze desde la última ejecución. Finalizando...")
+        save_bronze_watermark(watermark_file, bronze_version)
+        return 0, None
 
     # Convertir day y hour a int8 explícitamente
     df["day"] = df["day"].astype("int8")
     df["hour"] = df["hour"].astype("int8")
 
-    # Filtramos para la fecha y hora actuales, esto es para la ejecución incremental correspondiente a la hora XX
-    df = df[(df["date"] == date_str) & (df["hour"] == hour_int)]
-
-    # Validar que el DataFrame contiene las columnas MANDATORIAS, en caso de que la API cambie
-    if not validate_required_columns(df, REQUIRED_COLUMNS):
-        return
+    # Validar las columnas MANDATORIAS, en caso de que la API cambie: sin llave (id, last_updated)
+    # el lote va a cuarentena; las demás requeridas se completan como nulas
+    missing = REQUIRED_COLUMNS - set(df.columns)
+    if missing & KEY_COLUMNS:
+        logger.error(f"❌ ERROR: Faltan columnas llave {sorted(missing & KEY_COLUMNS)}: el lote va a cuarentena.")
+        conform_to_table(df, silver_path, quarantine_path, "Silver")
+        if bronze_version is not None:
+            save_bronze_watermark(watermark_file, bronze_version)
+        return 0, None
+    if missing:
+        logger.warning(f"⚠️ Faltan columnas requeridas {sorted(missing)}: se completan como nulas.")
+        df = df.assign(**{col: df["id"] if col == "coin" else None for col in missing})
 
     logger.info(f"📥 Registros crudos extraídos de bronze: {len(df)}")
 
     if df.empty:
         logger.warning("⚠️ No hay registros nuevos para procesar en esta ejecución. Finalizando...")
-        return
-
-    logger.info("\n📊 ANTES DE TRANSFORMAR:")
-    logger.info(f"\nTipos de datos:\n{df.dtypes}")
-    df.info(memory_usage="deep")
-    logger.info(f"\nTamaño por columna (bytes):\n{df.memory_usage(deep=True)}")
+        if bronze_version is not None:
+            save_bronze_watermark(watermark_file, bronze_version)
+        return 0, None
 
-    # 2. Eliminar duplicados donde la llave primaria es id y last_updated
-    df = df.drop_duplicates(subset=["id", "last_updated"])
+    log_frame_diagnostics(df, "ANTES DE TRANSFORMAR")
 
-    # 3. Reemplazo de nulos
-    df = df.fillna(IMPUTATION_MAP)
-
-    # 4. Conversión de tipos
-    df = apply_column_types(df)
-
-    # Calcular la media de cotización por moneda y agregarla al DataFrame
-    avg_prices = df.groupby("coin")["current_price"].mean().reset_index()
-    avg_prices.rename(columns={"current_price": "avg_price"}, inplace=True)
-    df = df.merge(avg_prices, on="coin", how="left")
-
-    logger.info("📈 Media de cotización por moneda:")
-    logger.info(f"\n{avg_prices}")
-
-    # Validar que todas las columnas necesarias para particionar existen y no tienen nulos
-    
-    
-    # Nueva columna para análisis
-    df["is_high_value"] = df["current_price"] > 50000
+    # 2 a 5. Duplicados, tipos, imputación y particiones (en varios procesos si el lote es grande)
+    if workers > 1 and len(df) >= PARALLEL_MIN_ROWS:
+        logger.info(f"🧵 Transformando {len(df)} registros en {workers} procesos (shards por moneda).")
+        df = transform_markets_parallel(df, layout, workers)
+    else:
+        df = transform_markets(df, layout)
+        log_frame_diagnostics(df, "DESPUÉS DE TRANSFORMAR")
 
     logger.info("\n✅ TRANSFORMACIONES APLICADAS.")
-
-    logger.info("\n📊 DESPUÉS DE TRANSFORMAR:")
-    logger.info(f"\nTipos de datos:\n{df.dtypes}")
-    df.info(memory_usage="deep")
-    logger.info(f"\nTamaño por columna (bytes):\n{df.memory_usage(deep=True)}")
     logger.info(f"📦 Registros a guardar en Silver: {len(df)}")
 
     # 6. Guardar en Silver con upsert si ya existe la tabla, o save si es la primera vez
-    partition_cols = ["coin", "date", "day", "hour"]
+    partition_cols = layout_partition_cols(layout)
     predicate = "target.id = source.id AND target.last_updated = source.last_updated"
 
-    try:
-        # Conversión a string para particiones
-        for col in partition_cols:
-            df[col] = df[col].astype(str)
+    # Esquema de la tabla: columnas nuevas, tipos y filas inválidas a cuarentena (ver schema_registry.py)
+    table, _ = conform_to_table(df, silver_path, quarantine_path, "Silver")
 
+    pending = None
+    if change_index_file:
+        table, pending, _ = suppress_unchanged(table, change_index_file, "Silver")
+    if table.num_rows == 0:
+        logger.info("♻️ No quedan registros para escribir: se omite el MERGE en Silver.")
+        if bronze_version is not None:
+            save_bronze_watermark(watermark_file, bronze_version)
+        return 0, None
+
+    try:
         upsert_data_as_delta(
-            df,
+            table,
             data_path=silver_path,
             predicate=predicate,
-            partition_cols=partition_cols
+            partition_cols=partition_cols,
+            configuration=CDF_CONFIG,
+            merge_schema=True,
         )
         logger.info(f"✅ Upsert realizado con éxito en Silver: {silver_path}")
-    except Exception:
-        save_data_as_delta(
-            df,
-            path=silver_path,
-            mode="overwrite",
-            partition_cols=partition_cols
-        )
-        logger.info(f"✅ Tabla no encontrada. Datos guardados por primera vez en Silver: {silver_path}")
+    except Exception as e:
+        # Nunca se reescribe la tabla: el watermark no avanza y el lote se reintenta
+        logger.error(f"❌ Falló el upsert en Silver (la tabla no se modificó): {e}")
+        raise
+
+    if pending is not None:
+        get_change_index(change_index_file).commit(pending)
+    df = table.to_pandas()
+
+    if bronze_version is not None:
+        save_bronze_watermark(watermark_file, bronze_version)
+        logger.info(f"🔖 Watermark de Bronze actualizado a la versión {bronze_version}")
 
     # Verificación post guardado
-    verify_delta_write(silver_path, date_str, hour)
+    if verify:
+        verify_delta_write(silver_path, len(df), expected_partitions=df[partition_cols].drop_duplicates().to_dict("records"))
+
+    return len(df), df
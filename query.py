@@ -0,0 +1,343 @@
+# query.py
+
+"""
+API de lectura sobre la tabla Silver de mercados.
+
+    from query import get_prices, latest_snapshot
+    df = get_prices(["bitcoin", "ethereum"], start="2025-06-18", end="2025-06-19")
+    last = latest_snapshot(["bitcoin"])
+
+Cada consulta se resuelve contra el log de Delta: se eligen solo las particiones cuyos valores
+(coin / coin_bucket) y estadísticas de archivos (min/max de id y last_updated) pueden contener
+filas pedidas, y se leen solo las columnas necesarias. Las particiones decodificadas (Arrow) se
+guardan en un LRU acotado en bytes. La clave incluye la lista de archivos de la partición en la
+versión actual de la tabla: los archivos Delta son inmutables, así que una escritura que toca la
+partición cambia la clave (la entrada vieja deja de usarse y sale por LRU) y las particiones no
+tocadas siguen sirviéndose desde memoria.
+
+También funciona como CLI (reemplaza a parquetview.py):
+    python query.py prices --coins bitcoin ethereum --start 2025-06-18 --end 2025-06-19
+    python query.py latest --coins bitcoin
+    python query.py show --where coin=bitcoin date=2025-06-18 --head 5
+"""
+
+import argparse
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from delta_utils import get_table, read_delta_partitions
+from layout import coin_bucket
+
+SILVER_PATH = "datalake/silver/coingecko/markets"
+PRICE_COLUMNS = ["id", "last_updated", "current_price", "market_cap", "total_volume"]
+KEY_COLUMNS = ["id", "last_updated"]
+CACHE_MAX_BYTES = 256 * 2**20  # Memoria máxima de particiones decodificadas
+LATEST_LOOKBACK = timedelta(hours=48)  # latest_snapshot sin monedas: ventana desde el último dato
+
+
+class PartitionCache:
+    """LRU de pyarrow.Table acotado por la suma de Table.nbytes."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get_or_load(self, key, load):
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+        table = load()
+        with self._lock:
+            if key not in self._entries and table.nbytes <= self.max_bytes:
+                self._entries[key] = table
+                self._bytes += table.nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+                    self.evictions += 1
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+_cache = PartitionCache()
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def configure_cache(max_bytes):
+    """Reemplaza el cache de particiones (ej: configure_cache(64 * 2**20))."""
+    global _cache
+    _cache = PartitionCache(max_bytes)
+    return _cache
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def clear_cache():
+    """Vacía el cache de particiones y el índice de archivos por versión."""
+    _cache.clear()
+    with _snapshots_lock:
+        _snapshots.clear()
+
+
+class TableSnapshot:
+    """
+    Archivos de una versión de la tabla agrupados por partición, con las estadísticas
+    (min/max de id y last_updated) de cada grupo y los fragmentos Parquet para leerlos.
+    """
+
+    def __init__(self, dt):
+        self.version = dt.version()
+        self.partition_cols = list(dt.metadata().partition_columns)
+        dataset = dt.to_pyarrow_dataset()
+        self.schema = dataset.schema
+        self.format = dataset.format
+        self.filesystem = dataset.filesystem
+        self.fragments = {fragment.path: fragment for fragment in dataset.get_fragments()}
+
+        actions = pa.table(dt.get_add_actions(flatten=True)).to_pylist()
+        groups = {}
+        for action in actions:
+            values = tuple(action.get(f"partition.{col}") for col in self.partition_cols)
+            group = groups.setdefault(values, {"files": [], "stats": []})
+            group["files"].append(action["path"])
+            group["stats"].append(action)
+        self.partitions = []
+        for values, group in groups.items():
+            files = sorted(group["files"])
+            self.partitions.append({
+                "values": dict(zip(self.partition_cols, values)),
+                "files": files,
+                "fingerprint": hashlib.sha1("\n".join(files).encode()).hexdigest(),
+                "id_min": _stat(group["stats"], "min.id", min),
+                "id_max": _stat(group["stats"], "max.id", max),
+                "ts_min": _stat(group["stats"], "min.last_updated", min),
+                "ts_max": _stat(group["stats"], "max.last_updated", max),
+            })
+
+    def read(self, partition, columns):
+        """Lee los archivos de una partición (con sus columnas de partición) como un Table."""
+        fragments = [self.fragments[path] for path in partition["files"] if path in self.fragments]
+        dataset = ds.FileSystemDataset(fragments, schema=self.schema, format=self.format, filesystem=self.filesystem)
+        table = dataset.to_table(columns=[col for col in columns if col in self.schema.names])
+        # Los archivos escritos por MERGE guardan strings como string_view: se unifican a string
+        for i, field in enumerate(table.schema):
+            if pa.types.is_string_view(field.type):
+                table = table.set_column(i, field.name, pc.cast(table.column(i), pa.string()))
+        return table
+
+
+def _stat(actions, column, reduce):
+    """Reduce una estadística de archivos; None si algún archivo no la tiene (sin poda)."""
+    values = [action.get(column) for action in actions]
+    if not values or any(value is None for value in values):
+        return None
+    return reduce(values)
+
+
+def snapshot(path=SILVER_PATH):
+    """TableSnapshot de la versión actual de la tabla (se reconstruye solo si cambió la versión)."""
+    dt = get_table(path)
+    with _snapshots_lock:
+        current = _snapshots.get(path)
+        if current is not None and current.version == dt.version():
+            return current
+    current = TableSnapshot(dt)
+    with _snapshots_lock:
+        _snapshots[path] = current
+    return current
+
+
+def _to_utc(value):
+    """str | datetime | None → datetime con zona UTC (los valores sin zona se toman como UTC)."""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.to_pydatetime()
+
+
+def _in_range(value, low, high):
+    """low <= value <= high, tolerando estadísticas de strings truncadas (prefijo)."""
+    return low <= value and (value <= high or value.startswith(high))
+
+
+def _may_contain(partition, coins, start, end):
+    """Poda por valores de partición y estadísticas de archivos."""
+    values = partition["values"]
+    if coins is not None:
+        if "coin" in values and values["coin"] not in coins:
+            return False
+        if "coin_bucket" in values and values["coin_bucket"] not in {coin_bucket(c) for c in coins}:
+            return False
+        if partition["id_min"] is not None and not any(_in_range(c, partition["id_min"], partition["id_max"]) for c in coins):
+            return False
+    if start is not None and partition["ts_max"] is not None and partition["ts_max"] < start:
+        return False
+    if end is not None and partition["ts_min"] is not None and partition["ts_min"] >= end:
+        return False
+    return True
+
+
+def _load(path, snap, partition, columns):
+    key = (path, tuple(sorted(partition["values"].items())), partition["fingerprint"], tuple(columns))
+    return _cache.get_or_load(key, lambda: snap.read(partition, columns))
+
+
+def _concat(tables, snap, columns):
+    if not tables:
+        return pa.schema([snap.schema.field(col) for col in columns if col in snap.schema.names]).empty_table()
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _filter(table, coins, start, end):
+    mask = None
+    conditions = []
+    if coins is not None:
+        conditions.append(pc.is_in(table.column("id"), value_set=pa.array(sorted(coins), pa.string())))
+    if start is not None:
+        conditions.append(pc.greater_equal(table.column("last_updated"), pa.scalar(start, table.schema.field("last_updated").type)))
+    if end is not None:
+        conditions.append(pc.less(table.column("last_updated"), pa.scalar(end, table.schema.field("last_updated").type)))
+    for condition in conditions:
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return table if mask is None else table.filter(mask)
+
+
+def get_prices(coins=None, start=None, end=None, columns=None, path=SILVER_PATH):
+    """
+    Serie de snapshots de mercado de `coins` con last_updated en [start, end).
+
+    Args:
+        coins (list, optional): ids de monedas (por defecto, todas).
+        start, end (str | datetime, optional): rango sobre last_updated (sin zona = UTC).
+        columns (list, optional): columnas a devolver (por defecto, PRICE_COLUMNS).
+        path (str): tabla Delta a consultar.
+
+    Retorna:
+        DataFrame ordenado por id y last_updated.
+    """
+    columns = list(columns or PRICE_COLUMNS)
+    read_columns = list(dict.fromkeys(KEY_COLUMNS + columns))
+    coins = set(coins) if coins else None
+    start, end = _to_utc(start), _to_utc(end)
+
+    snap = snapshot(path)
+    tables = [_load(path, snap, p, read_columns) for p in snap.partitions if _may_contain(p, coins, start, end)]
+    table = _filter(_concat(tables, snap, read_columns), coins, start, end)
+    table = table.sort_by([("id", "ascending"), ("last_updated", "ascending")])
+    return table.select([col for col in columns if col in table.column_names]).to_pandas()
+
+
+def latest_snapshot(coins=None, columns=None, path=SILVER_PATH, lookback=LATEST_LOOKBACK):
+    """
+    Último snapshot (mayor last_updated) de cada moneda.
+
+    Con `coins`, las particiones se leen de la más reciente a la más antigua y la búsqueda se
+    detiene cuando ninguna partición restante puede tener un dato más nuevo para esas monedas.
+    Sin `coins`, se consideran las monedas con datos en `lookback` desde el último dato de la tabla.
+
+    Retorna:
+        DataFrame con una fila por moneda, ordenado por id.
+    """
+    columns = list(columns or PRICE_COLUMNS)
+    read_columns = list(dict.fromkeys(KEY_COLUMNS + columns))
+    coins = set(coins) if coins else None
+
+    snap = snapshot(path)
+    candidates = [p for p in snap.partitions if _may_contain(p, coins, None, None)]
+    floor = datetime.min.replace(tzinfo=timezone.utc)
+    candidates.sort(key=lambda p: p["ts_max"] or datetime.max.replace(tzinfo=timezone.utc), reverse=True)
+    if coins is None and candidates and candidates[0]["ts_max"] is not None:
+        since = candidates[0]["ts_max"] - lookback
+        candidates = [p for p in candidates if p["ts_max"] is None or p["ts_max"] >= since]
+
+    tables, newest = [], {}
+    for partition in candidates:
+        if coins is not None and len(newest) == len(coins) and partition["ts_max"] is not None \
+                and min(newest.values()) >= partition["ts_max"]:
+            break
+        table = _filter(_load(path, snap, partition, read_columns), coins, None, None)
+        if table.num_rows:
+            tables.append(table)
+            grouped = table.group_by("id").aggregate([("last_updated", "max")])
+            for coin, ts in zip(grouped.column("id").to_pylist(), grouped.column("last_updated_max").to_pylist()):
+                newest[coin] = max(newest.get(coin, floor), ts)
+
+    table = _concat(tables, snap, read_columns)
+    table = table.sort_by([("id", "ascending"), ("last_updated", "descending")])
+    df = table.select([col for col in read_columns if col in table.column_names]).to_pandas()
+    df = df.drop_duplicates("id", keep="first").reset_index(drop=True)
+    return df[[col for col in columns if col in df.columns]]
+
+
+def _parse_where(items):
+    filters = []
+    for item in items or []:
+        col, _, value = item.partition("=")
+        filters.append((col, "=", value))
+    return filters
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre la tabla Silver de mercados")
+    parser.add_argument("--path", default=SILVER_PATH, help="Tabla Delta a consultar")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prices = subparsers.add_parser("prices", help="Serie de precios por moneda y rango de last_updated")
+    prices.add_argument("--coins", nargs="+", help="Ids de monedas (por defecto, todas)")
+    prices.add_argument("--start", help="Inicio YYYY-MM-DD[THH:MM] (UTC)")
+    prices.add_argument("--end", help="Fin excluido YYYY-MM-DD[THH:MM] (UTC)")
+    prices.add_argument("--columns", nargs="+", help="Columnas a mostrar")
+
+    latest = subparsers.add_parser("latest", help="Último snapshot de cada moneda")
+    latest.add_argument("--coins", nargs="+", help="Ids de monedas (por defecto, las de las últimas 48 h)")
+    latest.add_argument("--columns", nargs="+", help="Columnas a mostrar")
+
+    show = subparsers.add_parser("show", help="Columnas y primeras filas de una partición")
+    show.add_argument("--where", nargs="+", metavar="COL=VALOR", help="Filtros de igualdad, ej: coin=bitcoin date=2025-06-18")
+    show.add_argument("--columns", nargs="+", help="Columnas a mostrar")
+    show.add_argument("--head", type=int, default=5, help="Filas a mostrar")
+
+    args = parser.parse_args(argv)
+    pd.set_option("display.width", 200)
+    if args.command == "prices":
+        df = get_prices(args.coins, args.start, args.end, args.columns, path=args.path)
+    elif args.command == "latest":
+        df = latest_snapshot(args.coins, args.columns, path=args.path)
+    else:
+        df = read_delta_partitions(args.path, partitions=_parse_where(args.where), columns=args.columns)
+        print(f"🧾 Columnas disponibles: {df.columns.tolist()}")
+        print(f"🔍 Filas encontradas: {len(df)}")
+        df = df.head(args.head)
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    cli()
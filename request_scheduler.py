@@ -0,0 +1,198 @@
+# request_scheduler.py
+
+"""
+Planificador de requests HTTP con límite de tasa compartido.
+
+Todos los requests a la API pasan por un único RequestScheduler que:
+- Respeta un presupuesto de llamadas por minuto con un token bucket.
+- Reintenta 429/5xx y errores de conexión con backoff exponencial con jitter.
+- Honra el header Retry-After pausando el bucket para todos los threads.
+- Lleva contadores de requests, reintentos y tiempo de espera por throttling.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: `rate` tokens por segundo con capacidad `capacity`.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        """
+        Bloquea el bucket durante `seconds` (ej: por un Retry-After). El bucket queda vacío y
+        se vuelve a llenar recién desde el final de la pausa: al reanudar no sale una ráfaga.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+    def acquire(self):
+        """
+        Consume un token, esperando lo necesario. Retorna los segundos esperados.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+def parse_retry_after(value):
+    """
+    Interpreta el header Retry-After (segundos o fecha HTTP). Retorna segundos o None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RequestScheduler:
+    """
+    Ejecuta requests GET respetando el presupuesto de llamadas por minuto.
+
+    Args:
+        calls_per_minute (int): presupuesto de llamadas por minuto.
+        burst (int): cantidad de llamadas que pueden salir juntas.
+        max_retries (int): reintentos ante 429/5xx o errores de conexión.
+        backoff_base (float): espera base (segundos) del backoff exponencial.
+        backoff_max (float): espera máxima entre reintentos.
+        timeout (float): timeout por request (segundos).
+    """
+
+    def __init__(self, calls_per_minute=30, burst=5, max_retries=5, backoff_base=1.0,
+                 backoff_max=60.0, timeout=30.0, sleep=time.sleep):
+        self.calls_per_minute = calls_per_minute
+        self.bucket = TokenBucket(calls_per_minute / 60.0, max(1, burst), sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reinicia los contadores (ej: al comenzar una ejecución)."""
+        with self._lock:
+            self.started = time.monotonic()
+            self.counters = {
+                "requests": 0,
+                "retries": 0,
+                "throttled": 0,
+                "errors": 0,
+                "throttled_wait_s": 0.0,
+                "backoff_wait_s": 0.0,
+            }
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.counters[key] += value
+
+    def backoff(self, attempt):
+        """Espera del reintento `attempt` (0, 1, ...) con jitter."""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(cap / 2, cap)
+
+    def get(self, session, url, params=None, headers=None):
+        """
+        Realiza un GET a través del token bucket con reintentos.
+
+        Retorna:
+        - requests.Response con status exitoso.
+
+        Lanza:
+        - requests.exceptions.RequestException si se agotan los reintentos.
+        """
+        attempt = 0
+        while True:
+            self._count("throttled_wait_s", self.bucket.acquire())
+            self._count("requests")
+            try:
+                response = session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._count("errors")
+                if attempt >= self.max_retries:
+                    raise
+                wait = self.backoff(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+                if response.status_code == 429:
+                    self._count("throttled")
+                else:
+                    self._count("errors")
+                if attempt >= self.max_retries:
+                    response.raise_for_status()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                wait = retry_after if retry_after is not None else self.backoff(attempt)
+                if response.status_code == 429:
+                    # El servidor nos frenó: pausamos el bucket para todos los threads
+                    self.bucket.pause(wait)
+                    wait = 0.0
+            self._count("retries")
+            self._count("backoff_wait_s", wait)
+            if wait:
+                self.sleep(wait)
+            attempt += 1
+
+    def stats(self):
+        """
+        Retorna los contadores y el uso del presupuesto desde el último reset.
+
+        `quota_usage` es la fracción de las llamadas permitidas en el período
+        que efectivamente se usaron (1.0 = presupuesto completo). Los tiempos de
+        espera se suman entre threads, por lo que pueden superar `elapsed_s`.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            elapsed = time.monotonic() - self.started
+        allowed = self.bucket.capacity + elapsed * self.calls_per_minute / 60.0
+        stats["elapsed_s"] = round(elapsed, 3)
+        stats["throttled_wait_s"] = round(stats["throttled_wait_s"], 3)
+        stats["backoff_wait_s"] = round(stats["backoff_wait_s"], 3)
+        stats["quota_usage"] = round(stats["requests"] / allowed, 3) if allowed else 0.0
+        return stats
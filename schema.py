@@ -52,6 +52,24 @@ TYPE_MAP = {
     "day": "string",
     "hour": "string"
 }
+# Campos del struct 'roi' (para el modo de ingesta Arrow)
+ROI_FIELDS = {
+    "times": "float64",
+    "currency": "string",
+    "percentage": "float64"
+}
+
+#  Columnas anidadas que se aplanan al guardar (roi → roi_times, roi_currency, roi_percentage)
+NESTED_COLUMNS = {
+    "roi": ROI_FIELDS
+}
+
+#  Llave de los MERGE: una fila sin estas columnas no se puede guardar
+KEY_COLUMNS = {
+    "id",
+    "last_updated"
+}
+
 # fill NaN
 IMPUTATION_MAP = {
     "market_cap": -1,
@@ -0,0 +1,317 @@
+# schema_registry.py
+
+"""
+Registro de esquemas de las tablas de mercados y manejo del drift de la API.
+
+Antes de cada MERGE el lote entrante se compara con el esquema de la tabla destino
+(y, para columnas que la tabla todavía no tiene, con el registro construido desde schema.py):
+
+- Columnas nuevas de la API: se agregan a la tabla como nullable (MERGE con merge_schema).
+- Columnas que la API dejó de enviar: se informan; el MERGE conserva los valores previos.
+- Tipos: cada columna se convierte al tipo de la tabla (o del registro). Las columnas "void"
+  (creadas con un primer lote todo nulo) se amplían al tipo del registro.
+- Columnas anidadas (roi) se aplanan en columnas simples (roi_times, roi_currency, ...).
+- Las filas que no se pueden convertir, o sin llave (id, last_updated), se mueven a una tabla
+  de cuarentena con el registro original y el motivo, en lugar de abortar la corrida.
+
+Nunca se reescribe la tabla destino: si el MERGE falla, el error se propaga.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from deltalake import DeltaTable, write_deltalake
+
+from delta_utils import get_table
+from schema import KEY_COLUMNS, NESTED_COLUMNS, TYPE_MAP
+from utils.arrow_utils import ARROW_TYPES
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_PARTITION = "date"
+
+
+@dataclass
+class SchemaDiff:
+    """Diferencias entre el lote entrante y la tabla destino."""
+    added: list = field(default_factory=list)       # Columnas nuevas (se agregan a la tabla)
+    missing: list = field(default_factory=list)     # Columnas de la tabla ausentes en el lote
+    retyped: list = field(default_factory=list)     # (columna, tipo entrante, tipo destino)
+    widened: list = field(default_factory=list)     # (columna, tipo nuevo): columnas void de la tabla
+
+    def __bool__(self):
+        return bool(self.added or self.missing or self.retyped or self.widened)
+
+
+def registry_schema(type_map=TYPE_MAP, nested=NESTED_COLUMNS):
+    """
+    Esquema Arrow esperado según schema.py, con las columnas anidadas ya aplanadas.
+    """
+    fields = []
+    for col, dtype in type_map.items():
+        if col in nested:
+            fields.extend(pa.field(f"{col}_{name}", ARROW_TYPES[sub]) for name, sub in nested[col].items())
+        else:
+            fields.append(pa.field(col, ARROW_TYPES[dtype]))
+    return pa.schema(fields)
+
+
+def table_schema(path):
+    """Esquema Arrow de la tabla Delta en `path` (None si todavía no existe)."""
+    if not DeltaTable.is_deltatable(path):
+        return None
+    return pa.schema(get_table(path).schema().to_arrow())
+
+
+def _pandas_to_arrow(df):
+    """
+    DataFrame → pyarrow.Table. Una columna object con tipos mezclados (ej: número y texto)
+    se pasa como texto; cast_column decide después qué valores son convertibles.
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    arrays = []
+    for col in df.columns:
+        try:
+            arrays.append(pa.array(df[col], from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if pd.isna(v) else str(v) for v in df[col]], pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+
+
+def flatten_nested(data, nested=NESTED_COLUMNS):
+    """
+    Reemplaza cada columna anidada (dict en pandas, struct en Arrow) por una columna por campo.
+    Si el lote ya trae la columna aplanada, solo se completan sus nulos.
+
+    Retorna:
+        pyarrow.Table
+    """
+    if not isinstance(data, pa.Table):
+        data = data.copy()
+        for col, fields in nested.items():
+            if col not in data.columns:
+                continue
+            values = data.pop(col).tolist()
+            for name in fields:
+                extracted = pd.Series([v.get(name) if isinstance(v, dict) else None for v in values], index=data.index)
+                flat = f"{col}_{name}"
+                data[flat] = data[flat].where(data[flat].notna(), extracted) if flat in data.columns else extracted
+        return _pandas_to_arrow(data)
+
+    for col, fields in nested.items():
+        if col not in data.column_names:
+            continue
+        values = data.column(col)
+        data = data.drop_columns([col])
+        for name, dtype in fields.items():
+            arrow_type = ARROW_TYPES[dtype]
+            if pa.types.is_struct(values.type) and values.type.get_field_index(name) >= 0:
+                extracted = pc.cast(pc.struct_field(values, name), arrow_type, safe=False)
+            else:
+                extracted = pa.nulls(len(data), arrow_type)
+            flat = f"{col}_{name}"
+            if flat in data.column_names:
+                current = data.column(flat)
+                merged = pc.coalesce(pc.cast(current, arrow_type, safe=False), extracted)
+                data = data.set_column(data.column_names.index(flat), flat, merged)
+            else:
+                data = data.append_column(flat, extracted)
+    return data
+
+
+def _logical_type(arrow_type):
+    """Tipo sin detalles de representación (diccionarios y strings/binarios "large")."""
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_large_string(arrow_type) or pa.types.is_string_view(arrow_type):
+        return pa.string()
+    if pa.types.is_large_binary(arrow_type):
+        return pa.binary()
+    return arrow_type
+
+
+def diff_schema(incoming, target, resolved=None):
+    """
+    Compara el esquema entrante con el de la tabla (target puede ser None si no existe).
+    `resolved` (columna → tipo destino) indica el tipo con que se amplían las columnas void.
+    """
+    diff = SchemaDiff()
+    if target is None:
+        return diff
+    target_names = set(target.names)
+    for fld in incoming:
+        if fld.name not in target_names:
+            diff.added.append(fld.name)
+            continue
+        target_type = target.field(fld.name).type
+        if pa.types.is_null(target_type) and not pa.types.is_null(fld.type):
+            diff.widened.append((fld.name, str((resolved or {}).get(fld.name, fld.type))))
+        elif _logical_type(fld.type) != target_type and not pa.types.is_null(fld.type):
+            diff.retyped.append((fld.name, str(fld.type), str(target_type)))
+    diff.missing = [name for name in target.names if name not in incoming.names]
+    return diff
+
+
+def resolve_type(name, incoming_type, target, registry):
+    """
+    Tipo destino de una columna: el de la tabla; si la tabla no la tiene (o es void), el del
+    registro; si tampoco está registrada, el entrante (string si llegó toda nula).
+    """
+    if target is not None and name in target.names and not pa.types.is_null(target.field(name).type):
+        return target.field(name).type
+    if name in registry.names:
+        return registry.field(name).type
+    if pa.types.is_null(incoming_type):
+        return pa.string()
+    if pa.types.is_dictionary(incoming_type):
+        return incoming_type.value_type
+    return incoming_type
+
+
+def _cast_value(value, target_type):
+    try:
+        return pa.scalar(value).cast(target_type).as_py(), False
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        if pa.types.is_string(target_type):
+            return json.dumps(value, default=str), False
+        return None, True
+
+
+def cast_column(values, target_type):
+    """
+    Convierte una columna al tipo destino.
+
+    Retorna:
+        (pyarrow.Array, numpy.ndarray): columna convertida y máscara de filas que no se
+        pudieron convertir (quedan nulas).
+    """
+    values = values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values
+    if values.type == target_type:
+        return values, np.zeros(len(values), dtype=bool)
+    # Entre timestamps solo cambia la unidad: se trunca (la API informa milisegundos)
+    safe = not (pa.types.is_timestamp(values.type) and pa.types.is_timestamp(target_type))
+    try:
+        return pc.cast(values, target_type, safe=safe), np.zeros(len(values), dtype=bool)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        pass
+    # Camino lento: valor por valor, para aislar las filas que fallan
+    converted, failed = [], []
+    for value in values.to_pylist():
+        if value is None:
+            converted.append(None)
+            failed.append(False)
+            continue
+        result, error = _cast_value(value, target_type)
+        converted.append(result)
+        failed.append(error)
+    return pa.array(converted, type=target_type), np.array(failed, dtype=bool)
+
+
+def conform(data, target=None, registry=None, keys=KEY_COLUMNS):
+    """
+    Convierte un lote (DataFrame o pyarrow.Table) al esquema de la tabla destino.
+
+    Args:
+        data (DataFrame | pyarrow.Table): lote entrante.
+        target (pa.Schema, optional): esquema de la tabla (None si todavía no existe).
+        registry (pa.Schema, optional): esquema del registro (por defecto, registry_schema()).
+        keys (set): columnas llave; las filas con llave nula van a cuarentena.
+
+    Retorna:
+        (pyarrow.Table, numpy.ndarray, list, SchemaDiff): filas válidas convertidas, máscara
+        de filas válidas sobre el lote original, motivos por fila inválida (None si es válida)
+        y diferencias de esquema.
+    """
+    registry = registry if registry is not None else registry_schema()
+    table = flatten_nested(data)
+    n = table.num_rows
+    reasons = [None] * n
+
+    def reject(mask, reason):
+        for i in np.flatnonzero(mask):
+            if reasons[i] is None:
+                reasons[i] = reason
+
+    for key in sorted(keys):
+        if key not in table.column_names:
+            reject(np.ones(n, dtype=bool), f"falta la columna llave '{key}'")
+        else:
+            reject(table.column(key).is_null().to_numpy(zero_copy_only=False), f"'{key}' nulo")
+
+    fields, columns = [], []
+    for fld in table.schema:
+        target_type = resolve_type(fld.name, fld.type, target, registry)
+        column, failed = cast_column(table.column(fld.name), target_type)
+        reject(failed, f"'{fld.name}' no convertible a {target_type}")
+        fields.append(pa.field(fld.name, target_type))
+        columns.append(column)
+
+    diff = diff_schema(table.schema, target, resolved={fld.name: fld.type for fld in fields})
+    valid = np.array([reason is None for reason in reasons], dtype=bool)
+    result = pa.Table.from_arrays(columns, schema=pa.schema(fields))
+    if not valid.all():
+        result = result.filter(pa.array(valid))
+    return result, valid, reasons, diff
+
+
+def quarantine_rows(path, data, valid, reasons, source):
+    """
+    Agrega a la tabla de cuarentena las filas inválidas del lote original (como JSON) con el
+    motivo, la tabla de origen y el instante.
+    """
+    if isinstance(data, pa.Table):
+        rows = data.to_pylist()
+    else:
+        rows = data.astype(object).where(data.notna(), None).to_dict("records")
+    bad = np.flatnonzero(~valid)
+    if not len(bad):
+        return 0
+    now = datetime.now(timezone.utc)
+    table = pa.table({
+        "source": pa.array([source] * len(bad), pa.string()),
+        "reason": pa.array([reasons[i] for i in bad], pa.string()),
+        "record": pa.array([json.dumps(rows[i], default=str) for i in bad], pa.string()),
+        "quarantined_at": pa.array([now] * len(bad), pa.timestamp("us", tz="UTC")),
+        QUARANTINE_PARTITION: pa.array([now.strftime("%Y-%m-%d")] * len(bad), pa.string()),
+    })
+    write_deltalake(path, table, mode="append", partition_by=[QUARANTINE_PARTITION])
+    return len(bad)
+
+
+def conform_to_table(data, path, quarantine_path, label):
+    """
+    Conforma el lote al esquema de la tabla en `path`, informa el drift y pone en cuarentena
+    las filas inválidas (si `quarantine_path` es None solo se descartan con un aviso).
+
+    Retorna:
+        (pyarrow.Table, numpy.ndarray): filas a escribir y máscara de filas válidas del lote.
+    """
+    target = table_schema(path)
+    table, valid, reasons, diff = conform(data, target)
+    if diff.added:
+        logger.warning(f"🧬 {label}: columnas nuevas agregadas a la tabla: {diff.added}")
+    if diff.widened:
+        logger.warning(f"🧬 {label}: columnas void ampliadas: {diff.widened}")
+    if diff.retyped:
+        logger.debug(f"🧬 {label}: columnas convertidas al tipo de la tabla: {diff.retyped}")
+    missing = [col for col in diff.missing if col not in NESTED_COLUMNS]
+    if missing:
+        logger.warning(f"⚠️ {label}: la API no envió las columnas {missing} (se conservan los valores previos)")
+    invalid = int((~valid).sum())
+    if invalid:
+        example = next(reason for reason in reasons if reason)
+        if quarantine_path:
+            quarantine_rows(quarantine_path, data, valid, reasons, path)
+            logger.warning(f"🚧 {label}: {invalid} filas en cuarentena ({quarantine_path}). Ej: {example}")
+        else:
+            logger.warning(f"🚧 {label}: {invalid} filas descartadas por no ajustarse al esquema. Ej: {example}")
+    return table, valid
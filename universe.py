@@ -0,0 +1,134 @@
+# universe.py
+
+"""
+Resolución del universo de monedas a extraer.
+
+El universo se define por configuración:
+- {"mode": "ids", "ids": [...]}: ids (o símbolos) explícitos.
+- {"mode": "top", "top_n": 2500}: las N monedas de mayor market cap.
+- {"mode": "category", "category": "layer-1", "top_n": 500}: monedas de una categoría de CoinGecko.
+
+Los ids se validan contra la tabla Silver de monedas mediante un índice en memoria
+(id → moneda, símbolo → ids). El resultado se cachea en disco con un TTL para no repetir
+el descubrimiento paginado en cada corrida horaria.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from deltalake import DeltaTable
+
+from extract import extract_top_coins
+
+logger = logging.getLogger(__name__)
+
+
+class CoinIndex:
+    """
+    Índice en memoria de la lista de monedas para resolver ids y símbolos.
+    """
+
+    def __init__(self, ids, symbols):
+        self.ids = set(ids)
+        self.by_symbol = {}
+        for coin_id, symbol in zip(ids, symbols):
+            self.by_symbol.setdefault(str(symbol).lower(), []).append(coin_id)
+
+    @classmethod
+    def from_delta(cls, path):
+        """Construye el índice desde la tabla Silver de monedas (None si no existe)."""
+        if not DeltaTable.is_deltatable(path):
+            return None
+        df = DeltaTable(path).to_pandas(columns=["id", "symbol"])
+        return cls(df["id"].astype(str).tolist(), df["symbol"].astype(str).tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def resolve(self, token):
+        """
+        Resuelve un id o símbolo a un id de moneda.
+        Retorna None si no existe o si el símbolo es ambiguo.
+        """
+        if token in self.ids:
+            return token
+        candidates = self.by_symbol.get(token.lower(), [])
+        if len(candidates) == 1:
+            return candidates[0]
+        if len(candidates) > 1:
+            logger.warning(f"⚠️ El símbolo '{token}' es ambiguo ({len(candidates)} monedas). Usar el id.")
+        return None
+
+
+def resolve_universe(config, index=None, vs_currency="usd"):
+    """
+    Resuelve la configuración a una lista ordenada de ids (sin duplicados).
+
+    Args:
+        config (dict): configuración del universo (ver docstring del módulo).
+        index (CoinIndex, optional): índice para validar ids/símbolos.
+        vs_currency (str): moneda de referencia para el descubrimiento por market cap.
+
+    Retorna:
+        list | None: ids de monedas (None si el descubrimiento falló).
+    """
+    mode = config.get("mode", "ids")
+    if mode == "ids":
+        ids = []
+        for token in config.get("ids", []):
+            coin_id = index.resolve(token) if index is not None else token
+            if coin_id is None:
+                logger.warning(f"⚠️ Moneda '{token}' no encontrada en la lista de monedas. Se omite.")
+                continue
+            ids.append(coin_id)
+    elif mode in ("top", "category"):
+        category = config.get("category") if mode == "category" else None
+        if mode == "category" and not category:
+            raise ValueError("El universo por categoría requiere 'category'")
+        ids = extract_top_coins(config.get("top_n", 100), vs_currency=vs_currency, category=category)
+        if ids is None:
+            return None
+        if index is not None:
+            ids = [coin_id for coin_id in ids if coin_id in index.ids]
+    else:
+        raise ValueError(f"Modo de universo desconocido '{mode}'")
+    return list(dict.fromkeys(ids))
+
+
+def load_universe(config, cache_file, coins_silver_path=None, ttl_hours=24, now=None):
+    """
+    Devuelve el universo de monedas, usando el cache en disco si sigue vigente
+    (misma configuración y antigüedad menor al TTL).
+
+    Si la resolución falla y hay un cache vencido para la misma configuración,
+    se usa ese cache como respaldo.
+    """
+    now = now or datetime.now(timezone.utc)
+    cached = None
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+        if cached.get("config") != config:
+            cached = None
+
+    if cached is not None:
+        age = now - datetime.fromisoformat(cached["resolved_at"])
+        if age < timedelta(hours=ttl_hours):
+            logger.info(f"🌐 Universo desde cache: {len(cached['ids'])} monedas (resuelto hace {age}).")
+            return cached["ids"]
+
+    index = CoinIndex.from_delta(coins_silver_path) if coins_silver_path else None
+    ids = resolve_universe(config, index=index)
+    if ids is None:
+        if cached is not None:
+            logger.warning("⚠️ Falló la resolución del universo. Se usa el cache vencido.")
+            return cached["ids"]
+        return None
+
+    logger.info(f"🌐 Universo resuelto ({config.get('mode', 'ids')}): {len(ids)} monedas.")
+    if cache_file:
+        with open(cache_file, "w") as f:
+            json.dump({"resolved_at": now.isoformat(), "config": config, "ids": ids}, f)
+    return ids
@@ -0,0 +1,94 @@
+import io
+
+import pyarrow as pa
+import pyarrow.json as pa_json
+
+from schema import TYPE_MAP, ROI_FIELDS
+
+# Equivalencias entre los dtypes de pandas de TYPE_MAP y tipos Arrow compatibles con Delta
+ARROW_TYPES = {
+    "category": pa.string(),  # Delta no soporta diccionarios: se guarda como string
+    "string": pa.string(),
+    "float64": pa.float64(),
+    "float32": pa.float32(),
+    "int16": pa.int16(),
+    "datetime64[ns]": pa.timestamp("us", tz="UTC"),
+}
+
+
+def roi_type():
+    """
+    Tipo Arrow del campo anidado 'roi' (struct con times, currency y percentage).
+    """
+    return pa.struct([pa.field(name, ARROW_TYPES[dtype]) for name, dtype in ROI_FIELDS.items()])
+
+
+def arrow_schema(type_map=TYPE_MAP, exclude=()):
+    """
+    Compila TYPE_MAP a un pyarrow.Schema (las columnas 'object' se tipan como struct de roi).
+    """
+    fields = []
+    for col, dtype in type_map.items():
+        if col in exclude:
+            continue
+        arrow_type = roi_type() if dtype == "object" else ARROW_TYPES[dtype]
+        fields.append(pa.field(col, arrow_type))
+    return pa.schema(fields)
+
+
+def json_to_arrow(body, schema=None):
+    """
+    Convierte el cuerpo JSON de una respuesta (lista de objetos) directamente en un pyarrow.Table,
+    sin pasar por dicts de Python ni por pandas.
+
+    El parseo lo hace el lector JSON de Arrow: la lista se envuelve en un único objeto
+    {"rows": [...]} y luego se aplana la columna de structs resultante. Las columnas
+    presentes en `schema` se tipan explícitamente (incluyendo timestamps ISO 8601);
+    las columnas nuevas se infieren.
+
+    Args:
+        body (bytes): cuerpo de la respuesta HTTP.
+        schema (pa.Schema, optional): esquema esperado (por defecto, el de TYPE_MAP sin particiones).
+
+    Retorna:
+        pa.Table
+    """
+    if schema is None:
+        schema = arrow_schema(exclude=("coin", "date", "day", "hour"))
+
+    if not body.lstrip().startswith(b"["):
+        raise ValueError("Se esperaba una lista JSON en la respuesta")
+
+    wrapped = b'{"rows":' + body + b"}"
+    table = pa_json.read_json(
+        io.BytesIO(wrapped),
+        read_options=pa_json.ReadOptions(block_size=len(wrapped) + 1),
+        parse_options=pa_json.ParseOptions(
+            explicit_schema=pa.schema([pa.field("rows", pa.list_(pa.struct(list(schema))))]),
+            unexpected_field_behavior="infer",
+            newlines_in_values=True,
+        ),
+    )
+    rows = table.column("rows").combine_chunks()
+    if rows.null_count:
+        return schema.empty_table()
+    return pa.Table.from_struct_array(rows.flatten())
+
+
+def add_partition_columns(table, now):
+    """
+    Agrega las columnas de partición (coin, date, day, hour) como arrays Arrow.
+    """
+    n = table.num_rows
+    partitions = {
+        "coin": table.column("id"),
+        "date": pa.array([now.strftime("%Y-%m-%d")] * n, pa.string()),
+        "day": pa.array([now.strftime("%d")] * n, pa.string()),
+        "hour": pa.array([now.strftime("%H")] * n, pa.string()),
+    }
+    for col, values in partitions.items():
+        if col in table.column_names:
+            table = table.set_column(table.column_names.index(col), col, values)
+        else:
+            table = table.append_column(col, values)
+    return table
@@ -1,22 +1,101 @@
-from schema import TYPE_MAP, REQUIRED_COLUMNS, COINLIST_TYPE_MAP, REQUIRED_COINLIST_COLUMNS
+from schema import TYPE_MAP, COINLIST_TYPE_MAP, REQUIRED_COINLIST_COLUMNS
+import numpy as np
 import pandas as pd  
 
+# Tipos enteros de TYPE_MAP → equivalente nullable de pandas (admite nulos sin pasar a float)
+NULLABLE_INTS = {"int8": "Int8", "int16": "Int16", "int32": "Int32", "int64": "Int64"}
 
+_compiled_type_maps = {}
 
-def apply_column_types(df):
+def compile_type_map(type_map=TYPE_MAP):
+    """
+    Compila un mapa de tipos una sola vez (se cachea) en tres grupos de conversión:
+    - datetime: columnas que requieren parseo de fechas (a UTC).
+    - integer: columnas enteras, con control de rango y soporte de nulos.
+    - cast: el resto, que se convierte con astype columna a columna.
+    """
+    key = tuple(type_map.items())
+    if key not in _compiled_type_maps:
+        compiled = {"datetime": [], "integer": {}, "cast": {}}
+        for col, dtype in type_map.items():
+            if dtype == "object":
+                continue
+            if dtype.startswith("datetime64"):
+                compiled["datetime"].append(col)
+            elif dtype in NULLABLE_INTS:
+                compiled["integer"][col] = dtype
+            else:
+                compiled["cast"][col] = dtype
+        _compiled_type_maps[key] = compiled
+    return _compiled_type_maps[key]
+
+def _coerce_datetime(series):
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert("UTC")
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        return series.dt.tz_localize("UTC")
+    return pd.to_datetime(series, utc=True, errors="coerce", format="ISO8601")
+
+def _coerce_integer(series, dtype):
+    if not pd.api.types.is_numeric_dtype(series.dtype):
+        series = pd.to_numeric(series, errors="coerce")
+    info = np.iinfo(dtype)
+    invalid = (series < info.min) | (series > info.max)
+    if not pd.api.types.is_integer_dtype(series.dtype):
+        invalid |= series % 1 != 0
+    if invalid.any():
+        series = series.mask(invalid)
+    return series.astype(NULLABLE_INTS[dtype])
+
+def _failed(converted, original):
+    """Valores que se perdieron en la conversión (nulos nuevos)."""
+    return int(converted.isna().sum() - original.isna().sum())
+
+def apply_column_types(df, type_map=TYPE_MAP, imputation_map=None):
     """
     Aplica los tipos de datos definidos en TYPE_MAP a las columnas del DataFrame si están presentes.
+
+    El mapa se compila una sola vez (compile_type_map). Las fechas y enteros se convierten de
+    forma vectorizada con coerción: los valores que no se pueden interpretar quedan nulos y se
+    cuentan por columna (en df.attrs["type_errors"]) en lugar de abortar la columna. Si se
+    indica `imputation_map`, los nulos se completan después de la conversión.
+
+    Cada columna convertida reemplaza a la original en una copia superficial del DataFrame:
+    no se copian las columnas que no cambian (DataFrame.assign / astype(dict) copian todas).
     """
-    for col, dtype in TYPE_MAP.items():
+    compiled = compile_type_map(type_map)
+    df = df.copy(deep=False)
+    errors = {}
+
+    for col in compiled["datetime"]:
         if col in df.columns:
-            try:
-                if dtype == "datetime64[ns]":
-                    df[col] = pd.to_datetime(df[col], utc=True)  
+            values = _coerce_datetime(df[col])
+            errors[col] = _failed(values, df[col])
+            df[col] = values
+    for col, dtype in compiled["integer"].items():
+        if col in df.columns:
+            values = _coerce_integer(df[col], dtype)
+            errors[col] = _failed(values, df[col])
+            df[col] = values
+    for col, value in (imputation_map or {}).items():
+        if col in df.columns:
+            df[col] = df[col].fillna(value)
 
-                else:
-                    df[col] = df[col].astype(dtype)
-            except Exception as e:
-                print(f"⚠️ No se pudo convertir '{col}' a {dtype}: {e}")
+    for col, dtype in compiled["cast"].items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        try:
+            df[col] = df[col].astype(dtype)
+        except (TypeError, ValueError):
+            # La columna no admite el tipo: se convierte con coerción
+            values = pd.to_numeric(df[col], errors="coerce")
+            errors[col] = _failed(values, df[col])
+            df[col] = values.astype(dtype)
+
+    errors = {col: count for col, count in errors.items() if count}
+    for col, count in errors.items():
+        print(f"⚠️ {count} valores de '{col}' no se pudieron convertir a {type_map[col]} (quedan nulos)")
+    df.attrs["type_errors"] = errors
     return df
 
 def validate_required_columns(df, required_columns ):